@@ -5,26 +5,30 @@ from sqlalchemy.exc import SQLAlchemyError
 from flask_migrate import Migrate
 from flask_login import LoginManager, current_user
 from flask_socketio import SocketIO
-from flask_caching import Cache
 from flask_wtf import CSRFProtect
 from logging.handlers import RotatingFileHandler
 from functools import wraps
 from datetime import datetime
 import pytz
 from config import Config
+from .utils.metrics import InstrumentedCache, Metrics
 
 # App extensions
 db = SQLAlchemy()
 migrate = Migrate()
 socketio = SocketIO()
 login_manager = LoginManager()
-cache = Cache()
+cache = InstrumentedCache()
 csrf = CSRFProtect()
 
 # -----------------------
 # Access Control Helpers
 # -----------------------
 from .models import User, Shop, SubCounty, Ward, County
+from .utils.tenant import TenantContext
+from .utils.serialization import FastJSONEncoder
+from .utils.compression import ResponseCompression
+from .utils.profiling import QueryProfiler
 def role_required(*roles):
     def wrapper(view_func):
         @wraps(view_func)
@@ -49,7 +53,9 @@ def shop_access_required(view_func):
         if not shop_id:
             abort(400, "Missing shop_id in route")
 
-        shop = Shop.query.get_or_404(shop_id)
+        shop = TenantContext.current().shop(shop_id)
+        if shop is None:
+            abort(404)
 
         if current_user.is_tenant():
             if shop.business_id != current_user.business_id:
@@ -105,6 +111,7 @@ def business_access_required(view_func):
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json_encoder = FastJSONEncoder
 
     # -----------------------
     # Secure Config
@@ -129,10 +136,17 @@ def create_app(config_class=Config):
     # -----------------------
     db.init_app(app)
     migrate.init_app(app, db)
-    socketio.init_app(app, cors_allowed_origins=['https://yourdomain.com'])
+    socketio.init_app(
+        app,
+        cors_allowed_origins=['https://yourdomain.com'],
+        message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    )
     login_manager.init_app(app)
     cache.init_app(app)
     csrf.init_app(app)
+    ResponseCompression.init_app(app)
+    QueryProfiler.init_app(app)
+    Metrics.init_app(app)
 
     login_manager.login_view = 'auth.login'
 
@@ -141,7 +155,7 @@ def create_app(config_class=Config):
     # -----------------------
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return TenantContext.load_user(int(user_id))
 
     # -----------------------
     # Address Management Setup
@@ -210,6 +224,7 @@ def create_app(config_class=Config):
     # -----------------------
     @app.before_request
     def set_tenant_context():
+        g.tenant = TenantContext()
         g.business = None
         g.shop = None
 
@@ -269,10 +284,7 @@ def create_app(config_class=Config):
         try:
             if current_user.is_authenticated:
                 if current_user.is_tenant():
-                    shops = Shop.query.filter_by(
-                        business_id=current_user.business_id,
-                        is_deleted=False
-                    ).all()
+                    shops = TenantContext.current().business_shops(current_user.business_id)
                     business = current_user.business
                 elif current_user.is_admin() and current_user.shop:
                     shops = [current_user.shop]
@@ -298,7 +310,7 @@ def create_app(config_class=Config):
         try:
             shop_id = session.get("shop_id")
             if shop_id:
-                current_shop = db.session.get(Shop, shop_id)
+                current_shop = TenantContext.current().shop(shop_id)
                 if current_shop and current_shop.is_deleted:
                     current_shop = None  # Don't expose deleted shops
         except SQLAlchemyError as e:
@@ -404,4 +416,10 @@ def create_app(config_class=Config):
     for bp, url_prefix in blueprints:
         app.register_blueprint(bp, url_prefix=url_prefix)
 
+    # -----------------------
+    # CLI Commands
+    # -----------------------
+    from .commands import register_commands
+    register_commands(app)
+
     return app
\ No newline at end of file
@@ -1,13 +1,14 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, current_app, abort
 from flask_login import login_user, logout_user, current_user, login_required
 from sqlalchemy import func, case
-from app.models import User, Business, Role, Shop, BusinessStatus, Sale, Product, RegisterSession, CartItem, StockLog
+from app.models import User, Business, Role, Shop, BusinessStatus, Sale, Product, RegisterSession, CartItem, StockLog, ShopDailySales, ShopDailyProductSales
 from app.bhapos.forms import CreateBusinessForm, CreateTenantForm, CreateShopForm, CreateUserForm
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import date, timedelta, datetime
 from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from app import db, csrf
+from app.utils.time import as_kenya_date
 import logging
 import re
 
@@ -445,23 +446,22 @@ def get_shop_transaction_counts(business_id, shop_ids, days=30):
     if not shop_ids:
         return {}
     
-    start_date = datetime.utcnow() - timedelta(days=days)
+    start_date = as_kenya_date(datetime.utcnow() - timedelta(days=days))
     
     try:
         results = db.session.query(
             Shop.id,
-            func.count(Sale.id).label('transaction_count')
+            func.sum(ShopDailySales.transactions).label('transaction_count')
         ).join(
-            Sale, Sale.shop_id == Shop.id
+            ShopDailySales, ShopDailySales.shop_id == Shop.id
         ).filter(
             Shop.id.in_(shop_ids),
             Shop.is_deleted == False,
-            Sale.created_at >= start_date,
-            Sale.is_deleted == False
+            ShopDailySales.sale_date >= start_date
         ).group_by(
             Shop.id
         ).order_by(
-            func.count(Sale.id).desc()
+            func.sum(ShopDailySales.transactions).desc()
         ).all()
         
         return {
@@ -589,74 +589,75 @@ def get_sales_metrics(business_id, shop_ids, start_date, end_date=None):
     if not shop_ids:
         return empty_sales_metrics()
     
+    total = func.sum(ShopDailySales.total)
+    transactions = func.sum(ShopDailySales.transactions)
     query = db.session.query(
-        func.sum(Sale.total).label('total_sales'),
-        func.count(Sale.id).label('transaction_count'),
-        func.avg(Sale.total).label('average_sale'),
-        func.sum(Sale.profit).label('total_profit'),
-        (func.sum(Sale.profit) / func.nullif(func.sum(Sale.total), 0) * 100).label('profit_margin'),
-        func.max(Sale.total).label('largest_sale'),
-        func.min(Sale.total).label('smallest_sale'),
+        total.label('total_sales'),
+        transactions.label('transaction_count'),
+        (total * 1.0 / func.nullif(transactions, 0)).label('average_sale'),
+        func.sum(ShopDailySales.profit).label('total_profit'),
+        (func.sum(ShopDailySales.profit) * 100.0 / func.nullif(total, 0)).label('profit_margin'),
+        func.max(ShopDailySales.largest_sale).label('largest_sale'),
+        func.min(ShopDailySales.smallest_sale).label('smallest_sale'),
     ).filter(
-        Sale.shop_id.in_(shop_ids),
-        Sale.created_at >= start_date,
-        Sale.is_deleted == False
+        ShopDailySales.shop_id.in_(shop_ids),
+        ShopDailySales.sale_date >= as_kenya_date(start_date)
     )
     
     if end_date:
-        query = query.filter(Sale.created_at <= end_date)
+        query = query.filter(ShopDailySales.sale_date <= as_kenya_date(end_date))
     
     result = query.first()
     
     return format_sales_metrics(result)
 
+
 def get_sales_trends(business_id, shop_ids):
     """Get daily sales trends for the last 30 days"""
     if not shop_ids:
         return []
     
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = as_kenya_date(datetime.utcnow() - timedelta(days=30))
     
     return db.session.query(
-        func.date(Sale.created_at).label('date'),
-        func.sum(Sale.total).label('total_sales'),
-        func.count(Sale.id).label('transaction_count'),
-        func.sum(Sale.profit).label('total_profit'),
+        ShopDailySales.sale_date.label('date'),
+        func.sum(ShopDailySales.total).label('total_sales'),
+        func.sum(ShopDailySales.transactions).label('transaction_count'),
+        func.sum(ShopDailySales.profit).label('total_profit'),
     ).filter(
-        Sale.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False
+        ShopDailySales.shop_id.in_(shop_ids),
+        ShopDailySales.sale_date >= thirty_days_ago
     ).group_by(
-        func.date(Sale.created_at)
+        ShopDailySales.sale_date
     ).order_by(
-        func.date(Sale.created_at)
+        ShopDailySales.sale_date
     ).all()
 
+
 def get_top_performing_shops(business_id, shop_ids):
     """Get top performing shops by sales volume"""
     if not shop_ids:
         return []
     
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = as_kenya_date(datetime.utcnow() - timedelta(days=30))
     
     return db.session.query(
         Shop.id,
         Shop.name,
-        func.sum(Sale.total).label('total_sales'),
-        func.sum(Sale.profit).label('total_profit'),
-        (func.sum(Sale.profit) / func.nullif(func.sum(Sale.total), 0) * 100).label('profit_margin'),
+        func.sum(ShopDailySales.total).label('total_sales'),
+        func.sum(ShopDailySales.profit).label('total_profit'),
+        (func.sum(ShopDailySales.profit) * 100.0 / func.nullif(func.sum(ShopDailySales.total), 0)).label('profit_margin'),
     ).join(
-        Sale, Sale.shop_id == Shop.id
+        ShopDailySales, ShopDailySales.shop_id == Shop.id
     ).filter(
         Shop.id.in_(shop_ids),
         Shop.business_id == business_id,
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False
+        ShopDailySales.sale_date >= thirty_days_ago
     ).group_by(
         Shop.id,
         Shop.name
     ).order_by(
-        func.sum(Sale.total).desc()
+        func.sum(ShopDailySales.total).desc()
     ).limit(5).all()
 
 
@@ -709,26 +710,23 @@ def get_fast_moving_products(business_id):
     if not shop_ids:
         return []
     
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = as_kenya_date(datetime.utcnow() - timedelta(days=30))
     
     return db.session.query(
         Product.id.label('product_id'),
         Product.name.label('product_name'),
-        func.sum(CartItem.quantity).label('total_sold')
-    ).join(
-        CartItem, CartItem.product_id == Product.id
+        func.sum(ShopDailyProductSales.quantity).label('total_sold')
     ).join(
-        Sale, Sale.id == CartItem.sale_id
+        ShopDailyProductSales, ShopDailyProductSales.product_id == Product.id
     ).filter(
-        Product.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False,
+        ShopDailyProductSales.shop_id.in_(shop_ids),
+        ShopDailyProductSales.sale_date >= thirty_days_ago,
         Product.is_deleted == False
     ).group_by(
         Product.id,
         Product.name
     ).order_by(
-        func.sum(CartItem.quantity).desc()
+        func.sum(ShopDailyProductSales.quantity).desc()
     ).limit(5).all()
 
 
@@ -742,31 +740,26 @@ def get_slow_moving_products(business_id):
     if not shop_ids:
         return []
     
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-
+    thirty_days_ago = as_kenya_date(datetime.utcnow() - timedelta(days=30))
+    
     return db.session.query(
-        Product.id.label("product_id"),
-        Product.name.label("product_name"),
-        func.sum(CartItem.quantity).label('total_sold')
-    ).join(
-        CartItem, CartItem.product_id == Product.id
+        Product.id.label('product_id'),
+        Product.name.label('product_name'),
+        func.sum(ShopDailyProductSales.quantity).label('total_sold')
     ).join(
-        Sale, Sale.id == CartItem.sale_id
+        ShopDailyProductSales, ShopDailyProductSales.product_id == Product.id
     ).filter(
-        Product.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False,
+        ShopDailyProductSales.shop_id.in_(shop_ids),
+        ShopDailyProductSales.sale_date >= thirty_days_ago,
         Product.is_deleted == False
     ).group_by(
         Product.id,
         Product.name
     ).order_by(
-        func.sum(CartItem.quantity).asc()
+        func.sum(ShopDailyProductSales.quantity).asc()
     ).limit(5).all()
 
 
-
-
 def get_products_needing_reorder(business_id):
     """Get products that need reordering through business shops"""
     shop_ids = [shop.id for shop in Shop.query.filter_by(
@@ -791,55 +784,52 @@ def get_top_performing_staff(business_id, shop_ids):
     if not shop_ids:
         return []
 
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = as_kenya_date(datetime.utcnow() - timedelta(days=30))
 
     return db.session.query(
         User.id.label('user_id'),
         User.username.label('username'),
         User.role.label('role'),  # this is fine for enums
-        func.count(Sale.id).label('sale_count'),
-        func.sum(Sale.total).label('total_sales'),
-        func.sum(Sale.profit).label('total_profit'),
+        func.sum(ShopDailySales.transactions).label('sale_count'),
+        func.sum(ShopDailySales.total).label('total_sales'),
+        func.sum(ShopDailySales.profit).label('total_profit'),
         (
-            func.sum(Sale.profit) / func.nullif(func.sum(Sale.total), 0) * 100
+            func.sum(ShopDailySales.profit) * 100.0 / func.nullif(func.sum(ShopDailySales.total), 0)
         ).label('profit_margin')
     ).join(
-        Sale, Sale.user_id == User.id
+        ShopDailySales, ShopDailySales.user_id == User.id
     ).filter(
         User.business_id == business_id,
-        Sale.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False,
+        ShopDailySales.shop_id.in_(shop_ids),
+        ShopDailySales.sale_date >= thirty_days_ago,
         User.is_deleted == False
     ).group_by(
         User.id,
         User.username,
         User.role 
     ).order_by(
-        func.sum(Sale.total).desc()
+        func.sum(ShopDailySales.total).desc()
     ).limit(5).all()
 
 
-
 def get_sales_by_staff(business_id, shop_ids):
     """Get summarized sales performance per staff member"""
     if not shop_ids:
         return []
 
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = as_kenya_date(datetime.utcnow() - timedelta(days=30))
 
     return db.session.query(
         User.id.label('user_id'),
         User.username,
-        func.sum(Sale.total).label('total_sales'),
-        func.sum(Sale.profit).label('total_profit')
+        func.sum(ShopDailySales.total).label('total_sales'),
+        func.sum(ShopDailySales.profit).label('total_profit')
     ).join(
-        Sale, Sale.user_id == User.id
+        ShopDailySales, ShopDailySales.user_id == User.id
     ).filter(
         User.business_id == business_id,
-        Sale.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False,
+        ShopDailySales.shop_id.in_(shop_ids),
+        ShopDailySales.sale_date >= thirty_days_ago,
         User.is_deleted == False
     ).group_by(
         User.id,
@@ -908,36 +898,35 @@ def get_payment_method_distribution(business_id, shop_ids):
     if not shop_ids:
         return []
     
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = as_kenya_date(datetime.utcnow() - timedelta(days=30))
     
     return db.session.query(
-        Sale.payment_method,
-        func.sum(Sale.total).label('total'),
-        func.count(Sale.id).label('count'),
+        ShopDailySales.payment_method,
+        func.sum(ShopDailySales.total).label('total'),
+        func.sum(ShopDailySales.transactions).label('count'),
     ).filter(
-        Sale.shop_id.in_(shop_ids),
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False
+        ShopDailySales.shop_id.in_(shop_ids),
+        ShopDailySales.sale_date >= thirty_days_ago
     ).group_by(
-        Sale.payment_method
+        ShopDailySales.payment_method
     ).all()
 
+
 def get_hourly_sales_patterns(business_id, shop_ids):
-    """Get hourly sales patterns (placeholder - implement your business logic)"""
+    """Get hourly sales patterns (Nairobi local hours)"""
     if not shop_ids:
         return []
     
     return db.session.query(
-        func.extract('hour', Sale.created_at).label('hour'),
-        func.sum(Sale.total).label('total_sales'),
-        func.count(Sale.id).label('transaction_count'),
+        ShopDailySales.hour.label('hour'),
+        func.sum(ShopDailySales.total).label('total_sales'),
+        func.sum(ShopDailySales.transactions).label('transaction_count'),
     ).filter(
-        Sale.shop_id.in_(shop_ids),
-        Sale.is_deleted == False
+        ShopDailySales.shop_id.in_(shop_ids)
     ).group_by(
-        func.extract('hour', Sale.created_at)
+        ShopDailySales.hour
     ).order_by(
-        func.extract('hour', Sale.created_at)
+        ShopDailySales.hour
     ).all()
 
 
@@ -946,7 +935,7 @@ def get_sales_by_shop(business_id, shop_ids):
     if not shop_ids:
         return []
 
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = as_kenya_date(datetime.utcnow() - timedelta(days=30))
 
     return db.session.query(
         Shop.id.label('id'),
@@ -955,17 +944,16 @@ def get_sales_by_shop(business_id, shop_ids):
         Shop.phone.label('phone'),
         Shop.currency.label('currency'),
         Shop.logo_url.label('logo_url'),
-        func.sum(Sale.total).label('total_sales'),
-        func.sum(Sale.profit).label('total_profit'),
-        (func.sum(Sale.profit) / func.nullif(func.sum(Sale.total), 0) * 100).label('profit_margin')
+        func.sum(ShopDailySales.total).label('total_sales'),
+        func.sum(ShopDailySales.profit).label('total_profit'),
+        (func.sum(ShopDailySales.profit) * 100.0 / func.nullif(func.sum(ShopDailySales.total), 0)).label('profit_margin')
     ).join(
-        Sale, Sale.shop_id == Shop.id
+        ShopDailySales, ShopDailySales.shop_id == Shop.id
     ).filter(
         Shop.id.in_(shop_ids),
         Shop.business_id == business_id,
         Shop.is_deleted == False,
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False
+        ShopDailySales.sale_date >= thirty_days_ago
     ).group_by(
         Shop.id,
         Shop.name,
@@ -976,33 +964,28 @@ def get_sales_by_shop(business_id, shop_ids):
     ).all()
 
 
-
-
 def get_shop_profit_margins(business_id, shop_ids):
     """Get profit margins by shop"""
     if not shop_ids:
         return []
 
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = as_kenya_date(datetime.utcnow() - timedelta(days=30))
 
     return db.session.query(
         Shop.id,
         Shop.name,
-        (func.sum(Sale.profit) / func.nullif(func.sum(Sale.total), 0) * 100).label('profit_margin')
+        (func.sum(ShopDailySales.profit) * 100.0 / func.nullif(func.sum(ShopDailySales.total), 0)).label('profit_margin')
     ).join(
-        Sale, Sale.shop_id == Shop.id
-    ).join(
-        Business, Shop.business_id == Business.id  # 🔧 Ensure this join is present
+        ShopDailySales, ShopDailySales.shop_id == Shop.id
     ).filter(
         Shop.id.in_(shop_ids),
-        Business.id == business_id,
-        Sale.created_at >= thirty_days_ago,
-        Sale.is_deleted == False
+        Shop.business_id == business_id,
+        ShopDailySales.sale_date >= thirty_days_ago
     ).group_by(
         Shop.id,
         Shop.name
     ).order_by(
-        func.sum(Sale.profit).desc()
+        func.sum(ShopDailySales.profit).desc()
     ).all()
 
 
@@ -0,0 +1,99 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app import db
+
+sales_rank_cli = AppGroup('sales-rank', help='Maintain the POS product sales rank.')
+rollups_cli = AppGroup('rollups', help='Maintain the daily sales report rollups.')
+exports_cli = AppGroup('exports', help='Maintain rendered report exports.')
+counters_cli = AppGroup('counters', help='Maintain the live sales counters.')
+metrics_cli = AppGroup('metrics', help='Maintain the shared request metrics.')
+
+
+@sales_rank_cli.command('rebuild')
+@click.option('--shop-id', type=int, default=None, help='Only rebuild this shop.')
+@click.option('--window-days', type=int, default=None,
+              help='Trailing window for the score (defaults to SALES_RANK_WINDOW_DAYS, 0 for all-time).')
+def rebuild_sales_rank(shop_id, window_days):
+    """Recompute product_sales_rank from sales history (run periodically, e.g. nightly)."""
+    from .sale.repositories import SalesRankRepository
+
+    if window_days is None:
+        window_days = current_app.config.get('SALES_RANK_WINDOW_DAYS')
+
+    try:
+        count = SalesRankRepository.rebuild(shop_id=shop_id, window_days=window_days)
+        db.session.commit()
+        click.echo(f"Rebuilt {count} sales rank rows")
+    except Exception as e:
+        db.session.rollback()
+        raise click.ClickException(f"Sales rank rebuild failed: {str(e)}")
+
+
+@rollups_cli.command('rebuild')
+@click.option('--shop-id', type=int, default=None, help='Only rebuild this shop.')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First local (Africa/Nairobi) date to rebuild, YYYY-MM-DD.')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last local date to rebuild, inclusive.')
+def rebuild_rollups(shop_id, start, end):
+    """Recompute shop_daily_sales and shop_daily_product_sales from sales (backfill or repair)."""
+    from .sale.repositories import SalesRollupRepository
+
+    try:
+        daily, products = SalesRollupRepository.rebuild(
+            shop_id=shop_id,
+            start=start.date() if start else None,
+            end=end.date() if end else None
+        )
+        db.session.commit()
+        click.echo(f"Rebuilt {daily} daily sales rows and {products} daily product rows")
+    except Exception as e:
+        db.session.rollback()
+        raise click.ClickException(f"Rollup rebuild failed: {str(e)}")
+
+
+@exports_cli.command('prune')
+@click.option('--max-age', type=int, default=None,
+              help='Delete artifacts older than this many seconds (defaults to EXPORT_RETENTION).')
+def prune_exports(max_age):
+    """Delete expired export artifacts from EXPORT_DIR (run periodically, e.g. hourly)."""
+    from .reports.jobs import ExportJobs
+
+    if max_age is None:
+        max_age = current_app.config.get('EXPORT_RETENTION')
+    click.echo(f"Removed {ExportJobs.prune(max_age)} export artifacts")
+
+
+@counters_cli.command('reconcile')
+@click.option('--shop-id', type=int, default=None, help='Only reconcile this shop.')
+@click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Local (Africa/Nairobi) date to reconcile, YYYY-MM-DD (defaults to today).')
+def reconcile_counters(shop_id, day):
+    """Rebuild live sales counters from sales (run periodically, e.g. every 15 minutes)."""
+    from .models import Shop
+    from .utils.counters import LiveSalesCounters
+
+    shop_ids = [shop_id] if shop_id is not None else [
+        row.id for row in db.session.query(Shop.id).filter(Shop.is_deleted == False)
+    ]
+    for reconcile_shop_id in shop_ids:
+        LiveSalesCounters.reconcile(reconcile_shop_id, day.date() if day else None)
+    click.echo(f"Reconciled live sales counters for {len(shop_ids)} shops")
+
+
+
+@metrics_cli.command('reset')
+def reset_metrics():
+    """Delete the per-worker metric files (run before starting the server)."""
+    from .utils.metrics import Metrics
+
+    click.echo(f"Removed {Metrics.reset()} worker metric files")
+
+
+def register_commands(app):
+    app.cli.add_command(sales_rank_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(exports_cli)
+    app.cli.add_command(counters_cli)
+    app.cli.add_command(metrics_cli)
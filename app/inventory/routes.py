@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, current_app, g, make_response
 from flask_login import login_required, current_user
 from app.models import  Product, Category, Supplier, Expense ,AdjustmentType, StockLog, User, PriceChange, Role, UnitType
-from app import socketio
+from app.utils.events import SocketBatcher
 from app import db, csrf, role_required, shop_access_required, business_access_required
 from decimal import Decimal, InvalidOperation
 from sqlalchemy.exc import IntegrityError
@@ -593,11 +593,12 @@ def edit_product(shop_id: int, id: int):
             db.session.commit()
             flash(f"Product '{product.name}' updated successfully.", "success")
 
-            socketio.emit('product_updated', {
-                'id': product.id,
+            SocketBatcher.emit('product_updated', f'shop_{shop.id}', {
+                'product_id': product.id,
+                'shop_id': shop.id,
                 'name': product.name,
                 'selling_price': product.selling_price
-            }, broadcast=True)
+            }, key=product.id)
 
             return redirect(url_for('inventory.products', shop_id=shop.id))
 
@@ -672,11 +673,12 @@ def delete_product(shop_id: int, id: int):
         flash(FLASH_PRODUCT_DELETED.format(product.name), 'success')
 
         # Emit real-time update to clients
-        socketio.emit('stock_updated', {
-            'id': product.id,
+        SocketBatcher.emit('stock_updated', f'shop_{shop.id}', {
+            'product_id': id,
+            'shop_id': shop.id,
             'name': product.name,
             'stock': 0
-        }, broadcast=True)
+        }, key=id)
 
     except Exception as e:
         db.session.rollback()
@@ -804,11 +806,12 @@ def submit_update_stock(shop_id, product_id):
 
         db.session.commit()
 
-        socketio.emit('stock_updated', {
-            'id': product.id,
+        SocketBatcher.emit('stock_updated', f'shop_{shop.id}', {
+            'product_id': product.id,
+            'shop_id': shop.id,
             'name': product.name,
             'stock': product.stock
-        }, broadcast=True)
+        }, key=product.id)
 
         flash(f"Stock for '{product.name}' updated successfully.", 'success')
 
@@ -874,12 +877,13 @@ def update_stock_product(shop_id: int, product_id: int):
         update_product_stock(product, quantity_to_add, total_amount)
         db.session.commit()
 
-        socketio.emit('stock_updated', {
-            'id': product.id,
+        SocketBatcher.emit('stock_updated', f'shop_{shop.id}', {
+            'product_id': product.id,
+            'shop_id': shop.id,
             'name': product.name,
             'stock': product.stock,
             'cost_price': product.cost_price
-        }, broadcast=True)
+        }, key=product.id)
 
         return jsonify({'message': f"Stock updated successfully for {product.name}."}), 200
 
@@ -801,6 +801,7 @@ class Sale(BaseModel, ShopScopedMixin):
     tax = db.Column(Float, nullable=True)
     register_session_id = db.Column(Integer, db.ForeignKey('register_sessions.id'), nullable=True)
     user_id = db.Column(Integer, db.ForeignKey('users.id'))
+    idempotency_key = db.Column(String(64), nullable=True)  # Client-supplied per checkout attempt
 
     # Relationships
     cart_items = relationship('CartItem', back_populates='sale')
@@ -815,6 +816,7 @@ class Sale(BaseModel, ShopScopedMixin):
         db.Index('ix_sale_payment', 'payment_method'),
         db.Index('ix_sale_shop_pay_date', 'shop_id', 'payment_method', 'date'),
         db.Index('ix_sale_status_paid', 'status', 'is_paid'),
+        db.Index('uq_sale_shop_idempotency_key', 'shop_id', 'idempotency_key', unique=True),
     )
 
     @validates('payment_method')
@@ -888,6 +890,8 @@ class CartItem(BaseModel, ShopScopedMixin):
     unit_price = db.Column(Numeric(12, 2), nullable=False)  # Price at time of sale
     discount = db.Column(Numeric(5, 2), default=0.0)  # Discount percentage applied
     total_price = db.Column(Numeric(12, 2), nullable=False)  # Calculated field
+    unit_cost = db.Column(Numeric(12, 2), nullable=True)  # Product.cost_price at time of sale
+    line_cost = db.Column(Numeric(12, 2), nullable=True)  # quantity * unit_cost, for COGS without a products join
 
     # Relationships
     product = relationship('Product', back_populates='sale_items', lazy='select')
@@ -936,11 +940,11 @@ class CartItem(BaseModel, ShopScopedMixin):
         data = {
             'id': self.id,
             'product_id': self.product_id,
-            'quantity': float(self.quantity),
-            'unit_price': float(self.unit_price),
-            'discount': float(self.discount),
-            'total_price': float(self.total_price),
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'quantity': self.quantity,
+            'unit_price': self.unit_price,
+            'discount': self.discount,
+            'total_price': self.total_price,
+            'created_at': self.created_at
         }
         
         if include_product and self.product:
@@ -948,7 +952,7 @@ class CartItem(BaseModel, ShopScopedMixin):
                 'name': self.product.name,
                 'image_url': self.product.image_url,
                 'barcode': self.product.barcode,
-                'current_price': float(self.product.selling_price)
+                'current_price': self.product.selling_price
             }
         
         return data
@@ -1015,6 +1019,9 @@ class Product(BaseModel, ShopScopedMixin):
     is_featured = Column(Boolean, default=False, server_default=text("false"))
     is_discountable = Column(Boolean, default=True, server_default=text("true"))
 
+    # Catalogue version this row was last written at (see app.sale.catalogue)
+    catalogue_version = Column(Integer, nullable=False, default=0, server_default=text("0"))
+
     # Indexes
     __table_args__ = (
         Index('ix_product_shop_category', 'shop_id', 'category_id'),
@@ -1026,6 +1033,7 @@ class Product(BaseModel, ShopScopedMixin):
         Index('ix_product_shop_stock', 'shop_id', 'stock'),
         Index('ix_product_shop_combo', 'shop_id', 'combination_size'),
         Index('ix_product_search', 'shop_id', 'name', 'barcode', 'sku'),
+        Index('ix_product_shop_catalogue_version', 'shop_id', 'catalogue_version'),
     )
 
     # === Validations ===
@@ -1138,13 +1146,13 @@ class Product(BaseModel, ShopScopedMixin):
 
     # === Serialization ===
     def serialize(self, for_pos=False, include_private=False):
-        """Serialize product data for API responses"""
+        """Serialize product data for API responses (Decimals and datetimes are left to the JSON encoder)"""
         data = {
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'price': float(self.selling_price),
-            'cost_price': float(self.cost_price) if include_private else None,
+            'price': self.selling_price,
+            'cost_price': self.cost_price if include_private else None,
             'stock': self.stock,
             'low_stock_threshold': self.low_stock_threshold,
             'image_url': self.image_url,
@@ -1157,26 +1165,26 @@ class Product(BaseModel, ShopScopedMixin):
             'is_featured': self.is_featured,
             'is_discountable': self.is_discountable,
             'unit': self.unit.value if self.unit else None,
-            'minimum_unit': float(self.minimum_unit),
-            'profit_margin': float(self.profit_margin),
+            'minimum_unit': self.minimum_unit,
+            'profit_margin': self.profit_margin,
             'is_combo': self.is_combo,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
         if for_pos:
             data.update({
                 'display_price': self.display_price,
                 'combination_size': self.combination_size,
-                'combination_price': float(self.combination_price or 0.0),
-                'combination_unit_price': float(self.combination_unit_price or 0.0),
+                'combination_price': self.combination_price or 0,
+                'combination_unit_price': self.combination_unit_price or 0,
                 'category_name': self.category.name if self.category else None,
                 'supplier_name': self.supplier.name if self.supplier else None
             })
 
         if include_private:
             data.update({
-                'profit': float(self.profit),
+                'profit': self.profit,
                 'total_value': self.total_value,
                 'is_low_stock': self.is_low_stock
             })
@@ -1187,6 +1195,100 @@ class Product(BaseModel, ShopScopedMixin):
         return f'<Product {self.id}: {self.name} (Shop: {self.shop_id})>'
 
 
+class ProductSalesRank(db.Model):
+    """Per-shop rollup of units sold per product, used to order the POS catalogue"""
+    __tablename__ = 'product_sales_rank'
+    __table_args__ = (
+        Index('ix_product_sales_rank_shop_score', 'shop_id', 'score'),
+    )
+
+    shop_id = Column(Integer, ForeignKey('shops.id', ondelete='CASCADE'), primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    units_sold = Column(Numeric(14, 3), nullable=False, default=0, server_default=text("0"))  # All-time
+    score = Column(Numeric(14, 3), nullable=False, default=0, server_default=text("0"))  # Within the ranking window
+    last_sold_at = Column(DateTime, nullable=True)
+    rebuilt_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ProductSalesRank shop={self.shop_id} product={self.product_id} score={self.score}>'
+
+
+class ShopDailySales(db.Model):
+    """
+    Per-shop sales totals by Nairobi local day, hour, payment method and cashier.
+    Maintained by checkout; rebuilt from sales with `flask rollups rebuild`.
+    """
+    __tablename__ = 'shop_daily_sales'
+
+    shop_id = Column(Integer, ForeignKey('shops.id', ondelete='CASCADE'), primary_key=True)
+    sale_date = Column(sa.Date, primary_key=True)  # Africa/Nairobi local date
+    hour = Column(Integer, primary_key=True, autoincrement=False)  # Local hour, 0-23
+    payment_method = Column(String(50), primary_key=True)
+    user_id = Column(Integer, primary_key=True, autoincrement=False)  # 0 when the sale has no cashier
+    transactions = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    total = Column(Numeric(14, 2), nullable=False, default=0, server_default=text("0"))
+    subtotal = Column(Numeric(14, 2), nullable=False, default=0, server_default=text("0"))
+    tax = Column(Numeric(14, 2), nullable=False, default=0, server_default=text("0"))
+    profit = Column(Numeric(14, 2), nullable=False, default=0, server_default=text("0"))
+    items = Column(Numeric(14, 3), nullable=False, default=0, server_default=text("0"))  # Units sold
+    largest_sale = Column(Numeric(14, 2), nullable=True)
+    smallest_sale = Column(Numeric(14, 2), nullable=True)
+
+    def __repr__(self):
+        return f'<ShopDailySales shop={self.shop_id} date={self.sale_date} hour={self.hour} total={self.total}>'
+
+
+class ShopDailyProductSales(db.Model):
+    """Per-shop, per-product sales totals by Nairobi local day"""
+    __tablename__ = 'shop_daily_product_sales'
+    __table_args__ = (
+        Index('ix_shop_daily_product_sales_product', 'product_id', 'sale_date'),
+    )
+
+    shop_id = Column(Integer, ForeignKey('shops.id', ondelete='CASCADE'), primary_key=True)
+    sale_date = Column(sa.Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    quantity = Column(Numeric(14, 3), nullable=False, default=0, server_default=text("0"))
+    revenue = Column(Numeric(14, 2), nullable=False, default=0, server_default=text("0"))
+    cost = Column(Numeric(14, 2), nullable=False, default=0, server_default=text("0"))
+    transactions = Column(Integer, nullable=False, default=0, server_default=text("0"))
+
+    def __repr__(self):
+        return f'<ShopDailyProductSales shop={self.shop_id} date={self.sale_date} product={self.product_id}>'
+
+
+class ClosedPeriodReport(db.Model):
+    """Finalised report for a shop's closed day or month: JSON context plus rendered fragment"""
+    __tablename__ = 'closed_period_reports'
+
+    shop_id = Column(Integer, ForeignKey('shops.id', ondelete='CASCADE'), primary_key=True)
+    report = Column(String(30), primary_key=True)  # 'daily', 'monthly', 'monthly_full'
+    period_start = Column(sa.Date, primary_key=True)
+    content_hash = Column(String(64), nullable=False)
+    context = Column(Text, nullable=False)
+    fragment = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ClosedPeriodReport shop={self.shop_id} {self.report} {self.period_start}>'
+
+
+class SaleReceipt(db.Model):
+    """A sale's receipt as written at checkout: receipt JSON, transaction detail JSON and thermal text"""
+    __tablename__ = 'sale_receipts'
+
+    sale_id = Column(Integer, ForeignKey('sales.id', ondelete='CASCADE'), primary_key=True)
+    shop_id = Column(Integer, ForeignKey('shops.id', ondelete='CASCADE'), nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    document = Column(Text, nullable=False)
+    details = Column(Text, nullable=False)
+    thermal = Column(Text, nullable=False)  # ESC/POS, ready to send to the printer
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SaleReceipt sale={self.sale_id} shop={self.shop_id}>'
+
+
 
 
 class Supplier(BaseModel, ShopScopedMixin):
@@ -10,6 +10,7 @@ from datetime import datetime, date
 import logging
 from werkzeug.exceptions import BadRequest
 from app.utils.render import render_htmx
+from app.sale.search import SearchIndexRegistry
 
 
 
@@ -363,15 +364,17 @@ def edit_cost_price_form(shop_id, product_id):
 @shop_access_required
 @role_required(Role.ADMIN, Role.TENANT)
 def search_products(shop_id):
-    query = request.args.get('query', '')
+    query = request.args.get('query', '').strip()
     base_query = Product.query.join(Category).filter(Category.shop_id == shop_id)
 
     if query:
-        base_query = base_query.filter(
-            Product.name.ilike(f'%{query}%') |
-            Product.sku.ilike(f'%{query}%')
+        product_ids = SearchIndexRegistry.get(shop_id).search(query, limit=50)
+        position = {product_id: i for i, product_id in enumerate(product_ids)}
+        products = sorted(
+            base_query.filter(Product.id.in_(product_ids)).all(),
+            key=lambda p: position[p.id]
         )
-
-    products = base_query.order_by(Product.name.asc()).limit(50).all()
+    else:
+        products = base_query.order_by(Product.name.asc()).limit(50).all()
 
     return render_template('admin/fragments/_price_rows.html', products=products, shop_id=shop_id)
@@ -0,0 +1,634 @@
+import os
+from datetime import datetime
+from io import BytesIO
+from typing import Dict
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import (
+    SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle,
+    HRFlowable, KeepTogether
+)
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib import colors
+from reportlab.lib.units import inch, mm
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from openpyxl import Workbook
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
+
+# Renderers run in export worker processes: they take a plain report payload
+# (see jobs.daily_report_payload) and never touch the database or app context.
+
+LOW_STOCK_THRESHOLD = 10
+CRITICAL_STOCK_THRESHOLD = 5
+
+# Register professional fonts (fallback to Helvetica if not available)
+try:
+    pdfmetrics.registerFont(TTFont('Roboto', 'Roboto-Regular.ttf'))
+    pdfmetrics.registerFont(TTFont('Roboto-Bold', 'Roboto-Bold.ttf'))
+    pdfmetrics.registerFont(TTFont('Roboto-Light', 'Roboto-Light.ttf'))
+except:
+    pass  # Fallback to default fonts
+
+
+def render_daily_pdf(report_data: Dict) -> bytes:
+    report_date = report_data['report_date']
+    formatted_date = report_date.strftime("%A, %B %d, %Y").upper()
+
+    summary = report_data.get('summary', {})
+    
+    # PDF setup with tighter margins
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        leftMargin=15*mm,
+        rightMargin=15*mm,
+        topMargin=10*mm,
+        bottomMargin=15*mm,
+        title=f"Daily Sales Report - {formatted_date}"
+    )
+    elements = []
+
+    # Custom Styles
+    styles = getSampleStyleSheet()
+    
+    # Title style
+    styles.add(ParagraphStyle(
+        name='ReportTitle',
+        fontName='Helvetica-Bold',
+        fontSize=16,
+        alignment=TA_CENTER,
+        spaceAfter=6,
+        textColor=colors.HexColor("#2c3e50")
+    ))
+    
+    # Date style
+    styles.add(ParagraphStyle(
+        name='ReportDate',
+        fontName='Helvetica',
+        fontSize=10,
+        alignment=TA_CENTER,
+        spaceAfter=18,
+        textColor=colors.HexColor("#7f8c8d")
+    ))
+    
+    # Section header style
+    styles.add(ParagraphStyle(
+        name='SectionHeader',
+        fontName='Helvetica-Bold',
+        fontSize=12,
+        textColor=colors.HexColor("#3498db"),
+        spaceAfter=8,
+        underlineWidth=1,
+        underlineColor=colors.HexColor("#3498db"),
+        underlineOffset=-3
+    ))
+    
+    # Table header style
+    styles.add(ParagraphStyle(
+        name='TableHeader',
+        fontName='Helvetica-Bold',
+        fontSize=9,
+        alignment=TA_CENTER,
+        textColor=colors.white
+    ))
+    
+    # Body text style
+    styles.add(ParagraphStyle(
+        name='RBodyText',
+        fontName='Helvetica',
+        fontSize=9,
+        leading=11,
+        spaceAfter=6
+    ))
+    
+    # Footer style
+    styles.add(ParagraphStyle(
+        name='FooterText',
+        fontName='Helvetica-Oblique',
+        fontSize=8,
+        textColor=colors.HexColor("#95a5a6"),
+        alignment=TA_CENTER
+    ))
+
+    # Report Header
+    elements.append(Paragraph("DAILY SALES REPORT", styles['ReportTitle']))
+    elements.append(Paragraph(formatted_date, styles['ReportDate']))
+    elements.append(HRFlowable(width="80%", thickness=0.5, lineCap='round', 
+                             color=colors.HexColor("#bdc3c7"), spaceAfter=18))
+
+    # SECTION 1: Summary (Card-style layout)
+    elements.append(Paragraph("PERFORMANCE SUMMARY", styles['SectionHeader']))
+    
+    summary_data = [
+        ("TOTAL SALES", f"Ksh {summary.get('total_sales', 0):,.2f}", "#2ecc71"),
+        ("TOTAL TRANSACTIONS", f"{summary.get('total_transactions', 0):,}", "#3498db"),
+        ("AVG SALE", f"Ksh {summary.get('avg_sale', 0):,.2f}", "#9b59b6"),
+        ("TOTAL PROFIT", f"Ksh {summary.get('total_profit', 0):,.2f}", "#e74c3c")
+    ]
+    
+    summary_cards = []
+    for title, value, color in summary_data:
+        card = Table([
+            [Paragraph(title, ParagraphStyle(
+                name='CardTitle',
+                fontName='Helvetica-Bold',
+                fontSize=9,
+                textColor=colors.white,
+                alignment=TA_CENTER
+            ))],
+            [Paragraph(value, ParagraphStyle(
+                name='CardValue',
+                fontName='Helvetica-Bold',
+                fontSize=11,
+                textColor=colors.white,
+                alignment=TA_CENTER
+            ))]
+        ], colWidths=[2.25*inch], rowHeights=[0.3*inch, 0.4*inch])
+        
+        card.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor(color)),
+            ('BOX', (0, 0), (-1, -1), 0.5, colors.white),
+            ('ROUNDEDCORNERS', [4, 4, 4, 4]),
+        ]))
+        summary_cards.append(card)
+    
+    # Arrange cards in 2x2 grid
+    summary_grid = Table([
+        [summary_cards[0], summary_cards[1]],
+        [summary_cards[2], summary_cards[3]]
+    ], colWidths=[2.5*inch, 2.5*inch], rowHeights=[0.8*inch, 0.8*inch])
+    
+    elements.append(KeepTogether(summary_grid))
+    elements.append(Spacer(1, 0.3*inch))
+
+    # SECTION 2: Payment Methods
+    payments = report_data.get('payment_methods', {})
+    elements.append(Paragraph("PAYMENT METHODS", styles['SectionHeader']))
+    
+    if payments:
+        payment_data = [["METHOD", "AMOUNT (Ksh)"]]
+        payment_data.extend([
+            [method.upper(), Paragraph(f"{amount:,.2f}", ParagraphStyle(
+                name='RightAlign',
+                fontName='Helvetica',
+                fontSize=9,
+                alignment=TA_RIGHT
+            ))] 
+            for method, amount in payments.items()
+        ])
+        
+        payment_table = Table(
+            payment_data,
+            colWidths=[4*inch, 2*inch],
+            repeatRows=1
+        )
+        
+        payment_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#34495e")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#ecf0f1")),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8f9f9")]),
+        ]))
+        
+        elements.append(payment_table)
+    else:
+        elements.append(Paragraph("No payment data available.", styles['RBodyText']))
+    
+    elements.append(Spacer(1, 0.3*inch))
+
+    # SECTION 3: Top Selling Products
+    top_products = report_data.get('product_performance', [])
+    elements.append(Paragraph("TOP SELLING PRODUCTS", styles['SectionHeader']))
+    
+    if top_products:
+        product_data = [["PRODUCT", "QTY", "REVENUE (Ksh)"]]
+        product_data.extend([
+            [product, 
+             str(data['quantity']), 
+             Paragraph(f"{data['revenue']:,.2f}", ParagraphStyle(
+                 name='RightAlign',
+                 fontName='Helvetica',
+                 fontSize=9,
+                 alignment=TA_RIGHT
+             ))] 
+            for product, data in top_products
+        ])
+        
+        product_table = Table(
+            product_data,
+            colWidths=[3.5*inch, 1.25*inch, 1.25*inch],
+            repeatRows=1
+        )
+        
+        product_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#34495e")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#ecf0f1")),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8f9f9")]),
+        ]))
+        
+        elements.append(product_table)
+    else:
+        elements.append(Paragraph("No product sales recorded.", styles['RBodyText']))
+    
+    elements.append(Spacer(1, 0.3*inch))
+
+    # SECTION 4: Low Stock Products
+    elements.append(Paragraph("LOW STOCK ALERTS", styles['SectionHeader']))
+    low_stock_products = report_data.get('low_stock', [])
+
+    if low_stock_products:
+        low_stock_data = [["PRODUCT", "STOCK", "REORDER LEVEL", "CATEGORY"]]
+        for p in low_stock_products:
+            stock_style = 'Helvetica-Bold' if p['stock'] <= CRITICAL_STOCK_THRESHOLD else 'Helvetica'
+            stock_color = colors.red if p['stock'] <= CRITICAL_STOCK_THRESHOLD else colors.black
+            
+            low_stock_data.append([
+                p['name'],
+                Paragraph(str(p['stock']), ParagraphStyle(
+                    name='StockAlert',
+                    fontName=stock_style,
+                    fontSize=9,
+                    textColor=stock_color,
+                    alignment=TA_CENTER
+                )),
+                str(p['reorder_level']),
+                p['category']
+            ])
+
+        stock_table = Table(
+            low_stock_data,
+            colWidths=[2.5*inch, 0.75*inch, 1*inch, 1.25*inch],
+            repeatRows=1
+        )
+        
+        stock_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#34495e")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#ecf0f1")),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8f9f9")]),
+        ]))
+        
+        elements.append(stock_table)
+    else:
+        elements.append(Paragraph("All products are sufficiently stocked.", styles['RBodyText']))
+    
+    elements.append(Spacer(1, 0.3*inch))
+
+    # SECTION 5: Staff Performance
+    staff_performance = report_data.get('staff_performance', [])
+    elements.append(Paragraph("STAFF PERFORMANCE", styles['SectionHeader']))
+    
+    if staff_performance:
+        staff_data = [["STAFF MEMBER", "TRANSACTIONS", "SALES (Ksh)"]]
+        staff_data.extend([
+            [staff, 
+             str(data['sales']), 
+             Paragraph(f"{data['amount']:,.2f}", ParagraphStyle(
+                 name='RightAlign',
+                 fontName='Helvetica',
+                 fontSize=9,
+                 alignment=TA_RIGHT
+             ))] 
+            for staff, data in staff_performance
+        ])
+        
+        staff_table = Table(
+            staff_data,
+            colWidths=[3*inch, 1.5*inch, 1.5*inch],
+            repeatRows=1
+        )
+        
+        staff_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#34495e")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#ecf0f1")),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8f9f9")]),
+        ]))
+        
+        elements.append(staff_table)
+    else:
+        elements.append(Paragraph("No staff performance data available.", styles['RBodyText']))
+    
+    elements.append(Spacer(1, 0.3*inch))
+
+    # SECTION 6: Hourly Trends
+    hourly_trends = report_data.get('hourly_trends', [])
+    elements.append(Paragraph("HOURLY SALES TRENDS", styles['SectionHeader']))
+    
+    if hourly_trends:
+        hourly_data = [["HOUR", "SALES (Ksh)"]]
+        hourly_data.extend([
+            [hour, 
+             Paragraph(f"{amount:,.2f}", ParagraphStyle(
+                 name='RightAlign',
+                 fontName='Helvetica',
+                 fontSize=9,
+                 alignment=TA_RIGHT
+             ))] 
+            for hour, amount in hourly_trends
+        ])
+        
+        hourly_table = Table(
+            hourly_data,
+            colWidths=[3*inch, 3*inch],
+            repeatRows=1
+        )
+        
+        hourly_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#34495e")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#ecf0f1")),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f8f9f9")]),
+        ]))
+        
+        elements.append(hourly_table)
+    else:
+        elements.append(Paragraph("No hourly sales data available.", styles['RBodyText']))
+    
+    # Footer
+    elements.append(Spacer(1, 0.5*inch))
+    elements.append(HRFlowable(width="100%", thickness=0.5, lineCap='round', 
+                             color=colors.HexColor("#bdc3c7"), spaceAfter=6))
+    elements.append(Paragraph(
+        f"Generated on {datetime.now().strftime('%Y-%m-%d at %H:%M:%S')} • © {datetime.now().year} Nawiri Enterprise",
+        styles['FooterText']
+    ))
+
+    # Build PDF
+    doc.build(elements)
+
+    return buffer.getvalue()
+
+
+def render_daily_excel(report_data: Dict) -> bytes:
+    report_date = report_data['report_date']
+    formatted_date = report_date.strftime("%B %d, %Y")
+
+    # Create workbook and worksheet
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Daily Report"
+    
+    # Set default column width
+    for col in range(1, 10):
+        ws.column_dimensions[get_column_letter(col)].width = 20
+
+    # Create styles
+    header_font = Font(name='Calibri', bold=True, size=12, color='FFFFFF')
+    header_fill = PatternFill(start_color='3498DB', end_color='3498DB', fill_type='solid')
+    header_alignment = Alignment(horizontal='center', vertical='center')
+    thin_border = Border(left=Side(style='thin'), 
+                       right=Side(style='thin'), 
+                       top=Side(style='thin'), 
+                       bottom=Side(style='thin'))
+    
+    title_style = NamedStyle(name="title_style")
+    title_style.font = Font(name='Calibri', bold=True, size=14)
+    title_style.alignment = Alignment(horizontal='center')
+    
+    section_style = NamedStyle(name="section_style")
+    section_style.font = Font(name='Calibri', bold=True, size=12, color='3498DB')
+    section_style.alignment = Alignment(horizontal='left')
+    
+    currency_style = NamedStyle(name="currency_style")
+    currency_style.number_format = '"Ksh" #,##0.00'
+    currency_style.alignment = Alignment(horizontal='right')
+    
+    # Add styles to workbook
+    wb.add_named_style(title_style)
+    wb.add_named_style(section_style)
+    wb.add_named_style(currency_style)
+
+   
+
+    # Report title
+    ws['A3'] = "DAILY SALES REPORT"
+    ws['A3'].style = title_style
+    ws.merge_cells('A3:D3')
+    
+    ws['A4'] = formatted_date
+    ws['A4'].font = Font(name='Calibri', italic=True)
+    ws.merge_cells('A4:D4')
+    
+    current_row = 6
+
+    # SECTION 1: Summary
+    summary = report_data.get('summary', {})
+    ws.cell(row=current_row, column=1, value="PERFORMANCE SUMMARY").style = section_style
+    current_row += 1
+    
+    summary_headers = ["Metric", "Value"]
+    ws.append(summary_headers)
+    
+    for cell in ws[current_row]:
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+    
+    summary_data = [
+        ["Total Sales", summary.get('total_sales', 0)],
+        ["Total Transactions", summary.get('total_transactions', 0)],
+        ["Average Sale", summary.get('avg_sale', 0)],
+        ["Total Profit", summary.get('total_profit', 0)]
+    ]
+    
+    for row in summary_data:
+        ws.append(row)
+        ws.cell(row=current_row+1, column=2).style = currency_style
+    
+    # Apply borders to summary data
+    for row in ws.iter_rows(min_row=current_row, max_row=current_row+3, min_col=1, max_col=2):
+        for cell in row:
+            cell.border = thin_border
+    
+    current_row += 5
+
+    # SECTION 2: Payment Methods
+    payments = report_data.get('payment_methods', {})
+    ws.cell(row=current_row, column=1, value="PAYMENT METHODS").style = section_style
+    current_row += 1
+    
+    payment_headers = ["Method", "Amount (Ksh)"]
+    ws.append(payment_headers)
+    
+    for cell in ws[current_row]:
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+    
+    for method, amount in payments.items():
+        ws.append([method.capitalize(), amount])
+        ws.cell(row=current_row+1, column=2).style = currency_style
+        current_row += 1
+    
+    # Apply borders to payment data
+    for row in ws.iter_rows(min_row=current_row-len(payments), max_row=current_row, min_col=1, max_col=2):
+        for cell in row:
+            cell.border = thin_border
+    
+    current_row += 2
+
+    # SECTION 3: Top Selling Products
+    top_products = report_data.get('product_performance', [])
+    ws.cell(row=current_row, column=1, value="TOP SELLING PRODUCTS").style = section_style
+    current_row += 1
+    
+    product_headers = ["Product", "Quantity", "Revenue (Ksh)"]
+    ws.append(product_headers)
+    
+    for cell in ws[current_row]:
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+    
+    for product, data in top_products:
+        ws.append([product, data['quantity'], data['revenue']])
+        ws.cell(row=current_row+1, column=3).style = currency_style
+        current_row += 1
+    
+    # Apply borders to product data
+    for row in ws.iter_rows(min_row=current_row-len(top_products), max_row=current_row, min_col=1, max_col=3):
+        for cell in row:
+            cell.border = thin_border
+    
+    current_row += 2
+
+    # SECTION 4: Low Stock Products
+    ws.cell(row=current_row, column=1, value="LOW STOCK ALERTS").style = section_style
+    current_row += 1
+    
+    low_stock_headers = ["Product", "Stock", "Reorder Level", "Category"]
+    ws.append(low_stock_headers)
+    
+    for cell in ws[current_row]:
+        cell.font = header_font
+        cell.fill = PatternFill(start_color='E74C3C', end_color='E74C3C', fill_type='solid')
+        cell.alignment = header_alignment
+        cell.border = thin_border
+    
+    low_stock_products = report_data.get('low_stock', [])
+
+    for p in low_stock_products:
+        ws.append([
+            p['name'],
+            p['stock'],
+            p['reorder_level'],
+            p['category']
+        ])
+        # Highlight critical stock in red
+        if p['stock'] <= CRITICAL_STOCK_THRESHOLD:
+            ws.cell(row=current_row+1, column=2).font = Font(color='E74C3C', bold=True)
+        current_row += 1
+    
+    # Apply borders to stock data
+    for row in ws.iter_rows(min_row=current_row-len(low_stock_products), max_row=current_row, min_col=1, max_col=4):
+        for cell in row:
+            cell.border = thin_border
+    
+    current_row += 2
+
+    # SECTION 5: Staff Performance
+    staff_performance = report_data.get('staff_performance', [])
+    ws.cell(row=current_row, column=1, value="STAFF PERFORMANCE").style = section_style
+    current_row += 1
+    
+    staff_headers = ["Staff Member", "Transactions", "Sales (Ksh)"]
+    ws.append(staff_headers)
+    
+    for cell in ws[current_row]:
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+    
+    for staff, data in staff_performance:
+        ws.append([staff, data['sales'], data['amount']])
+        ws.cell(row=current_row+1, column=3).style = currency_style
+        current_row += 1
+    
+    # Apply borders to staff data
+    for row in ws.iter_rows(min_row=current_row-len(staff_performance), max_row=current_row, min_col=1, max_col=3):
+        for cell in row:
+            cell.border = thin_border
+    
+    current_row += 2
+
+    # SECTION 6: Hourly Trends
+    hourly_trends = report_data.get('hourly_trends', [])
+    ws.cell(row=current_row, column=1, value="HOURLY SALES TRENDS").style = section_style
+    current_row += 1
+    
+    hourly_headers = ["Hour", "Sales (Ksh)"]
+    ws.append(hourly_headers)
+    
+    for cell in ws[current_row]:
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+    
+    for hour, amount in hourly_trends:
+        ws.append([hour, amount])
+        ws.cell(row=current_row+1, column=2).style = currency_style
+        current_row += 1
+    
+    # Apply borders to hourly data
+    for row in ws.iter_rows(min_row=current_row-len(hourly_trends), max_row=current_row, min_col=1, max_col=2):
+        for cell in row:
+            cell.border = thin_border
+    
+    # Footer
+    current_row += 2
+    ws.cell(row=current_row, column=1, 
+            value=f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    ws.cell(row=current_row, column=1).font = Font(italic=True, color='7F8C8D')
+    
+    ws.cell(row=current_row, column=4, value="Confidential")
+    ws.cell(row=current_row, column=4).font = Font(italic=True, color='7F8C8D')
+    ws.cell(row=current_row, column=4).alignment = Alignment(horizontal='right')
+
+    # Freeze headers
+    ws.freeze_panes = 'A7'
+
+    # Save to buffer
+    buffer = BytesIO()
+    wb.save(buffer)
+
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'pdf': (render_daily_pdf, 'application/pdf'),
+    'excel': (render_daily_excel, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+EXTENSIONS = {'pdf': 'pdf', 'excel': 'xlsx'}
+
+
+def render_to_file(kind: str, report_data: Dict, path: str) -> str:
+    """Render an export into `path` (written atomically); runs in a worker process"""
+    render, _ = RENDERERS[kind]
+    content = render(report_data)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f'{path}.{os.getpid()}.part'
+    with open(partial, 'wb') as f:
+        f.write(content)
+    os.replace(partial, path)
+    return path
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, Optional
+from flask import current_app
+from app import db, cache, socketio
+from app.models import Product, Category, Shop
+from app.utils.calculations.report_calculations import generate_daily_report_data
+from .exports import EXTENSIONS, LOW_STOCK_THRESHOLD, render_to_file
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = 'export:{job_id}'
+
+
+def daily_report_payload(shop_id: int, report_date: date) -> Dict:
+    """Everything the daily report exports render, as plain picklable data"""
+    report_data = generate_daily_report_data(shop_id=shop_id, report_date=report_date)
+    low_stock = db.session.query(Product.name, Product.stock, Category.name)\
+        .outerjoin(Category, Category.id == Product.category_id)\
+        .filter(Product.shop_id == shop_id, Product.stock <= LOW_STOCK_THRESHOLD)\
+        .order_by(Product.stock.asc())\
+        .limit(10)\
+        .all()
+
+    return {
+        'shop_id': shop_id,
+        'shop_name': db.session.query(Shop.name).filter(Shop.id == shop_id).scalar(),
+        'report_date': report_date,
+        'summary': report_data['summary'],
+        'payment_methods': report_data['payment_methods'],
+        'product_performance': report_data['product_performance'],
+        'hourly_trends': report_data['hourly_trends'],
+        'staff_performance': report_data['staff_performance'],
+        'low_stock': [
+            {'name': name, 'stock': stock, 'reorder_level': 10, 'category': category or "N/A"}
+            for name, stock, category in low_stock
+        ]
+    }
+
+
+class ExportJobs:
+    """
+    Report exports rendered in a process pool instead of the request worker.
+
+    A job's id is the hash of its kind and payload, so identical requests
+    share one job and, once rendered, one artifact on disk. Job state lives
+    in the shared cache; clients poll it or wait for `export_ready` on the
+    shop's socket room.
+    """
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def executor(cls) -> ProcessPoolExecutor:
+        with cls._lock:
+            if cls._executor is None:
+                # Spawned, not forked: children must not inherit the DB pool or the eventlet hub
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=current_app.config.get('EXPORT_WORKERS', 2),
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return cls._executor
+
+    @staticmethod
+    def job_id(kind: str, payload: Dict) -> str:
+        body = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(f'{kind}:{body}'.encode()).hexdigest()
+
+    @staticmethod
+    def artifact_path(shop_id: int, job_id: str, kind: str) -> str:
+        return os.path.join(current_app.config['EXPORT_DIR'], f'shop_{shop_id}', f'{job_id}.{EXTENSIONS[kind]}')
+
+    @staticmethod
+    def status(job_id: str) -> Optional[Dict]:
+        return cache.get(JOB_KEY.format(job_id=job_id))
+
+    @staticmethod
+    def _save(job: Dict, timeout: int) -> None:
+        cache.set(JOB_KEY.format(job_id=job['id']), job, timeout=timeout)
+
+    @classmethod
+    def submit(cls, kind: str, shop_id: int, payload: Dict, filename: str) -> Dict:
+        """Queue an export, or return the existing job / artifact for an identical request"""
+        if kind not in EXTENSIONS:
+            raise ValueError(f"Unknown export format '{kind}'")
+
+        config = current_app.config
+        job_id = cls.job_id(kind, payload)
+        path = cls.artifact_path(shop_id, job_id, kind)
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'shop_id': shop_id,
+            'filename': f'{filename}.{EXTENSIONS[kind]}',
+            'status': 'pending',
+            'error': None
+        }
+
+        if os.path.exists(path):
+            job['status'] = 'ready'
+            cls._save(job, config.get('EXPORT_RETENTION', 86400))
+            return job
+
+        existing = cls.status(job_id)
+        if existing and existing['status'] == 'pending':
+            return existing
+
+        # cache.add is atomic: only one request per identical export gets to queue it
+        key = JOB_KEY.format(job_id=job_id)
+        if existing:
+            cache.delete(key)
+        if not cache.add(key, job, timeout=config.get('EXPORT_JOB_TIMEOUT', 600)):
+            return cls.status(job_id) or job
+
+        app = current_app._get_current_object()
+        started = time.monotonic()
+        try:
+            future = cls.executor().submit(render_to_file, kind, payload, path)
+        except Exception:
+            cache.delete(key)
+            raise
+        future.add_done_callback(lambda f: cls._finished(app, job, f, started))
+        return job
+
+    @classmethod
+    def _finished(cls, app, job: Dict, future, started: float) -> None:
+        with app.app_context():
+            try:
+                future.result()
+                job = dict(job, status='ready')
+                cls._save(job, app.config.get('EXPORT_RETENTION', 86400))
+                logger.info(f"Export {job['id']} ({job['kind']}) rendered in {time.monotonic() - started:.2f}s")
+            except Exception as e:
+                job = dict(job, status='failed', error=str(e))
+                cls._save(job, app.config.get('EXPORT_JOB_TIMEOUT', 600))
+                logger.error(f"Export {job['id']} failed: {str(e)}")
+
+            try:
+                socketio.emit('export_ready', {
+                    'job_id': job['id'],
+                    'status': job['status'],
+                    'kind': job['kind'],
+                    'filename': job['filename']
+                }, room=f"shop_{job['shop_id']}")
+            except Exception as e:
+                logger.warning(f"export_ready emit failed for {job['id']}: {str(e)}")
+
+    @staticmethod
+    def prune(max_age: int) -> int:
+        """Delete artifacts older than `max_age` seconds; returns the number removed"""
+        cutoff = time.time() - max_age
+        removed = 0
+        for root, _, files in os.walk(current_app.config['EXPORT_DIR']):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+        return removed
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+from datetime import date, datetime
+from typing import Iterable, Optional, Set, Tuple
+from flask import json
+from sqlalchemy import event, inspect, or_, and_
+from app import db
+from app.models import Sale, CartItem, ClosedPeriodReport
+from app.utils.time import kenya_today, as_kenya_date
+
+logger = logging.getLogger(__name__)
+
+DAILY = 'daily'
+MONTHLY = ('monthly', 'monthly_full')
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _reads_any(days: Iterable[date]):
+    """Filter for the stored reports that read any of `days`"""
+    months = set()
+    for day in days:
+        month = month_start(day)
+        # The month itself, the next month (month-over-month) and a year on (year-over-year)
+        months.update((month, add_months(month, 1), add_months(month, 12)))
+    return or_(
+        and_(ClosedPeriodReport.report == DAILY, ClosedPeriodReport.period_start.in_(set(days))),
+        and_(ClosedPeriodReport.report.in_(MONTHLY), ClosedPeriodReport.period_start.in_(months))
+    )
+
+
+class ClosedReportStore:
+    """
+    Finalised reports for days and months that have ended (Nairobi time),
+    stored as the JSON context and the rendered fragment with a content hash.
+
+    Stored reports are served as-is, so browsing history never touches the
+    sales tables. A row is deleted only when a sale in its period is written
+    (see the session listener below) or the period's rollups are rebuilt;
+    the next request then renders and stores it again. Monthly reports
+    compare against the previous month and the same month last year, so a
+    write also drops the two months that read it.
+    """
+
+    @staticmethod
+    def is_closed(period_end: date) -> bool:
+        return period_end < kenya_today()
+
+    @staticmethod
+    def content_hash(context: str, fragment: str) -> str:
+        return hashlib.sha256(f'{context}\n{fragment}'.encode()).hexdigest()
+
+    @staticmethod
+    def get(shop_id: int, report: str, period_start: date) -> Optional[ClosedPeriodReport]:
+        try:
+            return db.session.get(ClosedPeriodReport, (shop_id, report, period_start))
+        except Exception as e:
+            logger.warning(f"[Shop {shop_id}] Closed {report} report read failed for {period_start}: {str(e)}")
+            db.session.rollback()
+            return None
+
+    @classmethod
+    def put(cls, shop_id: int, report: str, period_start: date, context, fragment: str) -> Optional[ClosedPeriodReport]:
+        """Store a closed period's report and commit; a failure only costs the next request a re-render"""
+        try:
+            body = json.dumps(context)
+            stored = db.session.merge(ClosedPeriodReport(
+                shop_id=shop_id,
+                report=report,
+                period_start=period_start,
+                context=body,
+                fragment=fragment,
+                content_hash=cls.content_hash(body, fragment),
+                created_at=datetime.utcnow()
+            ))
+            db.session.commit()
+            return stored
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"[Shop {shop_id}] Closed {report} report write failed for {period_start}: {str(e)}")
+            return None
+
+    @staticmethod
+    def invalidate_range(shop_id: Optional[int], start: Optional[date], end: Optional[date]) -> int:
+        """Delete the stored reports that read any day in start..end, None for open-ended (caller commits)"""
+        daily = [ClosedPeriodReport.report == DAILY]
+        # A month's report also reads the previous month and the same month a year earlier
+        monthly = [ClosedPeriodReport.report.in_(MONTHLY)]
+        if start is not None:
+            daily.append(ClosedPeriodReport.period_start >= start)
+            monthly.append(ClosedPeriodReport.period_start >= month_start(start))
+        if end is not None:
+            daily.append(ClosedPeriodReport.period_start <= end)
+            monthly.append(ClosedPeriodReport.period_start <= add_months(month_start(end), 12))
+
+        query = db.session.query(ClosedPeriodReport).filter(or_(and_(*daily), and_(*monthly)))
+        if shop_id is not None:
+            query = query.filter(ClosedPeriodReport.shop_id == shop_id)
+        return query.delete(synchronize_session=False)
+
+
+def _sale_days(session, obj) -> Set[Tuple[int, date]]:
+    """(shop_id, local date) pairs a pending Sale or CartItem write touches, old values included"""
+    if isinstance(obj, CartItem):
+        sale = obj.sale if obj.sale is not None else session.get(Sale, obj.sale_id) if obj.sale_id else None
+        if sale is None or sale in session.new:
+            return set()
+        obj = sale
+
+    state = inspect(obj)
+    shops, dates = (
+        set(history.unchanged or ()) | set(history.added or ()) | set(history.deleted or ())
+        for history in (state.attrs.shop_id.history, state.attrs.date.history)
+    )
+    return {
+        (shop_id, as_kenya_date(value))
+        for shop_id in shops if shop_id is not None
+        for value in dates if value is not None
+    }
+
+
+@event.listens_for(db.session, 'before_flush')
+def _invalidate_written_periods(session, flush_context, instances):
+    # Deleted in the same transaction as the write, so a stored report never outlives it
+    written = {}
+    today = kenya_today()
+    with session.no_autoflush:
+        changed = list(session.new) + list(session.deleted) + [
+            obj for obj in session.dirty if session.is_modified(obj, include_collections=False)
+        ]
+        for obj in changed:
+            if isinstance(obj, (Sale, CartItem)):
+                for shop_id, day in _sale_days(session, obj):
+                    if day < today:
+                        written.setdefault(shop_id, set()).add(day)
+
+        for shop_id, days in written.items():
+            session.query(ClosedPeriodReport)\
+                .filter(ClosedPeriodReport.shop_id == shop_id, _reads_any(days))\
+                .delete(synchronize_session=False)
@@ -1,10 +1,13 @@
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, jsonify, current_app, request, Response, json
 from . import controllers, sockets
 from .schemas import ReceiptSchema, ProductSearchSchema
 from app import  shop_access_required, role_required, csrf
 from ..models import Role
 from flask_login import login_required
 from .services import SalesService
+from .catalogue import CatalogueVersion
+from ..utils.compression import negotiate_encoding, encoded_response, compressed_response
+from ..utils.profiling import query_budget
 from .controllers import (
     SalesController,
     TransactionController,
@@ -84,9 +87,17 @@ api_bp.add_url_rule(
 )
 
 
+# Offline sales replayed by the service worker, in one batch
+api_bp.add_url_rule(
+    '/shops/<int:shop_id>/transactions/sync',
+    view_func=controllers.OfflineSyncController.as_view('transaction_sync_api'),
+    methods=['POST']
+)
+
+
 # API Receipt endpoint 
 api_bp.add_url_rule(
-    '/receipts',
+    '/shops/<int:shop_id>/receipts',
     view_func=controllers.ReceiptController.as_view('receipt_api'),
     methods=['GET']
 )
@@ -95,11 +106,34 @@ api_bp.add_url_rule(
 @login_required
 @shop_access_required
 @role_required(Role.CASHIER, Role.ADMIN, Role.TENANT)
+@query_budget(8)
 def get_pos_data(shop_id):
-    """Endpoint that provides all initial POS data"""
+    """
+    Endpoint that provides all initial POS data.
+    Served with an ETag of the shop's catalogue version; ?since=<version>
+    returns only what changed after that version. ?format=columnar sends the
+    products as a ColumnarCatalogue (see static/js/pos/CatalogueDecoder.js).
+    """
     try:
-        pos_data = SalesService.get_pos_data(shop_id)
-        return jsonify(pos_data)
+        columnar = request.args.get('format') == 'columnar'
+        since = request.args.get('since', type=int)
+        if since is not None:
+            return compressed_response(json.dumps(SalesService.get_pos_delta(shop_id, since, columnar)))
+
+        variant = 'columnar' if columnar else 'rows'
+        etag = f'catalogue-{shop_id}-{CatalogueVersion.current(shop_id)}-{variant}'
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.vary.add('Accept-Encoding')
+        else:
+            encoding = negotiate_encoding()
+            version, body = SalesService.get_pos_payload(shop_id, columnar, encoding)
+            etag = f'catalogue-{shop_id}-{version}-{variant}'
+            response = encoded_response(body, encoding)
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
         current_app.logger.error(f"POS data error: {str(e)}")
         return jsonify({'error': 'Failed to load POS data'}), 500
@@ -0,0 +1,107 @@
+import logging
+from itertools import chain
+from sqlalchemy import event, select, func
+from app import db, cache
+from ..models import Shop, Product, Category, Tax
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'shop:{shop_id}:catalogue_version'
+_PENDING = 'catalogue_shops_pending'
+
+
+class CatalogueVersion:
+    """
+    Monotonic per-shop counter for everything the POS bootstrap payload is built
+    from (products, prices, stock, categories, taxes, shop details).
+
+    The counter lives in the cache backend so bumps are a single atomic INCR on
+    Redis. Each written product is stamped with the version it was written at
+    (products.catalogue_version), which both drives ?since= deltas and lets the
+    counter be re-seeded if the cache key is ever evicted.
+    """
+
+    @staticmethod
+    def current(shop_id: int) -> int:
+        version = cache.get(VERSION_KEY.format(shop_id=shop_id))
+        if version is None:
+            version = CatalogueVersion._seed(shop_id)
+        return int(version)
+
+    @staticmethod
+    def bump(shop_id: int) -> int:
+        key = VERSION_KEY.format(shop_id=shop_id)
+        if cache.get(key) is None:
+            CatalogueVersion._seed(shop_id)
+        return int(cache.cache.inc(key))
+
+    @staticmethod
+    def touch(shop_id: int) -> int:
+        """
+        Bump the version for a write in the current transaction and bump it once
+        more after commit, so payloads built while the write was still
+        uncommitted are never served under the final version.
+        """
+        db.session.info.setdefault(_PENDING, set()).add(shop_id)
+        return CatalogueVersion.bump(shop_id)
+
+    @staticmethod
+    def _seed(shop_id: int) -> int:
+        products = Product.__table__
+        with db.session.no_autoflush:
+            stored = db.session.execute(
+                select(func.max(products.c.catalogue_version)).where(products.c.shop_id == shop_id)
+            ).scalar() or 0
+        key = VERSION_KEY.format(shop_id=shop_id)
+        cache.add(key, int(stored), timeout=0)
+        return int(cache.get(key) or stored)
+
+
+def _shop_id_of(obj):
+    if isinstance(obj, Shop):
+        return obj.id
+    if isinstance(obj, Product) and obj.shop_id is None and obj.category is not None:
+        return obj.category.shop_id
+    return obj.shop_id
+
+
+@event.listens_for(db.session, 'before_flush')
+def _stamp_catalogue_writes(session, flush_context, instances):
+    touched = [
+        obj for obj in chain(session.new, session.dirty, session.deleted)
+        if isinstance(obj, (Shop, Product, Category, Tax))
+        and (obj not in session.dirty or session.is_modified(obj, include_collections=False))
+    ]
+    if not touched:
+        return
+
+    try:
+        with session.no_autoflush:
+            versions = {}
+            for obj in touched:
+                shop_id = _shop_id_of(obj)
+                if shop_id is None:
+                    continue
+                if shop_id not in versions:
+                    versions[shop_id] = CatalogueVersion.touch(shop_id)
+                if isinstance(obj, Product) and obj not in session.deleted:
+                    obj.catalogue_version = versions[shop_id]
+    except Exception as e:
+        # Never block a write because the cache is unavailable
+        logger.warning(f"Catalogue version bump failed: {str(e)}")
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_committed_catalogues(session):
+    for shop_id in session.info.pop(_PENDING, ()):
+        try:
+            # Only bump live counters; an evicted one is re-seeded from committed rows
+            if cache.get(VERSION_KEY.format(shop_id=shop_id)) is not None:
+                cache.cache.inc(VERSION_KEY.format(shop_id=shop_id))
+        except Exception as e:
+            logger.warning(f"Catalogue version bump failed for shop {shop_id}: {str(e)}")
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_pending_catalogues(session, previous_transaction):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,73 @@
+from typing import Dict, Iterable, List
+from ..models import Product
+
+PLACEHOLDER_IMAGE = '/static/images/product-placeholder.png'
+
+# Column order of the wire format; decoders read the header, not this tuple
+FIELDS = (
+    'id', 'name', 'price', 'stock', 'category_id', 'unit', 'minimum_unit',
+    'barcode', 'sku', 'image_url', 'is_discountable', 'low_stock_threshold',
+    'is_combo', 'combination_size', 'combination_price', 'combination_unit_price',
+)
+
+# Low-cardinality columns sent as indexes into a per-payload dictionary
+DICTIONARY_FIELDS = ('category_id', 'unit')
+
+
+class ColumnarCatalogue:
+    """
+    POS products as one array per field instead of one object per product:
+
+        {"format": "columnar", "count": 2,
+         "fields": ["id", "name", ...],
+         "columns": [[4, 9], ["Sugar 1kg", "Milk 500ml"], ...],
+         "dictionaries": {"category_id": [3, 7], "unit": ["kg", "piece"]}}
+
+    Each key is sent once rather than once per product, the category and unit
+    columns are small integers, and the combo fields are worked out here so
+    the till does not (they are null for products that are not combos).
+    static/js/pos/CatalogueDecoder.js turns a payload back into product objects.
+    """
+
+    @staticmethod
+    def encode(products: Iterable[Product]) -> Dict:
+        columns: Dict[str, List] = {field: [] for field in FIELDS}
+        dictionaries: Dict[str, Dict] = {field: {} for field in DICTIONARY_FIELDS}
+
+        for p in products:
+            combo = bool(p.combination_size and p.combination_size > 1)
+            row = {
+                'id': p.id,
+                'name': p.name,
+                'price': float(p.selling_price),
+                'stock': p.stock,
+                'category_id': p.category_id,
+                'unit': p.unit.value if p.unit else None,
+                'minimum_unit': float(p.minimum_unit) if p.minimum_unit else 1.0,
+                'barcode': p.barcode,
+                'sku': p.sku,
+                # The placeholder is the decoder's default, so it is not repeated per product
+                'image_url': p.image_url if p.image_url != PLACEHOLDER_IMAGE else None,
+                'is_discountable': bool(p.is_discountable),
+                'low_stock_threshold': p.low_stock_threshold,
+                'is_combo': combo,
+                'combination_size': p.combination_size if combo else None,
+                'combination_price': float(p.combination_price or 0) if combo else None,
+                'combination_unit_price': (
+                    float(p.combination_unit_price) if p.combination_unit_price
+                    else round(float(p.combination_price or 0) / p.combination_size, 2)
+                ) if combo else None,
+            }
+            for field in DICTIONARY_FIELDS:
+                row[field] = dictionaries[field].setdefault(row[field], len(dictionaries[field]))
+            for field in FIELDS:
+                columns[field].append(row[field])
+
+        return {
+            'format': 'columnar',
+            'count': len(columns['id']),
+            'fields': list(FIELDS),
+            'columns': [columns[field] for field in FIELDS],
+            'dictionaries': {field: list(values) for field, values in dictionaries.items()},
+            'defaults': {'image_url': PLACEHOLDER_IMAGE}
+        }
@@ -1,12 +1,12 @@
-from flask import request, jsonify, render_template
+from flask import request, jsonify, render_template, current_app, json
 from flask.views import MethodView
 from flask_login import login_required, current_user
 from marshmallow import ValidationError
-from decimal import Decimal, InvalidOperation, getcontext
-from sqlalchemy import and_
+from decimal import Decimal, InvalidOperation
 from .repositories import ProductRepository, CategoryRepository, SaleRepository
 from .services import (
     SalesService,
+    InsufficientStockError,
 
     ProductService,
     ReceiptService,
@@ -17,6 +17,8 @@ from .services import (
 )
 from .schemas import (
     CheckoutSchema,
+    OfflineSaleSchema,
+    OfflineSyncSchema,
     CartItemSchema,
     ProductSearchSchema,
     ReceiptSchema
@@ -25,9 +27,21 @@ from .schemas import (
 
 from app import shop_access_required, role_required, csrf, db 
 from app.models import Role, Shop, Category, Product, Sale, CartItem
+from app.utils.loading import loading_profile
+from app.utils.compression import compressed_response
+from app.utils.profiling import query_budget
+from .columnar import ColumnarCatalogue
 import logging
 logger = logging.getLogger(__name__)
 
+def stored_receipt_response(receipt, body, mimetype, variant):
+    """A stored receipt body with its content hash as ETag; receipts never change, so clients keep them"""
+    response = current_app.response_class(body, mimetype=mimetype)
+    response.set_etag(f'{receipt.content_hash}-{variant}')
+    response.headers['Cache-Control'] = f"private, max-age={current_app.config.get('RECEIPT_MAX_AGE', 31536000)}, immutable"
+    return response.make_conditional(request)
+
+
 class SalesController(MethodView):
     decorators = [login_required, shop_access_required]
 
@@ -46,9 +60,14 @@ class ProductAPIController(MethodView):
     decorators = [login_required, shop_access_required]
 
     @role_required(Role.CASHIER, Role.ADMIN, Role.TENANT)
+    @query_budget(4)
     def get(self, shop_id):
-        """API: Return products sorted by most sold"""
+        """API: Return products sorted by most sold (?format=columnar for a ColumnarCatalogue)"""
         try:
+            if request.args.get('format') == 'columnar':
+                catalogue = ColumnarCatalogue.encode(ProductRepository.get_available_for_sale(shop_id))
+                return compressed_response(json.dumps(catalogue))
+
             products = ProductService.get_available_for_sale(shop_id)
             return jsonify(products)
         except Exception as e:
@@ -127,10 +146,10 @@ class TransactionController(MethodView):
                 return self._format_recent_transactions(transactions)
 
             elif transaction_id:
-                sale = self._get_sale_with_items(transaction_id, shop_id)
-                if not sale:
+                details = ReceiptService.get_details(shop_id, transaction_id)
+                if details is None:
                     return jsonify({'error': 'Sale not found'}), 404
-                return self._format_sale_details(sale)
+                return self._details_response(details)
 
             return self._get_paginated_transactions(shop_id)
 
@@ -141,6 +160,17 @@ class TransactionController(MethodView):
             logger.error(f"Failed to get transactions: {str(e)}", exc_info=True)
             return jsonify({'error': 'Failed to get transactions'}), 500
 
+    @staticmethod
+    def _details_response(details):
+        """
+        Stored details with the sale's current status and customer. These change
+        after checkout, so unlike receipts the details are revalidated on every use.
+        """
+        response = current_app.response_class(json.dumps(details), mimetype='application/json')
+        response.add_etag()
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+
     def _get_recent_transactions(self, shop_id, limit):
         """Get recent transactions with optimized query"""
         return db.session.query(Sale)\
@@ -155,130 +185,11 @@ class TransactionController(MethodView):
                     Sale.payment_method,
                     Sale.customer_name,
                     Sale.status
-                )
+                ),
+                *loading_profile('report', Sale)
             )\
             .all()
 
-    def _get_sale_with_items(self, sale_id, shop_id):
-        """Get complete sale data with items and product info"""
-        return db.session.query(Sale)\
-            .filter(and_(
-                Sale.id == sale_id,
-                Sale.shop_id == shop_id
-            ))\
-            .options(
-                db.joinedload(Sale.cart_items)
-                .joinedload(CartItem.product)
-                .load_only(
-                    Product.id,
-                    Product.name,
-                    Product.image_url,
-                    Product.selling_price,
-                    Product.combination_size,
-                    Product.combination_price,
-                    Product.combination_unit_price
-                )
-            )\
-            .first()
-
-    def _format_sale_details(self, sale):
-        """Format detailed sale response with proper decimal handling"""
-        getcontext().prec = 8  # Set decimal precision
-
-        def decimal_to_float(value):
-            """Safely convert Decimal to float"""
-            return float(value) if value is not None else 0.0
-
-        def calculate_item_subtotal(item, unit_price):
-            """Calculate subtotal with proper decimal handling"""
-            try:
-                if isinstance(item.quantity, Decimal) and isinstance(unit_price, Decimal):
-                    return decimal_to_float(item.quantity * unit_price)
-                elif isinstance(item.quantity, Decimal):
-                    return decimal_to_float(item.quantity * Decimal(str(unit_price)))
-                elif isinstance(unit_price, Decimal):
-                    return decimal_to_float(Decimal(str(item.quantity)) * unit_price)
-                return float(item.quantity * unit_price)
-            except Exception as e:
-                logger.error(f"Error calculating subtotal: {str(e)}")
-                return 0.0
-
-        def get_item_price_details(item):
-            product = item.product
-            if not product:
-                unit_price = Decimal(str(item.unit_price)) if item.unit_price else Decimal('0')
-                return {
-                    'unit_price': unit_price,
-                    'is_combo': False,
-                    'combo_details': None
-                }
-            
-            if product.is_combo:
-                combo_size = Decimal(str(product.combination_size))
-                combo_price = Decimal(str(product.combination_price)) if product.combination_price else combo_size * Decimal(str(product.selling_price))
-                unit_price = Decimal(str(product.combination_unit_price)) if product.combination_unit_price else Decimal(str(product.selling_price))
-                
-                quantity = Decimal(str(item.quantity))
-                combo_units = (quantity // combo_size).to_integral_value()
-                remainder = quantity % combo_size
-                
-                return {
-                    'unit_price': unit_price,
-                    'is_combo': True,
-                    'combo_details': {
-                        'size': decimal_to_float(combo_size),
-                        'combo_price': decimal_to_float(combo_price),
-                        'combo_units': decimal_to_float(combo_units),
-                        'remainder_units': decimal_to_float(remainder),
-                        'total_combo_price': decimal_to_float(combo_units * combo_price),
-                        'remainder_price': decimal_to_float(remainder * unit_price)
-                    }
-                }
-            else:
-                return {
-                    'unit_price': Decimal(str(product.selling_price)),
-                    'is_combo': False,
-                    'combo_details': None
-                }
-
-        items = []
-        for item in sale.cart_items:
-            price_details = get_item_price_details(item)
-            subtotal = calculate_item_subtotal(item, price_details['unit_price'])
-            
-            items.append({
-                'product_id': item.product.id if item.product else None,
-                'name': item.product.name if item.product else 'Unknown Product',
-                'quantity': decimal_to_float(item.quantity),
-                'unit_price': decimal_to_float(price_details['unit_price']),
-                'current_price': decimal_to_float(item.product.selling_price) if item.product else decimal_to_float(item.unit_price),
-                'image_url': item.product.image_url if item.product else None,
-                'subtotal': subtotal,
-                'is_combo': price_details['is_combo'],
-                'combo_details': price_details['combo_details'],
-                'applied_discount': decimal_to_float(item.discount) if hasattr(item, 'discount') else 0.0
-            })
-
-        return jsonify({
-            'id': sale.id,
-            'date': sale.date.isoformat(),
-            'total': decimal_to_float(sale.total),
-            'payment_method': sale.payment_method,
-            'status': sale.status.value,
-            'customer_name': sale.customer_name or 'Walk-in',
-            'customer_phone': sale.customer_phone,
-            'items': items,
-            'pricing_summary': {
-                'subtotal': decimal_to_float(sale.subtotal) if hasattr(sale, 'subtotal') else None,
-                'total_discount': decimal_to_float(sum(
-                    Decimal(str(item['quantity'])) * Decimal(str(item['unit_price'])) * 
-                    (Decimal(str(item['applied_discount'])) / Decimal('100'))
-                    for item in items
-                )),
-                'total_tax': decimal_to_float(sale.tax) if hasattr(sale, 'tax') else None
-            }
-        })
-
     def _format_recent_transactions(self, transactions):
         """Format recent transactions response"""
         return jsonify([{
@@ -297,12 +208,16 @@ class TransactionController(MethodView):
 
     
     @role_required(Role.CASHIER, Role.ADMIN, Role.TENANT)
+    @query_budget(12)
     def post(self, shop_id):
         """
         Process checkout - POST /shops/<shop_id>/transactions
         """
         try:
             checkout_data = CheckoutSchema().load(request.json)
+            idempotency_key = request.headers.get('Idempotency-Key') or checkout_data.get('idempotency_key')
+            if idempotency_key and len(idempotency_key) > 64:
+                return jsonify({'error': {'idempotency_key': ['Longer than maximum length 64.']}}), 400
 
             result = SalesService.process_checkout(
                 shop_id=shop_id,
@@ -312,18 +227,24 @@ class TransactionController(MethodView):
                 customer_data={
                     'name': checkout_data.get('customer_name'),
                     'phone': checkout_data.get('customer_phone')
-                }
+                },
+                idempotency_key=idempotency_key
             )
 
-            return jsonify({
+            response = jsonify({
                 'success': True,
                 'sale_id': result['sale_id'],
                 'receipt': result['receipt'],
                 'amount_paid': result['amount_paid']
             })
+            if result.get('replayed'):
+                response.headers['Idempotent-Replayed'] = 'true'
+            return response
 
         except ValidationError as e:
             return jsonify({'error': e.messages}), 400
+        except InsufficientStockError as e:
+            return jsonify({'error': str(e), 'failed_items': e.lines}), 409
         except ValueError as e:
             return jsonify({'error': str(e)}), 400
         except Exception as e:
@@ -331,21 +252,72 @@ class TransactionController(MethodView):
             return jsonify({'error': 'Checkout processing failed'}), 500
 
 
+class OfflineSyncController(MethodView):
+    decorators = [login_required, shop_access_required, csrf.exempt]
+
+    @role_required(Role.CASHIER, Role.ADMIN, Role.TENANT)
+    @query_budget(16)
+    def post(self, shop_id):
+        """
+        Sync offline sales - POST /shops/<shop_id>/transactions/sync
+        Always answers 200 with one result per sale unless the batch itself is invalid
+        """
+        try:
+            batch = OfflineSyncSchema().load(request.json or {})
+            max_batch = current_app.config.get('OFFLINE_SYNC_MAX_BATCH', 500)
+            if len(batch['sales']) > max_batch:
+                return jsonify({'error': f'At most {max_batch} sales per sync'}), 413
+
+            # One bad entry is reported in its slot; the rest of the batch still syncs
+            results, valid, positions = [None] * len(batch['sales']), [], []
+            schema = OfflineSaleSchema()
+            for index, entry in enumerate(batch['sales']):
+                try:
+                    valid.append(schema.load(entry))
+                    positions.append(index)
+                except ValidationError as e:
+                    results[index] = {
+                        'index': index,
+                        'idempotency_key': entry.get('idempotency_key'),
+                        'status': 'rejected',
+                        'error': e.messages
+                    }
+
+            for index, result in zip(positions, SalesService.sync_offline_sales(shop_id, current_user.id, valid)):
+                results[index] = dict(result, index=index)
+
+            return jsonify({
+                'success': True,
+                'results': results,
+                'created': sum(1 for r in results if r['status'] == 'created')
+            })
+
+        except ValidationError as e:
+            return jsonify({'error': e.messages}), 400
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Offline sync failed: {str(e)}")
+            return jsonify({'error': 'Offline sync failed'}), 500
+
+
 class ReceiptController(MethodView):
     decorators = [login_required, shop_access_required]
     
     @role_required(Role.CASHIER, Role.ADMIN, Role.TENANT)
     def get(self, shop_id):
         """
-        Get receipt - GET /api/shops/<shop_id>/receipts
+        Get receipt - GET /api/shops/<shop_id>/receipts?sale_id=<id>
+        ?format=thermal sends the ESC/POS text for the receipt printer
         """
         try:
             data = ReceiptSchema().load(request.args)
-            receipt = ReceiptService.generate(
-                sale_id=data['sale_id'],
-                format=data['format']
-            )
-            return jsonify(receipt)
+            receipt = ReceiptService.get(shop_id, data['sale_id'])
+            if receipt is None:
+                return jsonify({'error': 'Sale not found'}), 404
+            if data['format'] == 'thermal':
+                return stored_receipt_response(receipt, receipt.thermal, 'text/plain', 'thermal')
+            return stored_receipt_response(receipt, receipt.document, 'application/json', 'json')
         except ValidationError as e:
             return jsonify({'error': e.messages}), 400
         except Exception as e:
@@ -0,0 +1,275 @@
+import hashlib
+import logging
+import textwrap
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from flask import current_app, json
+from sqlalchemy import or_
+from app import db
+from ..models import Sale, SaleReceipt, Shop, User
+from .repositories import SaleRepository
+from ..utils.time import to_kenya_time
+
+logger = logging.getLogger(__name__)
+
+# ESC/POS commands. Arguments are sent as ASCII digits ('0'/'1' select the same
+# modes as 0x00/0x01) so the text never holds a NUL, which PostgreSQL text rejects.
+INIT = '\x1b@'
+ALIGN_LEFT = '\x1ba0'
+ALIGN_CENTER = '\x1ba1'
+BOLD_ON = '\x1bE1'
+BOLD_OFF = '\x1bE0'
+FEED = '\x1bd\x03'  # Feed three lines, clear of the cutter
+CUT = '\x1dV1'  # Partial cut
+
+
+def _amount(value) -> float:
+    return float(Decimal(str(value or 0)).quantize(Decimal('0.01')))
+
+
+def _quantity(value) -> str:
+    return f"{Decimal(str(value)).normalize():f}"
+
+
+def _columns(left: str, right: str, width: int) -> str:
+    """`left` and `right` on one line, `left` cut short if both do not fit"""
+    room = max(width - len(right) - 1, 1)
+    return f"{left[:room]:<{room}} {right}"
+
+
+class ReceiptStore:
+    """
+    Receipts written once, in the checkout transaction, from the lines the
+    sale was priced with (SalesService._price_cart): the receipt JSON, the
+    transaction detail JSON and the ESC/POS text for the thermal printer,
+    with a content hash for the ETag.
+
+    A stored receipt is never rebuilt, so it keeps the prices charged and the
+    shop and cashier as they were at the sale. Sales from before receipts
+    were stored get theirs written on first read, from their cart items.
+
+    The sale's status and customer change after checkout, so they are not
+    stored with the details; get_details reads them from the sale.
+    """
+
+    @classmethod
+    def build(cls, sale: Sale, lines: List[Dict]) -> Dict:
+        """sale_receipts row for a flushed sale and its receipt_lines"""
+        # Both are in the identity map during a request (TenantContext, the user loader)
+        shop = db.session.get(Shop, sale.shop_id)
+        cashier = db.session.get(User, sale.user_id) if sale.user_id else None
+
+        document = cls.document(sale, lines, shop, cashier)
+        details = cls.details(sale, lines)
+        thermal = cls.thermal(document, current_app.config.get('RECEIPT_LINE_WIDTH', 32))
+        body, detail_body = json.dumps(document), json.dumps(details)
+        return {
+            'sale_id': sale.id,
+            'shop_id': sale.shop_id,
+            'content_hash': hashlib.sha256(f'{body}\n{detail_body}\n{thermal}'.encode()).hexdigest(),
+            'document': body,
+            'details': detail_body,
+            'thermal': thermal,
+            'created_at': datetime.utcnow()
+        }
+
+    @classmethod
+    def write(cls, sales: List[Tuple[Sale, List[Dict]]]) -> None:
+        """Insert the receipts of flushed sales in one statement (caller commits)"""
+        if sales:
+            db.session.execute(SaleReceipt.__table__.insert(), [cls.build(sale, lines) for sale, lines in sales])
+
+    @classmethod
+    def get(cls, shop_id: int, sale_id: int) -> Optional[SaleReceipt]:
+        """The sale's receipt, or None if the shop has no such sale or it was deleted"""
+        found = cls._find(shop_id, sale_id)
+        return found[0] if found else None
+
+    @classmethod
+    def get_details(cls, shop_id: int, sale_id: int) -> Optional[Dict]:
+        """The sale's stored transaction details, with its current status and customer"""
+        found = cls._find(shop_id, sale_id)
+        if found is None:
+            return None
+        receipt, state = found
+        details = json.loads(receipt.details)
+        details.update(state)
+        return details
+
+    @classmethod
+    def _find(cls, shop_id: int, sale_id: int) -> Optional[Tuple[SaleReceipt, Dict]]:
+        """The stored (or backfilled) receipt of a sale that is not deleted, and the sale's current state"""
+        row = db.session.query(Sale.status, Sale.customer_name, Sale.customer_phone, SaleReceipt)\
+            .outerjoin(SaleReceipt, SaleReceipt.sale_id == Sale.id)\
+            .filter(
+                Sale.id == sale_id,
+                Sale.shop_id == shop_id,
+                or_(Sale.is_deleted == False, Sale.is_deleted == None)
+            )\
+            .first()
+        if row is None:
+            return None
+
+        status, customer_name, customer_phone, receipt = row
+        if receipt is None:
+            receipt = cls._backfill(shop_id, sale_id)
+            if receipt is None:
+                return None
+        return receipt, {
+            'status': status.value,
+            'customer_name': customer_name or 'Walk-in',
+            'customer_phone': customer_phone
+        }
+
+    @classmethod
+    def _backfill(cls, shop_id: int, sale_id: int) -> Optional[SaleReceipt]:
+        sale = SaleRepository.get_sale_with_items(sale_id, shop_id)
+        if sale is None:
+            return None
+
+        # The charged prices are on the cart items; how a combo line was split is not
+        lines = [{
+            'product_id': item.product_id,
+            'name': item.product.name if item.product else 'Unknown Product',
+            'image_url': item.product.image_url if item.product else None,
+            'quantity': item.quantity,
+            'unit_price': item.unit_price,
+            'total': item.total_price,
+            'discount': item.discount,
+            'combo': None
+        } for item in sale.cart_items]
+        receipt = SaleReceipt(**cls.build(sale, lines))
+        try:
+            receipt = db.session.merge(receipt)
+            db.session.commit()
+        except Exception as e:
+            # Served all the same; the next read tries the write again
+            db.session.rollback()
+            logger.warning(f"[Shop {shop_id}] Receipt write failed for sale {sale_id}: {str(e)}")
+        return receipt
+
+    @staticmethod
+    def document(sale: Sale, lines: List[Dict], shop: Shop, cashier: Optional[User]) -> Dict:
+        """The receipt as served by the receipts API"""
+        tax = next((t for t in shop.taxes if t.is_active and not t.is_deleted), None)
+        return {
+            'id': sale.id,
+            'date': to_kenya_time(sale.date).strftime('%Y-%m-%d %H:%M'),
+            'shop': {
+                'name': shop.name,
+                'location': shop.location,
+                'phone': shop.phone,
+                'currency': shop.currency or 'KES',
+                'tax_id': tax.id if tax else None,
+                'tax_name': tax.name if tax else None,
+                'kra_code': tax.kra_code if tax else None
+            },
+            'items': [{
+                'product_id': line['product_id'],
+                'name': line['name'],
+                'quantity': float(line['quantity']),
+                'unit_price': _amount(line['unit_price']),
+                'total': _amount(line['total']),
+                'combo': {
+                    'size': float(line['combo']['size']),
+                    'combo_units': float(line['combo']['combo_units']),
+                    'combo_price': _amount(line['combo']['combo_price'])
+                } if line['combo'] else None
+            } for line in lines],
+            'subtotal': _amount(sale.subtotal),
+            'tax': _amount(sale.tax),
+            'total': _amount(sale.total),
+            'payment_method': sale.payment_method,
+            'cashier': cashier.username if cashier else 'System',
+            'customer': {
+                'name': sale.customer_name,
+                'phone': sale.customer_phone
+            } if sale.customer_name else None,
+            # For receipt tracking
+            'barcode': f"RECEIPT-{sale.id}-{sale.date.strftime('%Y%m%d')}"
+        }
+
+    @staticmethod
+    def details(sale: Sale, lines: List[Dict]) -> Dict:
+        """The sale as served by the transaction detail API, less its status and customer (see get_details)"""
+        items = []
+        for line in lines:
+            combo = line['combo']
+            items.append({
+                'product_id': line['product_id'],
+                'name': line['name'],
+                'quantity': float(line['quantity']),
+                'unit_price': _amount(line['unit_price']),
+                'image_url': line['image_url'],
+                'subtotal': _amount(line['total']),
+                'is_combo': combo is not None,
+                'combo_details': {
+                    'size': float(combo['size']),
+                    'combo_price': _amount(combo['combo_price']),
+                    'combo_units': float(combo['combo_units']),
+                    'remainder_units': float(combo['remainder_units']),
+                    'total_combo_price': _amount(combo['total_combo_price']),
+                    'remainder_price': _amount(combo['remainder_price'])
+                } if combo else None,
+                'applied_discount': float(line.get('discount') or 0)
+            })
+
+        return {
+            'id': sale.id,
+            'date': sale.date.isoformat(),
+            'total': _amount(sale.total),
+            'payment_method': sale.payment_method,
+            'items': items,
+            'pricing_summary': {
+                'subtotal': _amount(sale.subtotal),
+                'total_discount': _amount(sum(
+                    Decimal(str(line['quantity'])) * Decimal(str(line['unit_price']))
+                    * Decimal(str(line.get('discount') or 0)) / Decimal('100')
+                    for line in lines
+                )),
+                'total_tax': _amount(sale.tax)
+            }
+        }
+
+    @staticmethod
+    def thermal(document: Dict, width: int) -> str:
+        """The receipt document laid out for a `width`-column ESC/POS printer"""
+        shop, currency = document['shop'], document['shop']['currency']
+        rule = '-' * width
+        out = [INIT + ALIGN_CENTER + BOLD_ON + shop['name'][:width] + BOLD_OFF]
+        out += textwrap.wrap(shop['location'] or '', width)
+        if shop['phone']:
+            out.append(f"Tel: {shop['phone']}")
+        if shop['kra_code']:
+            out.append(f"KRA: {shop['kra_code']}")
+
+        out.append(ALIGN_LEFT + rule)
+        out.append(_columns(f"Receipt #{document['id']}", document['date'], width))
+        out.append(f"Cashier: {document['cashier']}"[:width])
+        out.append(rule)
+
+        for item in document['items']:
+            out += textwrap.wrap(item['name'], width) or ['']
+            combo = item['combo']
+            detail = (
+                f"  {_quantity(item['quantity'])} ({combo['combo_units']:g} x {combo['size']:g} @ {combo['combo_price']:.2f})"
+                if combo else f"  {_quantity(item['quantity'])} x {item['unit_price']:.2f}"
+            )
+            out.append(_columns(detail, f"{item['total']:.2f}", width))
+
+        out.append(rule)
+        out.append(_columns('Subtotal', f"{document['subtotal']:.2f}", width))
+        if document['tax']:
+            out.append(_columns(shop['tax_name'] or 'Tax', f"{document['tax']:.2f}", width))
+        out.append(BOLD_ON + _columns('TOTAL', f"{currency} {document['total']:.2f}", width) + BOLD_OFF)
+        out.append(_columns('Paid by', document['payment_method'].replace('_', ' ').upper(), width))
+        if document['customer']:
+            out.append(f"Customer: {document['customer']['name']}"[:width])
+            if document['customer']['phone']:
+                out.append(f"Phone: {document['customer']['phone']}"[:width])
+
+        out.append(rule)
+        out.append(ALIGN_CENTER + document['barcode'])
+        out.append('Thank you for shopping with us!'[:width])
+        return '\n'.join(out) + '\n' + FEED + CUT
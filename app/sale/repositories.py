@@ -1,50 +1,69 @@
 from flask import current_app
-from sqlalchemy import func, desc, and_, or_
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from sqlalchemy import func, desc, and_, or_, case, select
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Optional, Set, Tuple
 from .. import db
-from ..models import Product, Category, Sale, CartItem
+from ..models import Product, Category, Sale, CartItem, ProductSalesRank, ShopDailySales, ShopDailyProductSales
+from ..utils.time import kenya_day_bounds, to_kenya_time
+from ..utils.upsert import upsert
+from ..utils.loading import loading_profile
+from ..reports.store import ClosedReportStore
 from sqlalchemy.orm import contains_eager
-from sqlalchemy.orm import joinedload, with_loader_criteria
+from sqlalchemy.orm import joinedload, selectinload, with_loader_criteria
 from decimal import Decimal, InvalidOperation
 
 class ProductRepository:
 
     @staticmethod
-    def get_available_for_sale(shop_id: int) -> List[Product]:
+    def get_available_for_sale(shop_id: int, changed_since: Optional[int] = None) -> List[Product]:
         """
         Get all active products available for sale in the shop,
-        sorted by total quantity sold in descending order.
+        sorted by their sales rank (see SalesRankRepository) in descending order.
+        Args:
+            shop_id: ID of the shop
+            changed_since: Only return products written at or after this catalogue version
         """
-        # Subquery to get total quantity sold per product
-        sale_totals = (
-            db.session.query(
-                CartItem.product_id,
-                func.coalesce(func.sum(CartItem.quantity), 0).label('total_sold')
+        query = (
+            db.session.query(Product)
+            .join(Category)
+            .outerjoin(
+                ProductSalesRank,
+                and_(
+                    ProductSalesRank.product_id == Product.id,
+                    ProductSalesRank.shop_id == shop_id
+                )
             )
-            .join(Sale, CartItem.sale_id == Sale.id)
             .filter(
-                or_(Sale.shop_id == shop_id, Sale.shop_id == None),
-                or_(Sale.is_deleted == False, Sale.is_deleted == None)
+                Category.shop_id == shop_id,
+                Category.is_active == True,
+                Product.is_active == True,
+                Product.stock > 0
+            )
+            .options(
+                contains_eager(Product.category),
+                selectinload(Product.supplier),
+                *loading_profile('pos', Product)
             )
-            .group_by(CartItem.product_id)
-            .subquery()
         )
 
-        # Main query: fetch product + join with sale totals
-        return (
-            db.session.query(Product)
-            .join(Category)
-            .outerjoin(sale_totals, sale_totals.c.product_id == Product.id)
+        if changed_since is not None:
+            query = query.filter(Product.catalogue_version >= changed_since)
+
+        return query.order_by(ProductSalesRank.score.desc().nullslast(), Product.name).all()
+
+    @staticmethod
+    def get_available_ids(shop_id: int) -> List[int]:
+        """IDs of every product currently available for sale in the shop"""
+        rows = db.session.query(Product.id)\
+            .join(Category)\
             .filter(
                 Category.shop_id == shop_id,
                 Category.is_active == True,
                 Product.is_active == True,
                 Product.stock > 0
-            )
-            .order_by(sale_totals.c.total_sold.desc().nullslast())
+            )\
             .all()
-        )
+        return [r.id for r in rows]
 
 
     @staticmethod
@@ -61,22 +80,24 @@ class ProductRepository:
     @staticmethod
     def get_most_sold_products(shop_id: int, limit: int = 20) -> List[Product]:
         """
-        Return the top 'limit' most sold products in a shop, sorted by quantity sold.
+        Return the top 'limit' most sold products in a shop, sorted by sales rank.
         Only includes products that are active and in stock.
         """
         return (
             db.session.query(Product)
-            .join(CartItem, Product.id == CartItem.product_id)
-            .join(Sale, CartItem.sale_id == Sale.id)
+            .join(
+                ProductSalesRank,
+                and_(
+                    ProductSalesRank.product_id == Product.id,
+                    ProductSalesRank.shop_id == shop_id
+                )
+            )
             .filter(
                 Product.shop_id == shop_id,
                 Product.is_active == True,
                 Product.stock > 0,
-                Sale.shop_id == shop_id,
-                Sale.is_deleted == False,
             )
-            .group_by(Product.id)
-            .order_by(func.sum(CartItem.quantity).desc())
+            .order_by(ProductSalesRank.score.desc())
             .limit(limit)
             .all()
         )
@@ -120,6 +141,40 @@ class ProductRepository:
 
 
 
+    @staticmethod
+    def get_by_ids_for_sale(
+        shop_id: int,
+        product_ids: List[int],
+        category_id: Optional[int] = None,
+        in_stock_only: bool = True
+    ) -> List[Product]:
+        """
+        Fetch search hits by primary key, keeping only sellable products.
+        Results are returned in the order of `product_ids`.
+        """
+        if not product_ids:
+            return []
+
+        filters = [
+            Product.id.in_(product_ids),
+            Category.shop_id == shop_id,
+            Category.is_active == True,
+            Product.is_active == True
+        ]
+        if in_stock_only:
+            filters.append(Product.stock > 0)
+        if category_id:
+            filters.append(Product.category_id == category_id)
+
+        products = db.session.query(Product)\
+            .join(Category)\
+            .filter(and_(*filters))\
+            .options(contains_eager(Product.category), *loading_profile('pos', Product))\
+            .all()
+
+        position = {product_id: i for i, product_id in enumerate(product_ids)}
+        return sorted(products, key=lambda p: position[p.id])
+
     @staticmethod
     def get_featured_products(shop_id: int, limit: int = 12) -> List[Product]:
         """
@@ -151,10 +206,74 @@ class ProductRepository:
             Product.id.in_(product_ids),
             Product.shop_id == shop_id,
             Product.is_deleted == False
-        ).all()
+        ).options(*loading_profile('lean', Product)).all()
 
         return products
                 
+    @staticmethod
+    def decrement_stock(
+        shop_id: int,
+        quantities: Dict[int, Decimal],
+        catalogue_version: Optional[int] = None,
+        new_stock: Optional[Dict[int, float]] = None
+    ) -> Optional[Set[int]]:
+        """
+        Apply guarded relative stock decrements for several products in one statement:
+        ``stock = stock - qty WHERE stock >= qty``. Nothing is read back into Python
+        first, so concurrent tills never overwrite each other's decrements.
+        Args:
+            shop_id: ID of the shop that owns the products
+            quantities: Mapping of product ID to the quantity to take off
+            catalogue_version: Catalogue version to stamp on the updated rows
+            new_stock: Filled with product ID to stock after the decrement, when the
+                database can report it (UPDATE ... RETURNING)
+        Returns:
+            The set of product IDs that could not be decremented (empty when every
+            line succeeded), or None when some lines failed but the database cannot
+            report which ones (no UPDATE ... RETURNING support).
+        """
+        if not quantities:
+            return set()
+
+        products = Product.__table__
+        qty = case(
+            {product_id: quantity for product_id, quantity in quantities.items()},
+            value=products.c.id
+        )
+        values = {'stock': products.c.stock - qty}
+        if catalogue_version is not None:
+            values['catalogue_version'] = catalogue_version
+
+        stmt = products.update()\
+            .where(
+                and_(
+                    products.c.id.in_(list(quantities)),
+                    products.c.shop_id == shop_id,
+                    products.c.stock >= qty
+                )
+            )\
+            .values(**values)
+
+        if db.engine.dialect.full_returning:
+            rows = db.session.execute(stmt.returning(products.c.id, products.c.stock)).all()
+            if new_stock is not None:
+                new_stock.update((row.id, row.stock) for row in rows)
+            return set(quantities) - {row.id for row in rows}
+
+        result = db.session.execute(stmt)
+        return set() if result.rowcount == len(quantities) else None
+
+    @staticmethod
+    def get_short_stock(shop_id: int, quantities: Dict[int, Decimal]) -> Dict[int, Product]:
+        """
+        Return the products whose current stock cannot cover the requested quantity
+        """
+        products = Product.query.filter(
+            Product.id.in_(list(quantities)),
+            Product.shop_id == shop_id
+        ).options(*loading_profile('lean', Product)).all()
+        return {p.id: p for p in products if Decimal(str(p.stock)) < quantities[p.id]}
+
     @staticmethod
     def update_stock(product_id: int, quantity_change: int) -> bool:
         """
@@ -185,6 +304,275 @@ class ProductRepository:
 
 
 
+class SalesRankRepository:
+    """
+    Maintains the product_sales_rank rollup. Checkout adds sold quantities
+    incrementally; rebuild() recomputes it from sales history so the score
+    can decay to a trailing window (SALES_RANK_WINDOW_DAYS).
+    """
+
+    @staticmethod
+    def record_sales(shop_id: int, quantities: Dict[int, Decimal], sold_at: Optional[datetime] = None) -> None:
+        """
+        Add sold quantities to the rank rows of a shop (caller commits)
+        Args:
+            shop_id: ID of the shop
+            quantities: Mapping of product ID to quantity sold
+            sold_at: Time of the sale, defaults to now
+        """
+        sold_at = sold_at or datetime.utcnow()
+        # Stable key order keeps concurrent upserts from deadlocking each other
+        rows = [{
+            'shop_id': shop_id,
+            'product_id': product_id,
+            'units_sold': quantities[product_id],
+            'score': quantities[product_id],
+            'last_sold_at': sold_at
+        } for product_id in sorted(quantities)]
+
+        upsert(
+            ProductSalesRank.__table__, rows,
+            keys=('shop_id', 'product_id'),
+            increment=('units_sold', 'score'),
+            replace=('last_sold_at',)
+        )
+
+    @staticmethod
+    def rebuild(shop_id: Optional[int] = None, window_days: Optional[int] = None) -> int:
+        """
+        Recompute rank rows from sales history (caller commits)
+        Args:
+            shop_id: Limit the rebuild to one shop, or None for all shops
+            window_days: Score only sales from the trailing N days; None or 0 scores all-time sales
+        Returns:
+            Number of rank rows written
+        """
+        now = datetime.utcnow()
+        quantity = func.coalesce(func.sum(CartItem.quantity), 0)
+        if window_days:
+            cutoff = now - timedelta(days=window_days)
+            score = func.coalesce(func.sum(case((Sale.date >= cutoff, CartItem.quantity), else_=0)), 0)
+        else:
+            score = quantity
+
+        query = db.session.query(
+            Sale.shop_id,
+            CartItem.product_id,
+            quantity.label('units_sold'),
+            score.label('score'),
+            func.max(Sale.date).label('last_sold_at')
+        )\
+            .join(Sale, CartItem.sale_id == Sale.id)\
+            .filter(Sale.shop_id != None, or_(Sale.is_deleted == False, Sale.is_deleted == None))\
+            .group_by(Sale.shop_id, CartItem.product_id)
+
+        if shop_id is not None:
+            query = query.filter(Sale.shop_id == shop_id)
+
+        rows = [{
+            'shop_id': r.shop_id,
+            'product_id': r.product_id,
+            'units_sold': r.units_sold,
+            'score': r.score,
+            'last_sold_at': r.last_sold_at,
+            'rebuilt_at': now
+        } for r in query]
+
+        upsert(
+            ProductSalesRank.__table__, rows,
+            keys=('shop_id', 'product_id'),
+            replace=('units_sold', 'score', 'last_sold_at', 'rebuilt_at')
+        )
+        return len(rows)
+
+
+class SalesRollupRepository:
+    """
+    Maintains the shop_daily_sales and shop_daily_product_sales rollups that
+    reports read from. Dates and hours are Africa/Nairobi local time.
+    """
+
+    REBUILD_BATCH_SIZE = 1000
+
+    @staticmethod
+    def record_sale(sale: Sale, lines: Dict[int, Dict[str, Decimal]]) -> None:
+        """
+        Add a flushed sale to the rollups in the checkout transaction (caller commits)
+        Args:
+            sale: The new sale; date, totals and user must be set
+            lines: Mapping of product ID to {'quantity', 'revenue', 'cost'} for the sale
+        """
+        SalesRollupRepository.record_sales([(sale, lines)])
+
+    @staticmethod
+    def record_sales(entries: List[Tuple[Sale, Dict[int, Dict[str, Decimal]]]]) -> None:
+        """
+        Add several flushed sales to the rollups in one upsert per table (caller commits)
+        Args:
+            entries: (sale, lines) pairs, as for record_sale
+        """
+        # Summed per rollup key first: one statement cannot touch the same row twice
+        daily, products = {}, {}
+        for sale, lines in entries:
+            local = to_kenya_time(sale.date)
+            total = Decimal(str(sale.total))
+            key = (sale.shop_id, local.date(), local.hour, sale.payment_method, sale.user_id or 0)
+            row = daily.setdefault(key, {
+                'shop_id': key[0],
+                'sale_date': key[1],
+                'hour': key[2],
+                'payment_method': key[3],
+                'user_id': key[4],
+                'transactions': 0,
+                'total': Decimal('0'),
+                'subtotal': Decimal('0'),
+                'tax': Decimal('0'),
+                'profit': Decimal('0'),
+                'items': Decimal('0'),
+                'largest_sale': total,
+                'smallest_sale': total
+            })
+            row['transactions'] += 1
+            row['total'] += total
+            row['subtotal'] += Decimal(str(sale.subtotal or 0))
+            row['tax'] += Decimal(str(sale.tax or 0))
+            row['profit'] += Decimal(str(sale.profit or 0))
+            row['items'] += sum((line['quantity'] for line in lines.values()), Decimal('0'))
+            row['largest_sale'] = max(row['largest_sale'], total)
+            row['smallest_sale'] = min(row['smallest_sale'], total)
+
+            for product_id, line in lines.items():
+                product_row = products.setdefault((sale.shop_id, local.date(), product_id), {
+                    'shop_id': sale.shop_id,
+                    'sale_date': local.date(),
+                    'product_id': product_id,
+                    'quantity': Decimal('0'),
+                    'revenue': Decimal('0'),
+                    'cost': Decimal('0'),
+                    'transactions': 0
+                })
+                product_row['quantity'] += line['quantity']
+                product_row['revenue'] += line['revenue']
+                product_row['cost'] += line['cost']
+                product_row['transactions'] += 1
+
+        # Stable key order keeps concurrent upserts from deadlocking each other
+        upsert(
+            ShopDailySales.__table__, [daily[key] for key in sorted(daily)],
+            keys=('shop_id', 'sale_date', 'hour', 'payment_method', 'user_id'),
+            increment=('transactions', 'total', 'subtotal', 'tax', 'profit', 'items'),
+            greatest=('largest_sale',),
+            least=('smallest_sale',)
+        )
+        upsert(
+            ShopDailyProductSales.__table__, [products[key] for key in sorted(products)],
+            keys=('shop_id', 'sale_date', 'product_id'),
+            increment=('quantity', 'revenue', 'cost', 'transactions')
+        )
+
+    @staticmethod
+    def rebuild(shop_id: Optional[int] = None, start: Optional[date] = None, end: Optional[date] = None) -> Tuple[int, int]:
+        """
+        Recompute rollup rows from sales history (caller commits)
+        Args:
+            shop_id: Limit the rebuild to one shop, or None for all shops
+            start: First local date to rebuild, or None for the earliest sale
+            end: Last local date to rebuild (inclusive), or None for the latest sale
+        Returns:
+            (shop_daily_sales rows, shop_daily_product_sales rows) written
+        """
+        sale_filters = [Sale.shop_id != None, or_(Sale.is_deleted == False, Sale.is_deleted == None)]
+        rollup_filters = {ShopDailySales: [], ShopDailyProductSales: []}
+        if shop_id is not None:
+            sale_filters.append(Sale.shop_id == shop_id)
+        if start is not None:
+            sale_filters.append(Sale.date >= kenya_day_bounds(start)[0])
+        if end is not None:
+            sale_filters.append(Sale.date < kenya_day_bounds(end)[1])
+
+        for model, filters in rollup_filters.items():
+            if shop_id is not None:
+                filters.append(model.shop_id == shop_id)
+            if start is not None:
+                filters.append(model.sale_date >= start)
+            if end is not None:
+                filters.append(model.sale_date <= end)
+            db.session.query(model).filter(*filters).delete(synchronize_session=False)
+        # Stored reports for the rebuilt days are re-rendered from the new rollups
+        ClosedReportStore.invalidate_range(shop_id, start, end)
+
+        # Narrow tuples streamed in batches; nothing is loaded as an entity
+        items = select(func.coalesce(func.sum(CartItem.quantity), 0))\
+            .where(CartItem.sale_id == Sale.id)\
+            .scalar_subquery()
+        sales = db.session.query(
+            Sale.shop_id, Sale.date, Sale.payment_method, Sale.user_id,
+            Sale.total, Sale.subtotal, Sale.tax, Sale.profit, items.label('items')
+        ).filter(*sale_filters).yield_per(SalesRollupRepository.REBUILD_BATCH_SIZE)
+
+        daily = {}
+        for row in sales:
+            local = to_kenya_time(row.date)
+            key = (row.shop_id, local.date(), local.hour, row.payment_method, row.user_id or 0)
+            total = Decimal(str(row.total))
+            acc = daily.get(key)
+            if acc is None:
+                acc = daily[key] = {
+                    'transactions': 0, 'total': Decimal('0'), 'subtotal': Decimal('0'), 'tax': Decimal('0'),
+                    'profit': Decimal('0'), 'items': Decimal('0'), 'largest_sale': total, 'smallest_sale': total
+                }
+            acc['transactions'] += 1
+            acc['total'] += total
+            acc['subtotal'] += Decimal(str(row.subtotal or 0))
+            acc['tax'] += Decimal(str(row.tax or 0))
+            acc['profit'] += Decimal(str(row.profit or 0))
+            acc['items'] += Decimal(str(row.items))
+            acc['largest_sale'] = max(acc['largest_sale'], total)
+            acc['smallest_sale'] = min(acc['smallest_sale'], total)
+
+        lines = db.session.query(
+            Sale.id, Sale.shop_id, Sale.date, CartItem.product_id,
+            CartItem.quantity, CartItem.total_price, CartItem.line_cost
+        )\
+            .join(Sale, CartItem.sale_id == Sale.id)\
+            .filter(*sale_filters)\
+            .order_by(Sale.id)\
+            .yield_per(SalesRollupRepository.REBUILD_BATCH_SIZE)
+
+        products = {}
+        for row in lines:
+            key = (row.shop_id, to_kenya_time(row.date).date(), row.product_id)
+            acc = products.get(key)
+            if acc is None:
+                acc = products[key] = {
+                    'quantity': Decimal('0'), 'revenue': Decimal('0'), 'cost': Decimal('0'),
+                    'transactions': 0, 'last_sale': None
+                }
+            quantity = Decimal(str(row.quantity))
+            acc['quantity'] += quantity
+            acc['revenue'] += Decimal(str(row.total_price))
+            acc['cost'] += Decimal(str(row.line_cost or 0))
+            # Rows arrive ordered by sale, so repeated lines of one sale count once
+            if acc['last_sale'] != row.id:
+                acc['transactions'] += 1
+                acc['last_sale'] = row.id
+
+        daily_rows = [
+            dict(acc, shop_id=k[0], sale_date=k[1], hour=k[2], payment_method=k[3], user_id=k[4])
+            for k, acc in daily.items()
+        ]
+        product_rows = [
+            {'shop_id': k[0], 'sale_date': k[1], 'product_id': k[2], 'quantity': acc['quantity'],
+             'revenue': acc['revenue'], 'cost': acc['cost'], 'transactions': acc['transactions']}
+            for k, acc in products.items()
+        ]
+        size = SalesRollupRepository.REBUILD_BATCH_SIZE
+        for table, rows in ((ShopDailySales.__table__, daily_rows), (ShopDailyProductSales.__table__, product_rows)):
+            for i in range(0, len(rows), size):
+                db.session.execute(table.insert(), rows[i:i + size])
+        return len(daily_rows), len(product_rows)
+
+
 class CategoryRepository:
     @staticmethod
     def get_for_pos(shop_id: int) -> List[Category]:
@@ -218,6 +606,20 @@ class CategoryRepository:
             .order_by(Category.position, Category.name)\
             .all()
 
+    @staticmethod
+    def get_active(shop_id: int) -> List[Category]:
+        """
+        Get the shop's active categories in display order, without products
+        """
+        return db.session.query(Category)\
+            .filter(
+                Category.shop_id == shop_id,
+                Category.is_active == True
+            )\
+            .options(*loading_profile('lean', Category))\
+            .order_by(Category.position, Category.name)\
+            .all()
+
     @staticmethod
     def get_ranked_categories(shop_id: int, limit: int = None) -> List[Category]:
         """
@@ -276,6 +678,7 @@ class SaleRepository:
         """Get recent sales (no session filtering)"""
         return db.session.query(Sale)\
             .filter(Sale.shop_id == shop_id)\
+            .options(*loading_profile('report', Sale))\
             .order_by(Sale.date.desc())\
             .limit(limit).all()
 
@@ -291,7 +694,8 @@ class SaleRepository:
             )\
             .options(
                 db.joinedload(Sale.cart_items)
-                .joinedload(CartItem.product)
+                .joinedload(CartItem.product),
+                *loading_profile('report', Sale)
             )\
             .first()
 
@@ -56,6 +56,38 @@ class CheckoutSchema(Schema):
         validate=validate.Length(min=1),
         metadata={"description": "List of items being purchased"}
     )
+    idempotency_key = fields.String(
+        allow_none=True,
+        validate=validate.Length(min=1, max=64),
+        metadata={"description": "Client key for this checkout; retries with the same key replay the original sale"}
+    )
+
+
+class OfflineSaleSchema(CheckoutSchema):
+    """
+    A sale rung up while the till was offline, replayed by the service worker
+    """
+    idempotency_key = fields.String(
+        required=True,
+        validate=validate.Length(min=1, max=64),
+        metadata={"description": "Client key for this sale; syncing it again replays the original"}
+    )
+    sold_at = fields.DateTime(
+        required=True,
+        metadata={"description": "When the sale was rung up, ISO 8601 (UTC if no offset is given)"}
+    )
+
+
+class OfflineSyncSchema(Schema):
+    """
+    Batch of offline sales; each entry is validated on its own with OfflineSaleSchema
+    """
+    sales = fields.List(
+        fields.Dict(),
+        required=True,
+        validate=validate.Length(min=1),
+        metadata={"description": "Offline sales in the order they were rung up"}
+    )
 
 
 class ProductSearchSchema(Schema):
@@ -86,9 +118,9 @@ class ReceiptSchema(Schema):
         metadata={"description": "ID of the sale to generate receipt for"}
     )
     format = fields.String(
-        validate=validate.OneOf(['thermal', 'pdf', 'email', 'sms']),
-        load_default='thermal',  # Changed from 'missing' to 'load_default'
-        metadata={"description": "Output format for the receipt"}
+        validate=validate.OneOf(['json', 'thermal', 'pdf', 'email', 'sms']),
+        load_default='json',
+        metadata={"description": "Output format for the receipt (thermal: ESC/POS text)"}
     )
     include_tax_details = fields.Boolean(
         load_default=False, 
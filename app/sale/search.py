@@ -0,0 +1,272 @@
+import heapq
+import logging
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+from flask import current_app
+from sqlalchemy import and_, event, inspect
+from app import db, cache
+from ..models import Product, Category
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'shop:{shop_id}:search_generation'
+SEARCHABLE_FIELDS = ('name', 'barcode', 'sku', 'category_id', 'is_active', 'is_deleted', 'shop_id')
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+def trigrams(text: str) -> set:
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+    """
+    Immutable in-memory search index over one shop's products.
+
+    - Exact barcode/SKU lookups go through a hash map.
+    - Name tokens (and codes) are kept in a sorted array, so a prefix lookup
+      is a bisect over a flattened trie. This keeps memory flat for 20k+ SKUs.
+    - Queries that match nothing by prefix fall back to trigram similarity
+      on the product name.
+
+    Each product's category and whether it is listed (active, in an active
+    category) are kept with it, so category and listing filters apply before
+    the limit. Search returns product IDs only; stock and price change with
+    every sale and are always read from the database for the returned rows.
+    """
+
+    FUZZY_THRESHOLD = 0.5  # Share of the query's trigrams a name must contain
+
+    def __init__(self, shop_id: int, generation: int,
+                 rows: Iterable[Tuple[int, str, Optional[str], Optional[str], Optional[int], bool]]):
+        self.shop_id = shop_id
+        self.generation = generation
+        self.codes: Dict[str, int] = {}
+        self.names: Dict[int, str] = {}
+        self.categories: Dict[int, Optional[int]] = {}
+        self.listed: set = set()
+
+        postings: Dict[str, set] = {}
+        grams: Dict[str, List[int]] = {}
+        self.gram_counts: Dict[int, int] = {}
+
+        for product_id, name, barcode, sku, category_id, listed in rows:
+            name = (name or '').lower()
+            self.names[product_id] = name
+            self.categories[product_id] = category_id
+            if listed:
+                self.listed.add(product_id)
+
+            tokens = set(tokenize(name))
+            for code in (barcode, sku):
+                if code:
+                    self.codes[code.strip().lower()] = product_id
+                    tokens.add(code.strip().lower())
+            for token in tokens:
+                postings.setdefault(token, set()).add(product_id)
+
+            name_grams = trigrams(name)
+            self.gram_counts[product_id] = len(name_grams)
+            for gram in name_grams:
+                grams.setdefault(gram, []).append(product_id)
+
+        self.sorted_names: List[Tuple[str, int]] = sorted((name, pid) for pid, name in self.names.items())
+        self.tokens: List[str] = sorted(postings)
+        self.postings: Dict[str, frozenset] = {t: frozenset(ids) for t, ids in postings.items()}
+        self.grams = grams
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query: str, limit: int = 20, category_id: Optional[int] = None, listed_only: bool = False) -> List[int]:
+        """Return product IDs best matching `query`, best first, in `category_id` and listed if asked"""
+        query = (query or '').strip().lower()
+        if not query:
+            return []
+
+        def keep(product_id):
+            return (category_id is None or self.categories.get(product_id) == category_id)\
+                and (not listed_only or product_id in self.listed)
+
+        exact = self.codes.get(query)
+        if exact is not None and not keep(exact):
+            exact = None
+        ranked = [exact] if exact is not None else []
+
+        # Names starting with the query rank first; for short type-ahead
+        # prefixes they usually fill the page without touching the postings
+        leading = self._leading_names(query, limit, keep)
+        if len(leading) >= limit:
+            ranked.extend(i for i in leading if i != exact)
+            return ranked[:limit]
+
+        matches = {i for i in self._prefix_matches(tokenize(query)) if keep(i)}
+        if matches:
+            ranked.extend(self._rank_prefix(matches, query, limit, exclude=exact))
+        elif exact is None:
+            ranked.extend(self._fuzzy(query, limit, keep))
+
+        return ranked[:limit]
+
+    def _leading_names(self, query: str, limit: int, keep) -> List[int]:
+        found = []
+        for name, product_id in islice(self.sorted_names, bisect_left(self.sorted_names, (query,)), None):
+            if not name.startswith(query) or len(found) >= limit:
+                break
+            if keep(product_id):
+                found.append(product_id)
+        return found
+
+    def _prefix_range(self, prefix: str) -> Iterable[str]:
+        start = bisect_left(self.tokens, prefix)
+        end = bisect_left(self.tokens, prefix + '\uffff', start)
+        return self.tokens[start:end]
+
+    def _prefix_matches(self, query_tokens: List[str]) -> set:
+        """IDs whose tokens start with every query token"""
+        result = None
+        # Longest (most selective) tokens first keeps the intersections small
+        for token in sorted(set(query_tokens), key=len, reverse=True):
+            ids = set()
+            for candidate in self._prefix_range(token):
+                ids |= self.postings[candidate]
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result or set()
+
+    def _rank_prefix(self, ids: set, query: str, limit: int, exclude: Optional[int] = None) -> List[int]:
+        def rank(product_id):
+            name = self.names[product_id]
+            return (not name.startswith(query), query not in name, len(name), name)
+        return heapq.nsmallest(limit, (i for i in ids if i != exclude), key=rank)
+
+    def _fuzzy(self, query: str, limit: int, keep) -> List[int]:
+        query_grams = trigrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.grams.get(gram, ()))
+
+        scored = []
+        for product_id, common in shared.items():
+            if not keep(product_id):
+                continue
+            # How much of the query the name covers, then overall similarity
+            coverage = common / len(query_grams)
+            if coverage >= self.FUZZY_THRESHOLD:
+                similarity = common / (len(query_grams) + self.gram_counts[product_id] - common)
+                scored.append((-coverage, -similarity, self.names[product_id], product_id))
+        return [item[-1] for item in heapq.nsmallest(limit, scored)]
+
+
+class SearchIndexRegistry:
+    """
+    Per-process cache of shop search indexes. Each index is tagged with the
+    shop's search generation, a counter in the shared cache bumped on product
+    writes, so every worker rebuilds after any worker's write.
+    """
+
+    _indexes: 'OrderedDict[int, ProductSearchIndex]' = OrderedDict()
+    _lock = threading.Lock()
+    _build_locks: Dict[int, threading.Lock] = {}
+
+    @classmethod
+    def get(cls, shop_id: int) -> ProductSearchIndex:
+        generation = cls.generation(shop_id)
+        index = cls._indexes.get(shop_id)
+        if index is not None and index.generation == generation:
+            return index
+
+        with cls._lock:
+            build_lock = cls._build_locks.setdefault(shop_id, threading.Lock())
+
+        with build_lock:
+            index = cls._indexes.get(shop_id)
+            if index is None or index.generation != generation:
+                index = cls._build(shop_id, generation)
+
+            with cls._lock:
+                cls._indexes[shop_id] = index
+                cls._indexes.move_to_end(shop_id)
+                while len(cls._indexes) > current_app.config.get('SEARCH_INDEX_MAX_SHOPS', 50):
+                    cls._indexes.popitem(last=False)
+        return index
+
+    @staticmethod
+    def generation(shop_id: int) -> int:
+        try:
+            return int(cache.get(GENERATION_KEY.format(shop_id=shop_id)) or 0)
+        except Exception as e:
+            logger.warning(f"Search generation lookup failed for shop {shop_id}: {str(e)}")
+            return -1
+
+    @staticmethod
+    def invalidate(shop_id: int) -> None:
+        key = GENERATION_KEY.format(shop_id=shop_id)
+        if cache.get(key) is None:
+            cache.add(key, 0, timeout=0)
+        cache.cache.inc(key)
+
+    @staticmethod
+    def _build(shop_id: int, generation: int) -> ProductSearchIndex:
+        listed = and_(Product.is_active == True, Category.is_active == True)
+        rows = db.session.query(
+            Product.id, Product.name, Product.barcode, Product.sku, Product.category_id, listed
+        )\
+            .join(Category)\
+            .filter(
+                Category.shop_id == shop_id,
+                Product.is_deleted == False
+            )\
+            .all()
+        index = ProductSearchIndex(shop_id, generation, rows)
+        logger.info(f"Built search index for shop {shop_id}: {len(index)} products")
+        return index
+
+
+def _shop_id_of(obj):
+    if isinstance(obj, Category):
+        return obj.shop_id
+    if obj.shop_id is None and obj.category is not None:
+        return obj.category.shop_id
+    return obj.shop_id
+
+
+@event.listens_for(db.session, 'before_flush')
+def _track_searchable_writes(session, flush_context, instances):
+    shops = session.info.setdefault('search_shops_pending', set())
+    with session.no_autoflush:
+        for obj in session.new | session.deleted:
+            if isinstance(obj, (Product, Category)):
+                shops.add(_shop_id_of(obj))
+        for obj in session.dirty:
+            if isinstance(obj, Product):
+                state = inspect(obj)
+                if any(state.attrs[field].history.has_changes() for field in SEARCHABLE_FIELDS):
+                    shops.add(_shop_id_of(obj))
+            elif isinstance(obj, Category) and session.is_modified(obj, include_collections=False):
+                shops.add(_shop_id_of(obj))
+    shops.discard(None)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_committed_indexes(session):
+    for shop_id in session.info.pop('search_shops_pending', ()):
+        try:
+            SearchIndexRegistry.invalidate(shop_id)
+        except Exception as e:
+            logger.warning(f"Search index invalidation failed for shop {shop_id}: {str(e)}")
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_pending_indexes(session, previous_transaction):
+    session.info.pop('search_shops_pending', None)
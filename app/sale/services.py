@@ -1,17 +1,26 @@
 from flask_login import current_user
-from datetime import datetime
-from decimal import Decimal, ROUND_UP
-from typing import List, Dict, Optional
-from flask import request, session
-from .. import db, socketio
-from .repositories import ProductRepository, CategoryRepository, SaleRepository
-from ..models import Shop, Sale, CartItem, Category, Product, Tax
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, ROUND_HALF_UP, ROUND_UP
+from typing import List, Dict, Optional, Tuple
+from flask import request, session, current_app, json
+from .. import db, cache
+from .catalogue import CatalogueVersion
+from .columnar import ColumnarCatalogue
+from .search import SearchIndexRegistry
+from .tasks import PostCheckoutDispatcher
+from .receipts import ReceiptStore
+from ..utils.counters import LiveSalesCounters
+from .repositories import ProductRepository, CategoryRepository, SaleRepository, SalesRankRepository, SalesRollupRepository
+from ..models import Shop, Sale, CartItem, Category, Product, Tax, SaleReceipt
 from sqlalchemy.sql import bindparam
 from app.utils.pricing import PricingUtil
-import threading
 from sqlalchemy.orm import joinedload, with_loader_criteria
-from app.utils.time import get_kenya_today_range
+from app.utils.time import get_kenya_today_range, to_kenya_time, kenya_today
+from app.utils.loading import loading_profile
+from app.utils.compression import compress
+from app.utils.calculations.dashboard_calculations import invalidate_dashboard
 from sqlalchemy import and_, func, case
+from sqlalchemy.exc import IntegrityError
 import logging
 import logging
 import traceback
@@ -23,55 +32,112 @@ from functools import lru_cache
 logger = logging.getLogger(__name__)
 
 
-def run_checkout_tasks(sale_id: int, shop_id: int, user_id: int, total: float, item_count: int):
-    try:
-        # Generate receipt (safe access)
-        receipt = ReceiptService.generate(sale_id)
-        logger.info("Receipt generated successfully")
+def round_up_to_nearest_five(amount: Decimal) -> Decimal:
+    return (amount / Decimal('5')).to_integral_value(rounding=ROUND_UP) * Decimal('5')
 
-        
-        # Emit real-time update
-        socketio.emit('sale_completed', {
-            'sale_id': sale_id,
-            'shop_id': shop_id,
-            'total': total,
-            'items_count': item_count,
-        }, room=f'pos_{shop_id}')
 
-    except Exception as e:
-        logger.error("Post-checkout task failed", extra={'sale_id': sale_id, 'error': str(e), 'trace': traceback.format_exc()})
+class InsufficientStockError(ValueError):
+    """Raised when one or more cart lines cannot be covered by current stock"""
+
+    def __init__(self, lines: List[Dict]):
+        self.lines = lines
+        names = ', '.join(f"'{line['name']}'" for line in lines)
+        super().__init__(f"Insufficient stock for {names}")
+
+
+CHECKOUT_REPLAY_KEY = 'checkout:{shop_id}:{idempotency_key}'
 
 
 # In services.py
 class SalesService:
     @staticmethod
-    def get_pos_data(shop_id: int) -> Dict:
+    def get_pos_data(shop_id: int, version: Optional[int] = None, columnar: bool = False) -> Dict:
         """
-        Get all data needed to initialize the POS interface
+        Get all data needed to initialize the POS interface.
+        Products are serialized once; categories only carry their product count
+        and the client groups products by category_id. With `columnar`, products
+        are sent in the ColumnarCatalogue format.
         """
         try:
             shop = Shop.query.get_or_404(shop_id)
+            if version is None:
+                version = CatalogueVersion.current(shop_id)
+
+            rows = ProductRepository.get_available_for_sale(shop_id)
+            products = ColumnarCatalogue.encode(rows) if columnar else [p.serialize(for_pos=True) for p in rows]
 
             return {
+                'version': version,
                 'shop': {
                     'id': shop.id,
                     'name': shop.name,
                     'currency': shop.currency,
                     'logo_url': shop.logo_url
                 },
-                'categories': CategoryService.get_for_pos(shop_id),
-                'products': [
-                    p.serialize(for_pos=True)
-                    for p in ProductRepository.get_available_for_sale(shop_id)
-                ],
+                'categories': SalesService._pos_categories(shop_id, [p.category_id for p in rows]),
+                'products': products,
                 'payment_methods': PaymentService.get_available_methods(shop_id),
                 'tax_rates': TaxService.get_rates(shop_id)
-                
             }
         except Exception as e:
             logger.error(f"Error getting POS data: {str(e)}", exc_info=True)
             raise ValueError("Failed to load POS data") from e
 
+    @staticmethod
+    def get_pos_payload(shop_id: int, columnar: bool = False, encoding: Optional[str] = None) -> Tuple[int, bytes]:
+        """
+        Return (version, JSON body) of the POS bootstrap payload, compressed with
+        `encoding` ('br', 'gzip' or None). Cached per catalogue version, format and
+        encoding so unchanged catalogues are never rebuilt, re-encoded or recompressed
+        """
+        version = CatalogueVersion.current(shop_id)
+        key = f"shop:{shop_id}:pos_data:{version}:{'columnar' if columnar else 'rows'}:{encoding or 'identity'}"
+
+        body = cache.get(key)
+        if body is None:
+            body = compress(json.dumps(SalesService.get_pos_data(shop_id, version, columnar)), encoding)
+            cache.set(key, body, timeout=current_app.config.get('POS_DATA_CACHE_TIMEOUT', 3600))
+        return version, body
+
+    @staticmethod
+    def get_pos_delta(shop_id: int, since: int, columnar: bool = False) -> Dict:
+        """
+        Products written at or after catalogue version `since`, plus the IDs of
+        every product still for sale so the till can drop the rest.
+        Falls back to the full payload if `since` is ahead of the server.
+        """
+        version = CatalogueVersion.current(shop_id)
+        if since > version:
+            return dict(SalesService.get_pos_data(shop_id, version, columnar), full=True)
+
+        rows = ProductRepository.get_available_for_sale(shop_id, changed_since=since)
+        products = ColumnarCatalogue.encode(rows) if columnar else [p.serialize(for_pos=True) for p in rows]
+        return {
+            'version': version,
+            'since': since,
+            'full': False,
+            'products': products,
+            'product_ids': ProductRepository.get_available_ids(shop_id),
+            'categories': SalesService._pos_categories(shop_id),
+            'payment_methods': PaymentService.get_available_methods(shop_id),
+            'tax_rates': TaxService.get_rates(shop_id)
+        }
+
+    @staticmethod
+    def _pos_categories(shop_id: int, category_ids: Optional[List[int]] = None) -> List[Dict]:
+        """Active categories, with product counts when the category ID of every product is given"""
+        counts = {}
+        for category_id in category_ids or ():
+            counts[category_id] = counts.get(category_id, 0) + 1
+
+        return [{
+            'id': c.id,
+            'name': c.name,
+            'position': c.position,
+            'image_url': c.image_url,
+            'product_count': counts.get(c.id, 0) if category_ids is not None else None
+        } for c in CategoryRepository.get_active(shop_id)]
+
     
     @staticmethod
     def process_checkout(
@@ -79,8 +145,15 @@ class SalesService:
         user_id: int,
         cart_items: List[Dict],
         payment_method: str,
-        customer_data: Optional[Dict] = None
+        customer_data: Optional[Dict] = None,
+        idempotency_key: Optional[str] = None
     ) -> Dict:
+        # A retried checkout gets the original response back; nothing is read or written again
+        if idempotency_key:
+            replay = SalesService._cached_checkout(shop_id, idempotency_key)
+            if replay is not None:
+                return replay
+
         if not cart_items:
             raise ValueError("Cannot process empty sale")
         if not payment_method:
@@ -95,117 +168,121 @@ class SalesService:
             for item in cart_items
         ]
 
+        # Total quantity per product, so repeated lines are decremented as one
+        requested = {}
+        for item in cart_items:
+            requested[item['product_id']] = requested.get(item['product_id'], Decimal('0')) + item['quantity']
+
         try:
             # Preload all products in bulk
-            product_ids = [item['product_id'] for item in cart_items]
-            products = ProductRepository.get_bulk_for_sale(product_ids, shop_id)
+            products = ProductRepository.get_bulk_for_sale(list(requested), shop_id)
             product_map = {p.id: p for p in products}
 
-            tax_rate = Decimal(str(Tax.get_tax_rate(shop_id)))
-            subtotal = Decimal('0')
-            total_cost = Decimal('0')
-            cart_item_data = []
-            stock_updates = []
+            missing = [pid for pid in requested if pid not in product_map]
+            if missing:
+                raise ValueError(f"Product {missing[0]} not found")
 
-            def round_up_to_nearest_five(amount: Decimal) -> Decimal:
-                return (amount / Decimal('5')).to_integral_value(rounding=ROUND_UP) * Decimal('5')
+            # Fail fast on the snapshot; the guarded decrement below is authoritative
+            short = [
+                product_map[pid] for pid, quantity in requested.items()
+                if Decimal(str(product_map[pid].stock)) < quantity
+            ]
+            if short:
+                raise InsufficientStockError(SalesService._short_stock_lines(short, requested))
 
-            for item in cart_items:
-                product = product_map.get(item['product_id'])
-                if not product:
-                    raise ValueError(f"Product {item['product_id']} not found")
-
-                quantity = item['quantity']
-                if product.stock < quantity:
-                    raise ValueError(f"Insufficient stock for '{product.name}'")
-
-                # Calculate combo-aware subtotal
-                if product.is_combo and product.combination_size and product.combination_size > 1:
-                    combo_size = Decimal(str(product.combination_size))
-                    combo_price = Decimal(str(product.combination_price))
-                    unit_price = Decimal(str(product.selling_price))
-
-                    combos = quantity // combo_size
-                    remainder = quantity % combo_size
-                    combo_total = combos * combo_price
-                    remainder_total = min(remainder * unit_price, combo_price)
-                    item_subtotal = combo_total + remainder_total
-                else:
-                    unit_price = Decimal(str(product.selling_price))
-                    item_subtotal = quantity * unit_price
-
-                item_subtotal = round_up_to_nearest_five(item_subtotal)
-
-                cost_price = Decimal(str(product.cost_price))
-                item_cost = quantity * cost_price
-
-                subtotal += item_subtotal
-                total_cost += item_cost
-
-                cart_item_data.append({
-                    'shop_id': shop_id,
-                    'product_id': product.id,
-                    'quantity': float(quantity),
-                    'unit_price': float(unit_price),
-                    'total_price': float(item_subtotal)
-                })
-
-                stock_updates.append({
-                    'p_id': product.id,
-                    'new_stock': float(Decimal(str(product.stock)) - quantity)
-                })
-
-            tax_amount = (subtotal * tax_rate).quantize(Decimal('0.01'))
-            total = subtotal + tax_amount
-            profit = subtotal - total_cost
+            priced = SalesService._price_cart(shop_id, cart_items, product_map, Decimal(str(Tax.get_tax_rate(shop_id))))
+            total, profit, rollup_lines = priced['total'], priced['profit'], priced['rollup_lines']
 
             # Save sale record
             sale = Sale(
                 shop_id=shop_id,
                 user_id=user_id,
-                subtotal=float(subtotal),
-                tax=float(tax_amount),
+                subtotal=float(priced['subtotal']),
+                tax=float(priced['tax']),
                 total=float(total),
                 payment_method=payment_method,
-                profit=float(profit)
+                profit=float(profit),
+                idempotency_key=idempotency_key
             )
             db.session.add(sale)
-            db.session.flush()  # Get sale.id
+            try:
+                db.session.flush()  # Get sale.id
+            except IntegrityError:
+                # Another request with this key got there first (the unique index waits for it to commit)
+                db.session.rollback()
+                replay = SalesService._stored_checkout(shop_id, idempotency_key) if idempotency_key else None
+                if replay is None:
+                    raise
+                return replay
 
             # Bulk insert cart items
-            if cart_item_data:
+            if priced['cart_items']:
                 db.session.execute(
                     CartItem.__table__.insert(),
-                    [dict(item, sale_id=sale.id) for item in cart_item_data]
+                    [dict(item, sale_id=sale.id) for item in priced['cart_items']]
                 )
+            # The receipt is written with the sale, from the lines it was priced with
+            ReceiptStore.write([(sale, priced['receipt_lines'])])
 
-            # Bulk update product stock
-            if stock_updates:
-                db.session.execute(
-                    Product.__table__.update()
-                    .where(Product.id == bindparam('p_id'))
-                    .values(stock=bindparam('new_stock')),
-                    stock_updates
+            # Report rollups move with the sale, in the same transaction
+            SalesRollupRepository.record_sale(sale, rollup_lines)
+
+            # Guarded relative decrement, issued last so row locks are only held
+            # between this statement and the commit
+            stock_after = {}
+            failed = ProductRepository.decrement_stock(
+                shop_id, requested, catalogue_version=CatalogueVersion.touch(shop_id), new_stock=stock_after
+            )
+            if failed or failed is None:
+                db.session.rollback()
+                short = ProductRepository.get_short_stock(shop_id, requested)
+                if failed:
+                    short.update({pid: product_map[pid] for pid in failed if pid not in short})
+                if not short:
+                    raise ValueError("Stock changed during checkout, please retry")
+                raise InsufficientStockError(
+                    SalesService._short_stock_lines(list(short.values()), requested)
                 )
 
+            # Read before commit expires the instances
+            sale_id, sold_at = sale.id, sale.date
+            for product_id, quantity in requested.items():
+                stock_after.setdefault(product_id, float(Decimal(str(product_map[product_id].stock)) - quantity))
             db.session.commit()
 
-            # Background receipt and notification tasks
-            threading.Thread(
-                target=run_checkout_tasks,
-                args=(sale.id, shop_id, user_id, float(total), len(cart_items)),
-                daemon=True
-            ).start()
+            # Today's live counters move right after the commit; open dashboards get the new figures
+            counters = LiveSalesCounters.record_sale(
+                shop_id, sale_id, sold_at, float(total), float(profit), payment_method
+            )
+            if counters is not None:
+                PostCheckoutDispatcher.emit('sales_counters', f'shop_{shop_id}', counters)
+
+            # Everything below runs after the response, on the post-checkout pool
+            PostCheckoutDispatcher.submit('sales_rank', SalesService._record_sales_rank, shop_id, requested, sold_at)
+            PostCheckoutDispatcher.submit('dashboard', invalidate_dashboard, shop_id)
+            PostCheckoutDispatcher.emit('sales_completed', f'shop_{shop_id}', {
+                'sale_id': sale_id,
+                'shop_id': shop_id,
+                'total': float(total),
+                'items_count': len(cart_items),
+            })
+            # Coalesced per product: however many lines the sale had, the room gets one frame
+            for product_id, stock in stock_after.items():
+                PostCheckoutDispatcher.emit('stock_updated', f'shop_{shop_id}', {
+                    'product_id': product_id,
+                    'shop_id': shop_id,
+                    'stock': float(stock)
+                }, key=product_id)
 
-            return {
-                'success': True,
-                'sale_id': sale.id,
-                'amount_paid': float(total),
-                'change_due': 0.0,
-                'receipt': None,
-                'receipt_pending': True
-            }
+            result = SalesService._checkout_result(sale_id, total)
+            if idempotency_key:
+                SalesService._remember_checkout(shop_id, idempotency_key, result)
+            return result
 
+        except InsufficientStockError as e:
+            db.session.rollback()
+            logger.info("Checkout rejected for shop %s: %s", shop_id, e)
+            raise
         except Exception as e:
             db.session.rollback()
             logger.error("Checkout failed", extra={
@@ -219,6 +296,360 @@ class SalesService:
 
             
 
+    @staticmethod
+    def sync_offline_sales(shop_id: int, user_id: int, sales: List[Dict]) -> List[Dict]:
+        """
+        Record a batch of sales rung up while the till was offline, in the order given.
+        The whole batch is priced from one product fetch and written with one stock
+        decrement; a sale that stock can no longer cover is reported, not fatal.
+        Args:
+            sales: Validated OfflineSaleSchema dicts (idempotency_key, sold_at, cart_items, ...)
+        Returns:
+            One result per sale, in order, with status 'created' or 'replayed' (plus the
+            checkout response), 'conflict' (plus failed_items) or 'rejected' (plus error)
+        """
+        if not sales:
+            return []
+
+        max_attempts = 3
+        for attempt in range(max_attempts):
+            results, accepted, requested, remaining = SalesService._plan_offline_sales(shop_id, sales)
+            if not accepted:
+                return results
+
+            try:
+                rows = []
+                for index, sale, priced in accepted:
+                    rows.append(Sale(
+                        shop_id=shop_id,
+                        user_id=user_id,
+                        date=sale['sold_at'],
+                        subtotal=float(priced['subtotal']),
+                        tax=float(priced['tax']),
+                        total=float(priced['total']),
+                        payment_method=sale['payment_method'],
+                        profit=float(priced['profit']),
+                        customer_name=sale.get('customer_name'),
+                        customer_phone=sale.get('customer_phone'),
+                        idempotency_key=sale['idempotency_key']
+                    ))
+                db.session.add_all(rows)
+                db.session.flush()
+
+                db.session.execute(CartItem.__table__.insert(), [
+                    dict(item, sale_id=row.id)
+                    for row, (_, _, priced) in zip(rows, accepted)
+                    for item in priced['cart_items']
+                ])
+                ReceiptStore.write([(row, priced['receipt_lines']) for row, (_, _, priced) in zip(rows, accepted)])
+                SalesRollupRepository.record_sales([
+                    (row, priced['rollup_lines']) for row, (_, _, priced) in zip(rows, accepted)
+                ])
+
+                stock_after = {}
+                failed = ProductRepository.decrement_stock(
+                    shop_id, requested, catalogue_version=CatalogueVersion.touch(shop_id), new_stock=stock_after
+                )
+                if failed or failed is None:
+                    # Another till sold the same stock since the plan was made; plan again
+                    db.session.rollback()
+                    continue
+
+                sold = [(row.id, row.date, row.total) for row in rows]
+                for product_id in requested:
+                    stock_after.setdefault(product_id, float(remaining[product_id]))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                # A key in the batch committed meanwhile by an overlapping sync replays next pass;
+                # any other integrity error is a data error that a new plan would only repeat
+                if isinstance(e, IntegrityError) and SalesService._any_key_stored(
+                    shop_id, [sale['idempotency_key'] for _, sale, _ in accepted]
+                ):
+                    continue
+                logger.error("Offline sync failed", extra={
+                    'shop_id': shop_id,
+                    'error': str(e),
+                    'trace': traceback.format_exc()
+                })
+                raise ValueError(f"Offline sync failed: {str(e)}")
+
+            for (index, sale, priced), (sale_id, sold_at, total) in zip(accepted, sold):
+                result = SalesService._checkout_result(sale_id, total)
+                SalesService._remember_checkout(shop_id, sale['idempotency_key'], result)
+                results[index] = dict(result, index=index, idempotency_key=sale['idempotency_key'], status='created')
+
+            SalesService._after_offline_sync(shop_id, requested, sold, stock_after)
+            return results
+
+        raise ValueError("Stock changed during sync, please retry")
+
+    @staticmethod
+    def _any_key_stored(shop_id: int, keys: List[str]) -> bool:
+        """Whether a sale with any of these idempotency keys is committed for the shop"""
+        for chunk in range(0, len(keys), 500):
+            stored = db.session.query(Sale.id).filter(
+                Sale.shop_id == shop_id, Sale.idempotency_key.in_(keys[chunk:chunk + 500])
+            ).first()
+            if stored is not None:
+                return True
+        return False
+
+    @staticmethod
+    def _plan_offline_sales(shop_id: int, sales: List[Dict]) -> Tuple[List[Dict], List[Tuple], Dict[int, Decimal], Dict[int, Decimal]]:
+        """
+        Replay, reject or price each offline sale against a running stock tally
+        Returns:
+            (results with None for the accepted sales, accepted (index, sale, priced)
+            triples, total quantity per product over the accepted sales, stock per
+            product left after them)
+        """
+        results = [None] * len(sales)
+        keys = [sale['idempotency_key'] for sale in sales]
+
+        stored = {}
+        for chunk in range(0, len(keys), 500):
+            stored.update(
+                (row.idempotency_key, row)
+                for row in db.session.query(Sale.id, Sale.total, Sale.idempotency_key).filter(
+                    Sale.shop_id == shop_id, Sale.idempotency_key.in_(keys[chunk:chunk + 500])
+                )
+            )
+
+        product_ids = {int(item['product_id']) for sale in sales for item in sale['cart_items']}
+        product_map = {p.id: p for p in ProductRepository.get_bulk_for_sale(list(product_ids), shop_id)}
+        available = {pid: Decimal(str(p.stock or 0)) for pid, p in product_map.items()}
+        tax_rate = Decimal(str(Tax.get_tax_rate(shop_id)))
+
+        now = datetime.utcnow()
+        oldest = now - timedelta(days=current_app.config.get('OFFLINE_SYNC_MAX_AGE_DAYS', 7))
+        newest = now + timedelta(minutes=5)  # Allowance for till clock drift
+
+        accepted, requested, seen = [], {}, set()
+        for index, sale in enumerate(sales):
+            key = sale['idempotency_key']
+            base = {'index': index, 'idempotency_key': key}
+
+            if key in stored:
+                result = SalesService._checkout_result(stored[key].id, stored[key].total)
+                SalesService._remember_checkout(shop_id, key, result)
+                results[index] = dict(result, **base, status='replayed', replayed=True)
+                continue
+            if key in seen:
+                results[index] = dict(base, status='rejected', error='Idempotency key repeated in batch')
+                continue
+            seen.add(key)
+
+            sold_at = sale['sold_at']
+            if sold_at.tzinfo is not None:
+                sold_at = sold_at.astimezone(timezone.utc).replace(tzinfo=None)
+            if not oldest <= sold_at <= newest:
+                results[index] = dict(base, status='rejected', error='Sale time is outside the accepted sync window')
+                continue
+
+            cart_items = [{
+                'product_id': int(item['product_id']),
+                'quantity': Decimal(str(item['quantity']))
+            } for item in sale['cart_items']]
+            wanted = {}
+            for item in cart_items:
+                wanted[item['product_id']] = wanted.get(item['product_id'], Decimal('0')) + item['quantity']
+
+            missing = [pid for pid in wanted if pid not in product_map]
+            if missing:
+                results[index] = dict(base, status='rejected', error=f"Product {missing[0]} not found")
+                continue
+
+            short = [pid for pid, quantity in wanted.items() if available[pid] < quantity]
+            if short:
+                results[index] = dict(base, status='conflict', error='Insufficient stock', failed_items=[{
+                    'product_id': pid,
+                    'name': product_map[pid].name,
+                    'requested': float(wanted[pid]),
+                    'available': float(available[pid])
+                } for pid in short])
+                continue
+
+            for pid, quantity in wanted.items():
+                available[pid] -= quantity
+                requested[pid] = requested.get(pid, Decimal('0')) + quantity
+            accepted.append((index, dict(sale, sold_at=sold_at), SalesService._price_cart(
+                shop_id, cart_items, product_map, tax_rate
+            )))
+
+        return results, accepted, requested, available
+
+    @staticmethod
+    def _after_offline_sync(shop_id: int, requested: Dict[int, Decimal], sold: List[Tuple], stock_after: Dict) -> None:
+        """Post-commit work for a synced batch, done once for the batch rather than per sale"""
+        if any(to_kenya_time(sold_at).date() == kenya_today() for _, sold_at, _ in sold):
+            counters = LiveSalesCounters.reconcile(shop_id)
+            PostCheckoutDispatcher.emit('sales_counters', f'shop_{shop_id}', counters)
+
+        last_sold_at = max(sold_at for _, sold_at, _ in sold)
+        PostCheckoutDispatcher.submit('sales_rank', SalesService._record_sales_rank, shop_id, requested, last_sold_at)
+        PostCheckoutDispatcher.submit('dashboard', invalidate_dashboard, shop_id)
+        for sale_id, _, total in sold:
+            PostCheckoutDispatcher.emit('sales_completed', f'shop_{shop_id}', {
+                'sale_id': sale_id,
+                'shop_id': shop_id,
+                'total': float(total),
+                'offline': True
+            })
+        for product_id, stock in stock_after.items():
+            PostCheckoutDispatcher.emit('stock_updated', f'shop_{shop_id}', {
+                'product_id': product_id,
+                'shop_id': shop_id,
+                'stock': float(stock)
+            }, key=product_id)
+
+    @staticmethod
+    def _price_cart(shop_id: int, cart_items: List[Dict], product_map: Dict[int, Product], tax_rate: Decimal) -> Dict:
+        """
+        Price normalized cart lines: combo-aware, each line rounded up to the nearest 5
+        Returns:
+            subtotal, tax, total and profit (Decimal), the cart_items rows to insert
+            (without sale_id), rollup_lines per product for SalesRollupRepository
+            and receipt_lines for ReceiptStore
+        """
+        subtotal = Decimal('0')
+        total_cost = Decimal('0')
+        cart_item_data = []
+        receipt_lines = []
+        rollup_lines = {}
+
+        for item in cart_items:
+            product = product_map[item['product_id']]
+            quantity = item['quantity']
+
+            # Calculate combo-aware subtotal
+            if product.is_combo and product.combination_size and product.combination_size > 1:
+                combo_size = Decimal(str(product.combination_size))
+                combo_price = Decimal(str(product.combination_price))
+                unit_price = Decimal(str(product.selling_price))
+
+                combos = quantity // combo_size
+                remainder = quantity % combo_size
+                combo_total = combos * combo_price
+                remainder_total = min(remainder * unit_price, combo_price)
+                item_subtotal = combo_total + remainder_total
+                combo = {
+                    'size': combo_size, 'combo_price': combo_price, 'combo_units': combos,
+                    'remainder_units': remainder, 'total_combo_price': combo_total, 'remainder_price': remainder_total
+                }
+            else:
+                unit_price = Decimal(str(product.selling_price))
+                item_subtotal = quantity * unit_price
+                combo = None
+
+            item_subtotal = round_up_to_nearest_five(item_subtotal)
+
+            # Cost is snapshotted on the line (to the cent, so Sale.profit matches the lines)
+            cost_price = Decimal(str(product.cost_price))
+            item_cost = (quantity * cost_price).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+            subtotal += item_subtotal
+            total_cost += item_cost
+
+            line = rollup_lines.setdefault(product.id, {
+                'quantity': Decimal('0'), 'revenue': Decimal('0'), 'cost': Decimal('0')
+            })
+            line['quantity'] += quantity
+            line['revenue'] += item_subtotal
+            line['cost'] += item_cost
+
+            cart_item_data.append({
+                'shop_id': shop_id,
+                'product_id': product.id,
+                'quantity': float(quantity),
+                'unit_price': float(unit_price),
+                'total_price': float(item_subtotal),
+                'unit_cost': float(cost_price),
+                'line_cost': float(item_cost)
+            })
+            receipt_lines.append({
+                'product_id': product.id,
+                'name': product.name,
+                'image_url': product.image_url,
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'total': item_subtotal,
+                'combo': combo
+            })
+
+        tax_amount = (subtotal * tax_rate).quantize(Decimal('0.01'))
+        return {
+            'subtotal': subtotal,
+            'tax': tax_amount,
+            'total': subtotal + tax_amount,
+            'profit': subtotal - total_cost,
+            'cart_items': cart_item_data,
+            'receipt_lines': receipt_lines,
+            'rollup_lines': rollup_lines
+        }
+
+    @staticmethod
+    def _checkout_result(sale_id: int, total) -> Dict:
+        return {
+            'success': True,
+            'sale_id': sale_id,
+            'amount_paid': float(total),
+            'change_due': 0.0,
+            'receipt': None,
+            'receipt_pending': False  # Committed with the sale
+        }
+
+    @staticmethod
+    def _remember_checkout(shop_id: int, idempotency_key: str, result: Dict) -> None:
+        try:
+            cache.set(
+                CHECKOUT_REPLAY_KEY.format(shop_id=shop_id, idempotency_key=idempotency_key),
+                result,
+                timeout=current_app.config.get('CHECKOUT_REPLAY_TIMEOUT', 900)
+            )
+        except Exception as e:
+            logger.warning(f"[Shop {shop_id}] Checkout replay cache write failed: {str(e)}")
+
+    @staticmethod
+    def _cached_checkout(shop_id: int, idempotency_key: str) -> Optional[Dict]:
+        try:
+            result = cache.get(CHECKOUT_REPLAY_KEY.format(shop_id=shop_id, idempotency_key=idempotency_key))
+        except Exception as e:
+            logger.warning(f"[Shop {shop_id}] Checkout replay cache read failed: {str(e)}")
+            return None
+        return dict(result, replayed=True) if result is not None else None
+
+    @staticmethod
+    def _stored_checkout(shop_id: int, idempotency_key: str) -> Optional[Dict]:
+        """The committed sale for this key, as the response its checkout returned"""
+        row = db.session.query(Sale.id, Sale.total)\
+            .filter(Sale.shop_id == shop_id, Sale.idempotency_key == idempotency_key)\
+            .first()
+        if row is None:
+            return None
+        result = SalesService._checkout_result(row.id, row.total)
+        SalesService._remember_checkout(shop_id, idempotency_key, result)
+        return dict(result, replayed=True)
+
+    @staticmethod
+    def _record_sales_rank(shop_id: int, quantities: Dict[int, Decimal], sold_at: datetime) -> None:
+        """
+        Bump the POS sales rank in its own short transaction, after the sale has
+        committed. A failure here only delays ordering until the next rebuild.
+        """
+        SalesRankRepository.record_sales(shop_id, quantities, sold_at)
+        db.session.commit()
+
+    @staticmethod
+    def _short_stock_lines(products: List[Product], requested: Dict[int, Decimal]) -> List[Dict]:
+        """Describe each cart line that stock could not cover"""
+        return [{
+            'product_id': p.id,
+            'name': p.name,
+            'requested': float(requested[p.id]),
+            'available': float(p.stock or 0)
+        } for p in products]
+
     @staticmethod
     def get_recent_transactions(shop_id: int, limit: int = 3) -> List[Sale]:
         """Get recent sales with optimized query"""
@@ -234,7 +665,8 @@ class SalesService:
                     Sale.payment_method,
                     Sale.customer_name,
                     Sale.status
-                )
+                ),
+                *loading_profile('report', Sale)
             )\
             .all()
 
@@ -254,7 +686,8 @@ class SalesService:
                     Product.name,
                     Product.image_url,
                     Product.price
-                )
+                ),
+                *loading_profile('report', Sale)
             )\
             .first()
 
@@ -307,54 +740,36 @@ class SalesService:
 
 class ReceiptService:
     @staticmethod
-    def generate(sale_id: int, format: str = 'json') -> Dict:
-        """Generate receipt data using CartItem as sale items"""
-        sale = Sale.query.get_or_404(sale_id)
-        items = CartItem.query.filter_by(sale_id=sale_id).join(Product).all()
-        
-        receipt_data = {
-            'id': sale.id,
-            'date': sale.date.strftime('%Y-%m-%d %H:%M'),
-            'shop': {
-                'name': sale.shop.name,
-                'location': sale.shop.location,
-                'phone': sale.shop.phone,
-                'tax_id': sale.shop.taxes[0].id if sale.shop.taxes else None
-
-            },
-            'items': [{
-                'name': item.product.name,
-                'quantity': item.quantity,
-                'unit_price': item.product.selling_price,  # Current price at time of sale
-                'total': item.quantity * item.product.selling_price
-            } for item in items],
-            'subtotal': sale.subtotal,
-            'tax': sale.tax,
-            'total': sale.total,
-            'payment_method': sale.payment_method,
-            'cashier': sale.user.username if sale.user else 'System',
-            'customer': {
-                'name': sale.customer_name,
-                'phone': sale.customer_phone
-            } if sale.customer_name else None
-        }
-        
-        # Add barcode/QR code for receipt tracking
-        receipt_data['barcode'] = f"RECEIPT-{sale.id}-{sale.date.strftime('%Y%m%d')}"
-        
-        return receipt_data
+    def get(shop_id: int, sale_id: int) -> Optional[SaleReceipt]:
+        """The receipt stored for the sale at checkout, or None if the shop has no such sale"""
+        return ReceiptStore.get(shop_id, sale_id)
+
+    @staticmethod
+    def get_details(shop_id: int, sale_id: int) -> Optional[Dict]:
+        """The sale's transaction details, or None if the shop has no such sale"""
+        return ReceiptStore.get_details(shop_id, sale_id)
 
 
 class ProductService:
     @staticmethod
     def search(shop_id: int, query: str, category_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict]:
         try:
-            results = ProductRepository.search_available(
-                shop_id=shop_id,
-                query=query,
-                category_id=category_id,
-                limit=limit
-            )
+            limit = limit or 20
+            index = SearchIndexRegistry.get(shop_id)
+            # The index filters category and listing; stock is only known to the
+            # database, so widen the window until the page fills or the index runs out
+            fetch = limit * 3
+            while True:
+                candidates = index.search(query, limit=fetch, category_id=category_id, listed_only=True)
+                results = ProductRepository.get_by_ids_for_sale(
+                    shop_id=shop_id,
+                    product_ids=candidates,
+                    category_id=category_id
+                )
+                if len(results) >= limit or len(candidates) < fetch:
+                    break
+                fetch *= 4
+            results = results[:limit]
 
             return [{
                 'id': p.id,
@@ -1,37 +1,73 @@
-
-from flask_socketio import emit, join_room
+import logging
+from typing import Optional
+from flask_login import current_user
+from flask_socketio import join_room
 from .. import socketio
 from ..models import Product, Shop
+from ..utils.events import SocketBatcher
+from ..utils.tenant import TenantContext
+
+logger = logging.getLogger(__name__)
+
+
+def _accessible_shop(data) -> Optional[Shop]:
+    """
+    The shop named by an event's shop_id if the user may see it, else None.
+    Same rules as shop_access_required: tenants reach every shop of their
+    business, admins and cashiers only the shop they are assigned to.
+    """
+    if not current_user.is_authenticated or not isinstance(data, dict):
+        return None
+    try:
+        shop_id = int(data.get('shop_id'))
+    except (TypeError, ValueError):
+        return None
+
+    shop = TenantContext.current().shop(shop_id)
+    if shop is None:
+        return None
+    if current_user.is_tenant():
+        allowed = shop.business_id == current_user.business_id
+    elif current_user.is_admin() or current_user.is_cashier():
+        allowed = current_user.shop_id == shop.id
+    else:
+        allowed = False
+
+    if not allowed:
+        logger.warning(
+            f"[ACCESS DENIED] {current_user.username} ({current_user.role}) tried to subscribe to shop {shop_id}."
+        )
+        return None
+    return shop
+
 
 def register_socket_events(blueprint):
     @socketio.on('connect')
     def handle_connect():
         if current_user.is_authenticated:
             join_room(f'user_{current_user.id}')
+            # Tenants have no shop of their own; they join one with pos_connected
             if current_user.shop_id:
                 join_room(f'shop_{current_user.shop_id}')
 
+    @socketio.on('pos_connected')
     @socketio.on('subscribe_inventory')
-    def handle_inventory_subscribe(data):
-        shop_id = data.get('shop_id')
-        if shop_id and current_user.has_shop_access(shop_id):
-            join_room(f'inventory_{shop_id}')
+    def handle_shop_subscribe(data):
+        # stock_updated, sales_completed and sales_counters all go to the shop room
+        shop = _accessible_shop(data)
+        if shop is not None:
+            join_room(f'shop_{shop.id}')
 
     @socketio.on('request_stock_update')
     def handle_stock_update(data):
-        shop_id = data.get('shop_id')
-        if not current_user.has_shop_access(shop_id):
+        shop = _accessible_shop(data)
+        if shop is None:
             return
-            
-        product = ProductRepository.get_for_shop(
-            data['product_id'],
-            shop_id
-        )
+
+        product = Product.query.filter_by(id=data.get('product_id'), shop_id=shop.id).first()
         if product:
-            emit('stock_updated', {
+            SocketBatcher.emit('stock_updated', f'shop_{shop.id}', {
                 'product_id': product.id,
                 'stock': product.stock,
-                'shop_id': shop_id
-            }, room=f'inventory_{shop_id}')
-
-
+                'shop_id': shop.id
+            }, key=product.id)
@@ -0,0 +1,125 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict
+from flask import current_app
+from app import db
+from app.utils.events import SocketBatcher
+
+logger = logging.getLogger(__name__)
+
+
+class PostCheckoutDispatcher:
+    """
+    Runs work that follows a committed sale (sales rank, cache invalidation)
+    on a fixed pool of worker threads fed by a bounded queue.
+
+    - Workers hold an app context and get a fresh session per task.
+    - Failed tasks are retried with a linear backoff, then logged and dropped.
+    - When the queue is full the task is dropped rather than blocking checkout.
+    - Socket events go out in batches through SocketBatcher.
+    """
+
+    _queue: 'queue.Queue' = None
+    _pid = None
+    _lock = threading.Lock()
+    _stats = {
+        'submitted': 0,
+        'completed': 0,
+        'retried': 0,
+        'failed': 0,
+        'dropped': 0,
+        'latency_total': 0.0,
+        'latency_max': 0.0
+    }
+
+    @classmethod
+    def submit(cls, name: str, func: Callable, *args, **kwargs) -> bool:
+        """Queue `func(*args, **kwargs)`; returns False if the queue was full"""
+        cls._ensure_started()
+        try:
+            cls._queue.put_nowait((name, func, args, kwargs, time.monotonic()))
+        except queue.Full:
+            cls._count('dropped')
+            logger.warning(f"Post-checkout queue full, dropped task '{name}'")
+            return False
+        cls._count('submitted')
+        return True
+
+    @classmethod
+    def emit(cls, event: str, room: str, payload: Dict, key=None) -> None:
+        """Buffer a socket event; clients receive {'events': [...]} per room and interval"""
+        SocketBatcher.emit(event, room, payload, key=key)
+
+    @classmethod
+    def stats(cls) -> Dict:
+        with cls._lock:
+            stats = dict(cls._stats)
+        finished = stats['completed'] + stats['failed']
+        stats['queue_depth'] = cls._queue.qsize() if cls._queue is not None else 0
+        stats['latency_avg'] = stats['latency_total'] / finished if finished else 0.0
+        return stats
+
+    # ---------------
+    # Workers
+    # ---------------
+    @classmethod
+    def _ensure_started(cls) -> None:
+        # Started lazily, and again in each forked server worker
+        if cls._pid == os.getpid():
+            return
+        with cls._lock:
+            if cls._pid == os.getpid():
+                return
+            app = current_app._get_current_object()
+            cls._queue = queue.Queue(maxsize=app.config.get('POST_CHECKOUT_QUEUE_SIZE', 1000))
+            for i in range(app.config.get('POST_CHECKOUT_WORKERS', 4)):
+                threading.Thread(target=cls._work, args=(app,), name=f'post-checkout-{i}', daemon=True).start()
+            cls._pid = os.getpid()
+
+    @classmethod
+    def _work(cls, app) -> None:
+        with app.app_context():
+            while True:
+                task = cls._queue.get()
+                try:
+                    cls._run(app, *task)
+                finally:
+                    db.session.remove()
+                    cls._queue.task_done()
+
+    @classmethod
+    def _run(cls, app, name: str, func: Callable, args, kwargs, queued_at: float) -> None:
+        max_retries = app.config.get('POST_CHECKOUT_MAX_RETRIES', 3)
+        delay = app.config.get('POST_CHECKOUT_RETRY_DELAY', 0.5)
+
+        for attempt in range(max_retries + 1):
+            try:
+                func(*args, **kwargs)
+                cls._finished('completed', queued_at)
+                return
+            except Exception as e:
+                db.session.rollback()
+                if attempt == max_retries:
+                    cls._finished('failed', queued_at)
+                    logger.error(f"Post-checkout task '{name}' failed after {attempt + 1} attempts: {str(e)}",
+                                 exc_info=True)
+                    return
+                cls._count('retried')
+                logger.warning(f"Post-checkout task '{name}' failed (attempt {attempt + 1}), retrying: {str(e)}")
+                time.sleep(delay * (attempt + 1))
+
+    @classmethod
+    def _count(cls, stat: str) -> None:
+        with cls._lock:
+            cls._stats[stat] += 1
+
+    @classmethod
+    def _finished(cls, stat: str, queued_at: float) -> None:
+        latency = time.monotonic() - queued_at
+        with cls._lock:
+            cls._stats[stat] += 1
+            cls._stats['latency_total'] += latency
+            cls._stats['latency_max'] = max(cls._stats['latency_max'], latency)
@@ -0,0 +1,32 @@
+// Decodes the columnar catalogue format (app/sale/columnar.py) back into
+// one product object per row, with the same keys as the row format.
+const CatalogueDecoder = {
+    isColumnar(products) {
+        return Boolean(products && products.format === 'columnar');
+    },
+
+    decode(table) {
+        if (!CatalogueDecoder.isColumnar(table)) return table || [];
+
+        const { fields, columns, dictionaries = {}, defaults = {}, count } = table;
+        const resolved = fields.map((field, index) => {
+            const dictionary = dictionaries[field];
+            return dictionary ? columns[index].map(code => dictionary[code]) : columns[index];
+        });
+
+        const products = new Array(count);
+        for (let row = 0; row < count; row++) {
+            const product = {};
+            for (let index = 0; index < fields.length; index++) {
+                const value = resolved[index][row];
+                product[fields[index]] = value === null && fields[index] in defaults
+                    ? defaults[fields[index]]
+                    : value;
+            }
+            // Row-format aliases the POS templates still read
+            product.selling_price = product.price;
+            products[row] = product;
+        }
+        return products;
+    }
+};
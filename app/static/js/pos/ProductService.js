@@ -15,6 +15,18 @@ class ProductService {
         }
     }
 
+    async fetchCatalogue() {
+        try {
+            const response = await fetch(`/api/shops/${this.shopId}/pos-data?format=columnar`);
+            if (!response.ok) throw new Error('Failed to fetch catalogue');
+            const data = await response.json();
+            return { ...data, products: CatalogueDecoder.decode(data.products) };
+        } catch (error) {
+            console.error('Catalogue fetch error:', error);
+            throw error;
+        }
+    }
+
     async fetchProducts(categoryId) {
         try {
             const response = await fetch(`${this.baseUrl}/products/${categoryId}`);
@@ -13,11 +13,11 @@ class SocketService {
     }
 
     registerEventHandlers() {
-        // Stock updates
+        // Stock updates, coalesced server-side to the latest per product
         this.socket.on('stock_updated', (data) => {
-            if (data.shop_id === this.shopId) {
-                this.handleStockUpdate(data);
-            }
+            data.events
+                .filter(update => update.shop_id === this.shopId)
+                .forEach(update => this.handleStockUpdate(update));
         });
 
         // Low stock alerts
@@ -27,14 +27,25 @@ class SocketService {
             }
         });
 
-        // Sale completions
-        this.socket.on('sale_completed', (data) => {
-            if (data.shop_id === this.shopId) {
-                this.showSaleNotification(data);
+        // Sale completions, batched server-side
+        this.socket.on('sales_completed', (data) => {
+            const sales = data.events.filter(sale => sale.shop_id === this.shopId);
+            if (sales.length === 1) {
+                this.showSaleNotification(sales[0]);
+            } else if (sales.length > 1) {
+                this.showSalesSummary(sales);
+            }
+        });
+
+        // Today's live sales counters, batched server-side; the last batch entry is the latest
+        this.socket.on('sales_counters', (data) => {
+            const counters = data.events.filter(c => c.shop_id === this.shopId).pop();
+            if (counters) {
+                this.updateLiveCounters(counters);
             }
         });
 
-        // Connection events
+                // Connection events
         this.socket.on('connect', () => {
             console.log('Connected to Socket.IO server');
             this.socket.emit('pos_connected', { shop_id: this.shopId });
@@ -69,6 +80,16 @@ class SocketService {
         });
     }
 
+    updateLiveCounters(counters) {
+        document.querySelectorAll('[data-live-counter]').forEach(element => {
+            const value = counters[element.dataset.liveCounter];
+            if (value === undefined) return;
+            element.textContent = element.dataset.liveCounter === 'total_transactions'
+                ? value
+                : `Ksh ${value.toLocaleString(undefined, { minimumFractionDigits: 2, maximumFractionDigits: 2 })}`;
+        });
+    }
+
     showLowStockAlert(data) {
         this.showNotification({
             type: 'warning',
@@ -85,6 +106,15 @@ class SocketService {
         });
     }
 
+    showSalesSummary(sales) {
+        const total = sales.reduce((sum, sale) => sum + sale.total, 0);
+        this.showNotification({
+            type: 'success',
+            message: `${sales.length} sales completed (Ksh ${total.toFixed(2)})`,
+            duration: 5000
+        });
+    }
+
     showNotification({ type, message, duration }) {
         const notification = document.createElement('div');
         notification.className = `notification ${type}`;
@@ -309,29 +309,65 @@ function isCacheValid(response, maxAgeSeconds) {
 
 // ========== Background Sync ========== //
 
+// Offline sales are queued in the 'pending-orders' cache, one entry per sale:
+// keyed `<transactions URL>?key=<idempotency key>` with the sale JSON
+// (including idempotency_key and sold_at) as the stored body. Each shop's
+// queue goes up as one ordered batch to `<transactions URL>/sync`.
 self.addEventListener('sync', (event) => {
   if (event.tag === 'sync-pending-orders') {
-    event.waitUntil(
-      (async () => {
-        const cache = await caches.open('pending-orders');
-        const requests = await cache.keys();
-        
+    event.waitUntil(syncPendingOrders());
+  }
+});
+
+async function syncPendingOrders() {
+  const cache = await caches.open('pending-orders');
+  const requests = await cache.keys();
+
+  const batches = new Map();
+  for (const request of requests) {
+    const url = new URL(request.url);
+    const response = await cache.match(request);
+    const sale = await response.json();
+    const endpoint = `${url.origin}${url.pathname}/sync`;
+    if (!batches.has(endpoint)) batches.set(endpoint, []);
+    batches.get(endpoint).push({ request, sale });
+  }
+
+  await Promise.all(
+    Array.from(batches, async ([endpoint, entries]) => {
+      // Keep the order the sales were rung up in, so stock runs out for the later ones
+      entries.sort((a, b) => new Date(a.sale.sold_at) - new Date(b.sale.sold_at));
+      try {
+        const response = await fetch(endpoint, {
+          method: 'POST',
+          credentials: 'same-origin',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ sales: entries.map(({ sale }) => sale) })
+        });
+        if (!response.ok) return;
+
+        const { results } = await response.json();
+        const unsynced = [];
         await Promise.all(
-          requests.map(async (request) => {
-            try {
-              const response = await fetch(request);
-              if (response.ok) {
-                await cache.delete(request);
-              }
-            } catch (error) {
-              console.error('Failed to sync order:', error);
+          results.map(async (result, index) => {
+            // Every status is final for that sale; conflicts and rejections go to the till
+            await cache.delete(entries[index].request);
+            if (result.status === 'conflict' || result.status === 'rejected') {
+              unsynced.push({ sale: entries[index].sale, result });
             }
           })
         );
-      })()
-    );
-  }
-});
+
+        const clients = await self.clients.matchAll();
+        clients.forEach(client => {
+          client.postMessage({ type: 'OFFLINE_SALES_SYNCED', results, unsynced });
+        });
+      } catch (error) {
+        console.error('Failed to sync orders:', error);
+      }
+    })
+  );
+}
 
 // ========== Push Notifications ========== //
 
@@ -0,0 +1,196 @@
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from flask import current_app
+from sqlalchemy import func, case, select, or_
+from app import db, cache
+from app.models import Product, Category, StockLog, User, Role, ShopDailySales, ShopDailyProductSales
+from app.utils.time import kenya_today
+from app.utils.counters import LiveSalesCounters
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_KEY = 'shop:{shop_id}:dashboard'
+
+
+def get_sales_windows(shop_id: int, today: Optional[date] = None) -> Dict:
+    """
+    Today / yesterday / week / month / all-time revenue and the transaction count
+    in one conditional-aggregation pass over the shop's shop_daily_sales rows.
+    Windows are Nairobi local dates.
+    """
+    today = today or kenya_today()
+    yesterday = today - timedelta(days=1)
+    week_start = today - timedelta(days=7)
+    month_start = today - timedelta(days=30)
+
+    def window_sum(condition):
+        return func.coalesce(func.sum(case((condition, ShopDailySales.total), else_=0)), 0)
+
+    row = db.session.query(
+        window_sum(ShopDailySales.sale_date == today).label('today'),
+        window_sum(ShopDailySales.sale_date == yesterday).label('yesterday'),
+        window_sum(ShopDailySales.sale_date >= week_start).label('week'),
+        window_sum(ShopDailySales.sale_date >= month_start).label('month'),
+        func.coalesce(func.sum(ShopDailySales.total), 0).label('total_revenue'),
+        func.coalesce(func.sum(ShopDailySales.transactions), 0).label('transactions')
+    ).filter(ShopDailySales.shop_id == shop_id).one()
+
+    windows = {
+        'today': float(row.today),
+        'yesterday': float(row.yesterday),
+        'week': float(row.week),
+        'month': float(row.month),
+        'total_revenue': float(row.total_revenue),
+        'transactions': int(row.transactions),
+        'change': 0
+    }
+    if windows['yesterday'] > 0:
+        windows['change'] = (windows['today'] - windows['yesterday']) / windows['yesterday'] * 100
+    return windows
+
+
+def get_daily_totals(shop_id: int, start: date, end: Optional[date] = None) -> Dict[str, float]:
+    """Revenue per local calendar day ('YYYY-MM-DD') for start <= day <= end"""
+    filters = [ShopDailySales.shop_id == shop_id, ShopDailySales.sale_date >= start]
+    if end is not None:
+        filters.append(ShopDailySales.sale_date <= end)
+
+    rows = db.session.query(ShopDailySales.sale_date, func.sum(ShopDailySales.total).label('daily_total'))\
+        .filter(*filters)\
+        .group_by(ShopDailySales.sale_date)\
+        .all()
+    return {r.sale_date.isoformat(): float(r.daily_total or 0) for r in rows}
+
+
+def get_inventory_counts(shop_id: int, low_stock: int = 10, critical_stock: int = 5) -> Dict:
+    """
+    Product, category, stock-log and user counts in one pass: conditional
+    aggregates over the shop's products plus scalar subqueries for the rest.
+    """
+    week_ago = datetime.now() - timedelta(days=7)
+    # User.is_active is a Python property: active means not locked out
+    not_locked = or_(User.locked_until == None, User.locked_until <= datetime.utcnow())
+
+    def count_where(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    def scalar_count(column, *conditions):
+        return select(func.count(column)).where(*conditions).scalar_subquery()
+
+    row = db.session.query(
+        func.count(Product.id).label('product_count'),
+        count_where(Product.stock <= low_stock).label('low_stock'),
+        count_where(Product.stock <= critical_stock).label('critical'),
+        func.coalesce(func.sum(Product.stock * Product.cost_price), 0).label('total_value'),
+        scalar_count(Category.id, Category.shop_id == shop_id).label('category_count'),
+        scalar_count(StockLog.id, StockLog.shop_id == shop_id, StockLog.date >= week_ago).label('recent_logs'),
+        scalar_count(User.id, User.shop_id == shop_id).label('users_total'),
+        scalar_count(User.id, User.shop_id == shop_id, not_locked).label('users_active'),
+        scalar_count(User.id, User.shop_id == shop_id, User.role == Role.ADMIN).label('users_admins')
+    ).filter(Product.shop_id == shop_id).one()
+
+    return {
+        'product_count': row.product_count,
+        'low_stock': int(row.low_stock),
+        'critical': int(row.critical),
+        'total_value': float(row.total_value),
+        'category_count': row.category_count,
+        'recent_logs': row.recent_logs,
+        'users': {
+            'total': row.users_total,
+            'active': row.users_active,
+            'admins': row.users_admins
+        }
+    }
+
+
+def get_payment_method_totals(shop_id: int, start: date) -> List[tuple]:
+    return [
+        (r.payment_method, int(r.count), float(r.total or 0))
+        for r in db.session.query(
+            ShopDailySales.payment_method,
+            func.sum(ShopDailySales.transactions).label('count'),
+            func.sum(ShopDailySales.total).label('total')
+        ).filter(
+            ShopDailySales.shop_id == shop_id,
+            ShopDailySales.sale_date >= start
+        ).group_by(ShopDailySales.payment_method).all()
+    ]
+
+
+def get_top_selling(shop_id: int, start: date, limit: int = 5) -> List[tuple]:
+    """(product, quantity, revenue) rows; product is a plain dict so it can be cached"""
+    quantity = func.sum(ShopDailyProductSales.quantity)
+    rows = db.session.query(
+        Product.id,
+        Product.name,
+        Product.image_url,
+        Category.name.label('category_name'),
+        quantity.label('total_quantity'),
+        func.sum(ShopDailyProductSales.revenue).label('total_sales')
+    )\
+        .join(ShopDailyProductSales, Product.id == ShopDailyProductSales.product_id)\
+        .outerjoin(Category, Category.id == Product.category_id)\
+        .filter(
+            ShopDailyProductSales.shop_id == shop_id,
+            ShopDailyProductSales.sale_date >= start
+        )\
+        .group_by(Product.id, Product.name, Product.image_url, Category.name)\
+        .order_by(quantity.desc())\
+        .limit(limit)\
+        .all()
+
+    return [(
+        {
+            'id': r.id,
+            'name': r.name,
+            'image_url': r.image_url,
+            'category': {'name': r.category_name} if r.category_name else None
+        },
+        float(r.total_quantity or 0),
+        float(r.total_sales or 0)
+    ) for r in rows]
+
+
+def get_dashboard_aggregates(shop_id: int) -> Dict:
+    """
+    All numeric dashboard figures for a shop, cached for DASHBOARD_CACHE_TIMEOUT
+    seconds and dropped on checkout (see invalidate_dashboard).
+    """
+    key = DASHBOARD_CACHE_KEY.format(shop_id=shop_id)
+    aggregates = cache.get(key)
+    if aggregates is None:
+        today = kenya_today()
+        month_start = today - timedelta(days=30)
+
+        daily = get_daily_totals(shop_id, today - timedelta(days=29), today)
+        days = [today - timedelta(days=n) for n in range(29, -1, -1)]
+
+        aggregates = {
+            'sales': get_sales_windows(shop_id, today),
+            'chart_labels': [day.strftime('%b %d') for day in days],
+            'chart_values': [daily.get(str(day), 0) for day in days],
+            'inventory': get_inventory_counts(shop_id),
+            'payment_methods': get_payment_method_totals(shop_id, month_start),
+            'top_selling': get_top_selling(shop_id, month_start)
+        }
+        cache.set(key, aggregates, timeout=current_app.config.get('DASHBOARD_CACHE_TIMEOUT', 60))
+
+    return with_live_today(aggregates, LiveSalesCounters.get(shop_id))
+
+
+def with_live_today(aggregates: Dict, counters: Dict) -> Dict:
+    """Aggregates with today's figures taken from the live sales counters"""
+    sales = dict(aggregates['sales'], today=counters['total_sales'], change=0)
+    if sales['yesterday'] > 0:
+        sales['change'] = (sales['today'] - sales['yesterday']) / sales['yesterday'] * 100
+    chart_values = aggregates['chart_values'][:-1] + [counters['total_sales']]
+    return dict(aggregates, sales=sales, chart_values=chart_values)
+
+
+def invalidate_dashboard(shop_id: int) -> None:
+    try:
+        cache.delete(DASHBOARD_CACHE_KEY.format(shop_id=shop_id))
+    except Exception as e:
+        logger.warning(f"Dashboard cache invalidation failed for shop {shop_id}: {str(e)}")
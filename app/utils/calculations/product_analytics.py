@@ -0,0 +1,282 @@
+import logging
+import statistics
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+from math import ceil
+from typing import Dict, List, Optional, Tuple
+from flask import current_app
+from sqlalchemy import func, select
+from app import db, cache
+from app.models import Product, Sale, CartItem, PriceChange, StockLog
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'product:{product_id}:analytics:{time_period}'
+
+PERIODS = {
+    'today': timedelta(days=1),
+    'week': timedelta(weeks=1),
+    'month': timedelta(days=30),
+    'year': timedelta(days=365),
+    'all': timedelta(days=365 * 10)  # 10 years as "all time"
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+DAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June',
+          'July', 'August', 'September', 'October', 'November', 'December']
+
+
+def safe_divide(numerator, denominator, default=0):
+    return numerator / denominator if denominator else default
+
+
+def to_seconds(value: datetime) -> float:
+    # Sale.date is naive UTC; datetime.timestamp() would assume server local time
+    return (value - EPOCH).total_seconds()
+
+
+def from_seconds(seconds: float) -> datetime:
+    return EPOCH + timedelta(seconds=seconds)
+
+
+class ProductAnalyticsEngine:
+    """
+    Every product_report metric computed from one fetch of the product's sale
+    lines, held as parallel arrays sorted by sale time. Periods (and the
+    previous_* periods used by trends) are bisected out of the arrays instead
+    of being queried again. Stock, price-change and basket figures take one
+    query each.
+    """
+
+    def __init__(self, product: Product, time_period: str = 'month', now: Optional[datetime] = None):
+        self.product = product
+        self.time_period = time_period if time_period in PERIODS else 'month'
+        self.now = now or datetime.utcnow()
+
+        self.timestamps = array('d')
+        self.quantities = array('d')
+        self.revenues = array('d')
+        self.charged = array('d')  # Line totals after discount, the revenue margins are taken on
+        self.costs = array('d')
+        self.sale_ids = array('q')
+        self.customers: List[Optional[str]] = []
+
+    @classmethod
+    def for_product(cls, product: Product, time_period: str = 'month') -> Dict:
+        """Analytics for the product report, cached per (product, time_period)"""
+        time_period = time_period if time_period in PERIODS else 'month'
+        key = CACHE_KEY.format(product_id=product.id, time_period=time_period)
+        analytics = cache.get(key)
+        if analytics is None:
+            analytics = cls(product, time_period).compute()
+            cache.set(key, analytics, timeout=current_app.config.get('PRODUCT_ANALYTICS_CACHE_TIMEOUT', 300))
+        return analytics
+
+    # ---------------
+    # Loading
+    # ---------------
+    def load(self) -> None:
+        rows = db.session.query(
+            Sale.id, Sale.date, Sale.customer_name, CartItem.quantity, CartItem.unit_price,
+            CartItem.total_price, CartItem.line_cost
+        )\
+            .join(Sale, CartItem.sale_id == Sale.id)\
+            .filter(CartItem.product_id == self.product.id, Sale.date != None)\
+            .order_by(Sale.date)\
+            .yield_per(1000)
+
+        fallback_cost = float(self.product.cost_price or 0)
+        for sale_id, sold_at, customer, quantity, unit_price, total_price, line_cost in rows:
+            quantity = float(quantity)
+            self.sale_ids.append(sale_id)
+            self.timestamps.append(to_seconds(sold_at))
+            self.quantities.append(quantity)
+            self.revenues.append(quantity * float(unit_price))
+            self.charged.append(float(total_price))
+            # Lines written before costs were snapshotted fall back to today's cost
+            self.costs.append(float(line_cost) if line_cost is not None else quantity * fallback_cost)
+            self.customers.append(customer)
+
+    def window(self, period: str) -> Tuple[int, int]:
+        """Index range of the lines in `period` ('month', 'previous_month', ...)"""
+        previous = period.startswith('previous_')
+        span = PERIODS.get(period[len('previous_'):] if previous else period, PERIODS['month'])
+        start = self.now - span * (2 if previous else 1)
+        end = self.now - span if previous else None
+
+        lo = bisect_left(self.timestamps, to_seconds(start))
+        hi = bisect_left(self.timestamps, to_seconds(end)) if end else len(self.timestamps)
+        return lo, hi
+
+    def period_start(self, period: str) -> datetime:
+        return self.now - PERIODS.get(period, PERIODS['month'])
+
+    # ---------------
+    # Metrics
+    # ---------------
+    def revenue(self, period: str) -> float:
+        lo, hi = self.window(period)
+        return sum(self.revenues[lo:hi])
+
+    def units(self, period: str) -> float:
+        lo, hi = self.window(period)
+        return sum(self.quantities[lo:hi])
+
+    def margin(self, period: str) -> float:
+        """Realised margin over the period's lines: what was charged against the cost each was sold at"""
+        lo, hi = self.window(period)
+        revenue = sum(self.charged[lo:hi])
+        if revenue <= 0:
+            return 0.0
+        return round((revenue - sum(self.costs[lo:hi])) / revenue * 100, 1)
+
+    def trend(self, metric, period: str) -> float:
+        current, previous = metric(period), metric(f'previous_{period}')
+        return round(safe_divide(current - previous, previous, 0) * 100, 1)
+
+    def units_by_weekday(self, period: str) -> List[float]:
+        """Units per weekday, Sunday first"""
+        lo, hi = self.window(period)
+        totals = [0.0] * 7
+        for i in range(lo, hi):
+            totals[(from_seconds(self.timestamps[i]).weekday() + 1) % 7] += self.quantities[i]
+        return totals
+
+    def avg_days_between_sales(self) -> float:
+        times = [from_seconds(ts) for ts in self.timestamps]
+        if len(times) < 2:
+            return 0.0
+        return round(statistics.mean((times[i] - times[i - 1]).days for i in range(1, len(times))), 1)
+
+    def units_by_calendar_month(self) -> Dict[int, float]:
+        """Units per month of the year (1-12), all years combined"""
+        totals = defaultdict(float)
+        for ts, quantity in zip(self.timestamps, self.quantities):
+            totals[from_seconds(ts).month] += quantity
+        return totals
+
+    def by_month(self, limit: int = 12) -> Tuple[List[str], List[float], List[float]]:
+        """Most recent `limit` 'YYYY-MM' months with sales, with units and revenue for each"""
+        units, revenue = defaultdict(float), defaultdict(float)
+        for ts, quantity, amount in zip(self.timestamps, self.quantities, self.revenues):
+            month = from_seconds(ts).strftime('%Y-%m')
+            units[month] += quantity
+            revenue[month] += amount
+        months = sorted(units, reverse=True)[:limit]
+        return months, [units[m] for m in months], [revenue[m] for m in months]
+
+    def avg_quantity_per_order(self, period: str) -> float:
+        lo, hi = self.window(period)
+        return round(sum(self.quantities[lo:hi]) / (hi - lo), 1) if hi > lo else 0.0
+
+    def repeat_purchase_rate(self, period: str) -> float:
+        """Share of named customers who bought the product in more than one sale"""
+        lo, hi = self.window(period)
+        sales_per_customer = defaultdict(set)
+        for i in range(lo, hi):
+            if self.customers[i]:
+                sales_per_customer[self.customers[i]].add(self.sale_ids[i])
+        repeaters = sum(1 for sales in sales_per_customer.values() if len(sales) > 1)
+        return round(safe_divide(repeaters, len(sales_per_customer), 0) * 100, 1)
+
+    def stock_figures(self, period: str) -> Tuple[float, int, float]:
+        """(max stock observed, stockouts in period, category average markup) in one round trip"""
+        product = self.product
+        row = db.session.query(
+            select(func.max(StockLog.new_stock))
+                .where(StockLog.product_id == product.id)
+                .scalar_subquery(),
+            select(func.count(StockLog.id))
+                .where(StockLog.product_id == product.id, StockLog.new_stock == 0,
+                       StockLog.date >= self.period_start(period))
+                .scalar_subquery(),
+            select(func.avg((Product.selling_price - Product.cost_price) / Product.cost_price))
+                .where(Product.category_id == product.category_id, Product.id != product.id)
+                .scalar_subquery()
+        ).one()
+        max_stock, stockouts, category_markup = row
+        return max_stock or product.stock, stockouts or 0, float(category_markup or 0.3)
+
+    def price_figures(self, period: str) -> Tuple[int, List[str], List[float]]:
+        """(price updates in period, recent selling-price change dates, price history)"""
+        changes = db.session.query(PriceChange.changed_at, PriceChange.change_type, PriceChange.new_price)\
+            .filter(PriceChange.product_id == self.product.id)\
+            .order_by(PriceChange.changed_at)\
+            .all()
+
+        start = self.period_start(period)
+        update_count = sum(1 for c in changes if c.change_type == 'price_update' and c.changed_at >= start)
+        change_dates = [
+            c.changed_at.strftime('%Y-%m-%d') for c in changes if c.change_type == 'selling_price_update'
+        ][-12:]
+        return update_count, change_dates, [float(c.new_price) for c in changes]
+
+    def frequently_bought_with(self, period: str, limit: int = 3) -> List[str]:
+        lo, hi = self.window(period)
+        if hi == lo:
+            return []
+        try:
+            baskets = select(CartItem.sale_id)\
+                .join(Sale, CartItem.sale_id == Sale.id)\
+                .where(CartItem.product_id == self.product.id, Sale.date >= self.period_start(period))
+            rows = db.session.query(Product.name, func.count(CartItem.product_id))\
+                .join(CartItem, CartItem.product_id == Product.id)\
+                .filter(CartItem.sale_id.in_(baskets), CartItem.product_id != self.product.id)\
+                .group_by(Product.name)\
+                .order_by(func.count(CartItem.product_id).desc())\
+                .limit(limit)\
+                .all()
+            return [name for name, _ in rows]
+        except Exception as e:
+            logger.error(f"Error finding frequently bought items: {str(e)}", exc_info=True)
+            return []
+
+    def compute(self) -> Dict:
+        """All analytics for the product report (same keys as before)"""
+        self.load()
+        period = self.time_period
+        product = self.product
+
+        by_calendar_month = self.units_by_calendar_month()
+        avg_monthly_usage = round(statistics.mean(by_calendar_month.values()), 1) if by_calendar_month else 0.0
+        max_stock, stockouts, category_markup = self.stock_figures(period)
+        price_updates, price_change_dates, price_history = self.price_figures(period)
+        months, units_by_month, revenue_by_month = self.by_month()
+        weekday_units = self.units_by_weekday(period)
+
+        suggested_price = 0.0
+        if product.cost_price:
+            suggested_price = round(float(product.cost_price) * (1 + category_markup), 2)
+
+        return {
+            'total_revenue': self.revenue(period),
+            'revenue_trend': self.trend(self.revenue, period),
+            'total_units_sold': self.units(period),
+            'sales_trend': self.trend(self.units, period),
+            'avg_profit_margin': self.margin(period),
+            'margin_trend': round(self.margin(period) - self.margin(f'previous_{period}'), 1),
+            'peak_sales_day': DAYS[weekday_units.index(max(weekday_units))] if any(weekday_units) else "No sales data",
+            'avg_days_between_sales': self.avg_days_between_sales(),
+            'max_stock_observed': max_stock,
+            'stockout_count': stockouts,
+            'avg_monthly_usage': avg_monthly_usage,
+            'stock_cover_days': ceil(product.stock / (avg_monthly_usage / 30)) if avg_monthly_usage else 0,
+            'best_selling_month': MONTHS[max(by_calendar_month, key=by_calendar_month.get) - 1] if by_calendar_month else "No data",
+            'revenue_growth': self.trend(self.revenue, 'year'),
+            'sales_growth': self.trend(self.units, 'year'),
+            'price_change_count': price_updates,
+            'suggested_price': suggested_price,
+            'avg_quantity_per_order': self.avg_quantity_per_order(period),
+            'repeat_purchase_rate': self.repeat_purchase_rate(period),
+            'frequently_bought_with': self.frequently_bought_with(period),
+            'months': months,
+            'units_sold_by_month': units_by_month,
+            'revenue_by_month': revenue_by_month,
+            'price_change_dates': price_change_dates,
+            'price_history': price_history,
+            'sales_by_day_of_week': weekday_units
+        }
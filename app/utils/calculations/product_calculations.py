@@ -77,16 +77,18 @@ def calculate_total_units_sold(product_id, time_period='month'):
     return units or 0
 
 def calculate_avg_profit_margin(product_id, time_period='month'):
-    """Calculate average profit margin percentage"""
+    """Calculate realised profit margin percentage from the cost snapshotted on each line"""
     time_filter = get_time_filter(time_period)
-    margins = db.session.query(
-        (Product.selling_price - Product.cost_price) / Product.selling_price * 100
-    ).join(CartItem).join(Sale).filter(
-        Product.id == product_id,
-        time_filter,
-        Product.selling_price > 0
-    ).all()
-    return round(statistics.mean([m[0] for m in margins]), 1) if margins else 0.0
+    revenue, cost = db.session.query(
+        func.sum(CartItem.total_price),
+        func.sum(CartItem.line_cost)
+    ).join(Sale).filter(
+        CartItem.product_id == product_id,
+        time_filter
+    ).one()
+    if not revenue:
+        return 0.0
+    return round(float((revenue - (cost or 0)) / revenue * 100), 1)
 
 # Trend Metrics
 def calculate_revenue_trend(product_id, time_period):
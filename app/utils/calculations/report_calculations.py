@@ -7,7 +7,8 @@ from sqlalchemy import func, extract, and_, or_, case, Date
 from sqlalchemy.exc import SQLAlchemyError
 from app import db, cache, csrf
 from app.models import (Product, Sale, CartItem, PriceChange, StockLog, 
-                       User,  Category)
+                       User,  Category, ShopDailySales, ShopDailyProductSales)
+from app.utils.time import kenya_day_bounds
 from decimal import Decimal
 from datetime import datetime, date
 from sqlalchemy import select
@@ -29,25 +30,121 @@ logger.setLevel(logging.INFO)
 
 
 
+SALE_STREAM_BATCH_SIZE = 1000
+
+
+def stream_sale_rows(shop_id, start, end, with_items=True):
+    """
+    Narrow per-line tuples for the shop's sales in [start, end) (naive UTC),
+    ordered by sale. Query.yield_per fetches them from a server-side cursor in
+    batches, and column tuples never enter the identity map, so no ORM
+    instances or unit-of-work state are built for the period. A consumer that
+    keeps every row (fold_sale_rows does) still holds the period in memory.
+    """
+    columns = [Sale.id, Sale.date, Sale.total, Sale.profit, Sale.payment_method, User.username]
+    if with_items:
+        columns += [Product.name.label('product_name'), CartItem.quantity, CartItem.total_price]
+
+    query = db.session.query(*columns).select_from(Sale).outerjoin(User, User.id == Sale.user_id)
+    if with_items:
+        query = query\
+            .outerjoin(CartItem, CartItem.sale_id == Sale.id)\
+            .outerjoin(Product, Product.id == CartItem.product_id)
+
+    return query.filter(
+        Sale.shop_id == shop_id,
+        Sale.date >= start,
+        Sale.date < end
+    ).order_by(Sale.date, Sale.id).yield_per(SALE_STREAM_BATCH_SIZE)
+
+
+def fold_sale_rows(rows):
+    """Fold streamed rows into one plain dict per sale, in stream order (the whole period is kept in the list)"""
+    sales = []
+    current = None
+    for row in rows:
+        if current is None or current['id'] != row.id:
+            current = {
+                'id': row.id,
+                'date': row.date,
+                'total': float(row.total),
+                'profit': float(row.profit or 0),
+                'payment_method': row.payment_method,
+                'username': row.username,
+                'lines': []
+            }
+            sales.append(current)
+        if getattr(row, 'product_name', None) is not None:
+            current['lines'].append({
+                'product': row.product_name,
+                'quantity': float(row.quantity),
+                'total_price': float(row.total_price)
+            })
+    return sales
+
+
+def daily_sales_rows(shop_id, start_date, end_date):
+    """shop_daily_sales rows for local dates start..end (inclusive) with the cashier's username"""
+    return db.session.query(
+        ShopDailySales.sale_date,
+        ShopDailySales.hour,
+        ShopDailySales.payment_method,
+        ShopDailySales.transactions,
+        ShopDailySales.total,
+        ShopDailySales.profit,
+        ShopDailySales.items,
+        User.username
+    ).outerjoin(
+        User, User.id == ShopDailySales.user_id
+    ).filter(
+        ShopDailySales.shop_id == shop_id,
+        ShopDailySales.sale_date >= start_date,
+        ShopDailySales.sale_date <= end_date
+    ).all()
+
+
+def daily_product_rows(shop_id, start_date, end_date):
+    """shop_daily_product_sales rows for local dates start..end (inclusive) with product and category names"""
+    return db.session.query(
+        ShopDailyProductSales.sale_date,
+        ShopDailyProductSales.quantity,
+        ShopDailyProductSales.revenue,
+        ShopDailyProductSales.cost,
+        ShopDailyProductSales.transactions,
+        Product.name,
+        Category.name.label('category_name')
+    ).join(
+        Product, Product.id == ShopDailyProductSales.product_id
+    ).outerjoin(
+        Category, Category.id == Product.category_id
+    ).filter(
+        ShopDailyProductSales.shop_id == shop_id,
+        ShopDailyProductSales.sale_date >= start_date,
+        ShopDailyProductSales.sale_date <= end_date
+    ).all()
+
+
+def product_sales_by_name(product_rows):
+    """(name, {'quantity', 'revenue'}) pairs, best revenue first"""
+    product_sales = defaultdict(lambda: {'quantity': Decimal('0.0'), 'revenue': Decimal('0.0')})
+    for row in product_rows:
+        product_sales[row.name]['quantity'] += row.quantity
+        product_sales[row.name]['revenue'] += row.revenue
+
+    return sorted(
+        [(name, {'quantity': float(data['quantity']), 'revenue': float(data['revenue'])})
+         for name, data in product_sales.items()],
+        key=lambda x: x[1]['revenue'],
+        reverse=True
+    )
+
+
 def generate_daily_report_data(shop_id, report_date):
     try:
-        # Initialize all data structures
-        product_sales = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0.0')})
-        payment_methods = defaultdict(Decimal)
-        hourly_sales = defaultdict(Decimal)
-        staff_performance = defaultdict(lambda: {'sales': 0, 'amount': Decimal('0.0')})
-        complete_product_sales = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0.0')})
-
-        # Base sales query - now shop-scoped
-        sales = Sale.query.filter(
-            func.date(Sale.date) == report_date,
-            Sale.shop_id == shop_id
-        ).options(
-            joinedload(Sale.cart_items).joinedload(CartItem.product),
-            joinedload(Sale.user)
-        ).all()
-
-        if not sales:
+        # Figures come from the rollups; only the transaction list reads sales
+        rows = daily_sales_rows(shop_id, report_date, report_date)
+
+        if not rows:
             return {
                 'sales': [],
                 'report_date': report_date,
@@ -64,47 +161,27 @@ def generate_daily_report_data(shop_id, report_date):
                 'complete_products': []
             }
 
-        # Process sales data
-        for sale in sales:
-            method = sale.payment_method.lower()
-            payment_methods[method] += Decimal(str(sale.total))
+        sales = fold_sale_rows(stream_sale_rows(shop_id, *kenya_day_bounds(report_date)))
 
-            hour = sale.date.hour
-            hourly_sales[f"{hour}:00-{hour+1}:00"] += Decimal(str(sale.total))
-
-            if sale.user:
-                staff_performance[sale.user.username]['sales'] += 1
-                staff_performance[sale.user.username]['amount'] += Decimal(str(sale.total))
-
-            for item in sale.cart_items:
-                product_name = item.product.name
-                quantity = item.quantity
-                revenue = Decimal(str(item.total_price))
-
-                complete_product_sales[product_name]['quantity'] += quantity
-                complete_product_sales[product_name]['revenue'] += revenue
-                product_sales[product_name]['quantity'] += quantity
-                product_sales[product_name]['revenue'] += revenue
+        payment_methods = defaultdict(Decimal)
+        hourly_sales = defaultdict(Decimal)
+        staff_performance = defaultdict(lambda: {'sales': 0, 'amount': Decimal('0.0')})
+        total_sales = Decimal('0')
+        total_profit = Decimal('0')
+        total_transactions = 0
+
+        for row in rows:
+            payment_methods[row.payment_method.lower()] += row.total
+            hourly_sales[row.hour] += row.total
+            if row.username:
+                staff_performance[row.username]['sales'] += row.transactions
+                staff_performance[row.username]['amount'] += row.total
+            total_sales += row.total
+            total_profit += row.profit
+            total_transactions += row.transactions
 
-        # Summarize
-        total_sales = sum(Decimal(str(sale.total)) for sale in sales)
-        total_transactions = len(sales)
-        total_profit = sum(Decimal(str(sale.profit)) if sale.profit is not None else Decimal('0') for sale in sales)
         avg_sale = total_sales / Decimal(str(total_transactions)) if total_transactions else Decimal('0')
-
-        sorted_products = sorted(
-            [(name, {'quantity': data['quantity'], 'revenue': float(data['revenue'])})
-             for name, data in product_sales.items()],
-            key=lambda x: x[1]['revenue'],
-            reverse=True
-        )[:10]
-
-        complete_products_list = sorted(
-            [(name, {'quantity': data['quantity'], 'revenue': float(data['revenue'])})
-             for name, data in complete_product_sales.items()],
-            key=lambda x: x[1]['revenue'],
-            reverse=True
-        )
+        complete_products_list = product_sales_by_name(daily_product_rows(shop_id, report_date, report_date))
 
         return {
             'sales': sales,
@@ -116,8 +193,8 @@ def generate_daily_report_data(shop_id, report_date):
                 'avg_sale': float(avg_sale)
             },
             'payment_methods': {k: float(v) for k, v in payment_methods.items()},
-            'product_performance': sorted_products,
-            'hourly_trends': [(k, float(v)) for k, v in sorted(hourly_sales.items())],
+            'product_performance': complete_products_list[:10],
+            'hourly_trends': [(f"{hour}:00-{hour+1}:00", float(v)) for hour, v in sorted(hourly_sales.items())],
             'complete_products': complete_products_list,
             'staff_performance': sorted(
                 [(k, {'sales': v['sales'], 'amount': float(v['amount'])})
@@ -148,28 +225,24 @@ def generate_daily_report_data(shop_id, report_date):
 
 #weekly report analysis
 def generate_weekly_report_context(shop_id, week, start_date, end_date):
-    sales = Sale.query.filter(
-        Sale.shop_id == shop_id,
-        Sale.date >= start_date,
-        Sale.date <= end_date
-    ).options(
-        joinedload(Sale.cart_items).joinedload(CartItem.product),
-        joinedload(Sale.user)
-    ).order_by(Sale.date.desc()).all()
-
-    total_sales = float(sum(Decimal(str(sale.total)) for sale in sales)) if sales else 0.0
-    total_profit = float(sum(Decimal(str(sale.profit or 0)) for sale in sales)) if sales else 0.0
-    total_transactions = len(sales)
+    rows = daily_sales_rows(shop_id, start_date, end_date)
+
+    sales = fold_sale_rows(stream_sale_rows(shop_id, *kenya_day_bounds(start_date, end_date), with_items=False))
+    sales.reverse()  # Newest first
+
+    total_sales = float(sum(row.total for row in rows)) if rows else 0.0
+    total_profit = float(sum(row.profit for row in rows)) if rows else 0.0
+    total_transactions = sum(row.transactions for row in rows)
     avg_sale = float(total_sales / total_transactions) if total_transactions else 0.0
 
     prev_week_start = start_date - timedelta(weeks=1)
     prev_week_end = end_date - timedelta(weeks=1)
     prev_week_sales = float(
-        db.session.query(func.sum(Sale.total))
+        db.session.query(func.sum(ShopDailySales.total))
         .filter(
-            Sale.shop_id == shop_id,
-            Sale.date >= prev_week_start,
-            Sale.date <= prev_week_end
+            ShopDailySales.shop_id == shop_id,
+            ShopDailySales.sale_date >= prev_week_start,
+            ShopDailySales.sale_date <= prev_week_end
         )
         .scalar() or 0.0
     )
@@ -183,35 +256,19 @@ def generate_weekly_report_context(shop_id, week, start_date, end_date):
 
     weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
     daily_data = {day: {'sales': 0.0, 'transactions': 0} for day in weekdays}
-    for sale in sales:
-        day = sale.date.strftime('%A')
-        daily_data[day]['sales'] += float(sale.total)
-        daily_data[day]['transactions'] += 1
-
     hourly_sales = {f"{hour:02d}:00": 0.0 for hour in range(24)}
-    for sale in sales:
-        hour_key = sale.date.strftime('%H:00')
-        hourly_sales[hour_key] += float(sale.total)
+    payment_methods = defaultdict(float)
+    for row in rows:
+        day = row.sale_date.strftime('%A')
+        daily_data[day]['sales'] += float(row.total)
+        daily_data[day]['transactions'] += row.transactions
+        hourly_sales[f"{row.hour:02d}:00"] += float(row.total)
+        payment_methods[row.payment_method.lower()] += float(row.total)
+
     hourly_labels = sorted(hourly_sales.keys())
     hourly_values = [hourly_sales[hour] for hour in hourly_labels]
 
-    payment_methods = defaultdict(float)
-    for sale in sales:
-        method = sale.payment_method.lower()
-        payment_methods[method] += float(sale.total)
-
-    product_sales = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0')})
-    for sale in sales:
-        for item in sale.cart_items:
-            product_sales[item.product.name]['quantity'] += item.quantity
-            product_sales[item.product.name]['revenue'] += Decimal(str(item.total_price))
-
-    sorted_products = sorted(
-        [(k, {'quantity': v['quantity'], 'revenue': float(v['revenue'])})
-         for k, v in product_sales.items()],
-        key=lambda x: x[1]['revenue'],
-        reverse=True
-    )[:10]
+    sorted_products = product_sales_by_name(daily_product_rows(shop_id, start_date, end_date))[:10]
 
     return {
         'sales': sales,
@@ -246,7 +303,8 @@ class MonthlySalesAnalyzer:
         self.prev_month = None
         self.next_month = None
         self.days_in_month = None
-        self.sales = []
+        self.daily_rows = []
+        self.product_rows = []
         self.metrics = {}  # Store metrics for later access
 
         
@@ -265,22 +323,10 @@ class MonthlySalesAnalyzer:
             return False
     
     def fetch_sales_data(self):
-        """Query sales data with eager loading"""
+        """Load the month's daily rollup rows"""
         try:
-            self.sales = (
-                Sale.query.filter(
-                    Sale.shop_id == self.shop_id,
-                    Sale.date >= self.first_day,
-                    Sale.date <= self.last_day
-                )
-                .options(
-                    joinedload(Sale.cart_items).joinedload(CartItem.product),
-                    joinedload(Sale.user)
-                )
-                .order_by(Sale.date)
-                .all()
-            )
-
+            self.daily_rows = daily_sales_rows(self.shop_id, self.first_day, self.last_day)
+            self.product_rows = daily_product_rows(self.shop_id, self.first_day, self.last_day)
             return True
         except Exception as e:
             current_app.logger.error(f"Sales query error: {str(e)}")
@@ -291,7 +337,7 @@ class MonthlySalesAnalyzer:
         metrics = {
             'total_sales': Decimal('0.0'),
             'total_profit': Decimal('0.0'),
-            'total_transactions': len(self.sales),
+            'total_transactions': 0,
             'avg_sale': Decimal('0.0'),
             'avg_profit_margin': Decimal('0.0'),
             'products_sold': 0,
@@ -299,30 +345,21 @@ class MonthlySalesAnalyzer:
             'total_cost': Decimal('0.0')
         }
 
-        if not self.sales:
+        if not self.daily_rows:
             self.metrics = metrics
             return {k: float(v) if isinstance(v, Decimal) else v for k, v in metrics.items()}
 
-        refund_count = 0
-        total_cost = Decimal('0.0')
-
-        for sale in self.sales:
-            sale_total = Decimal(str(sale.total))
-            metrics['total_sales'] += sale_total
-            metrics['total_profit'] += Decimal(str(sale.profit)) if sale.profit else Decimal('0.0')
+        for row in self.daily_rows:
+            metrics['total_sales'] += row.total
+            metrics['total_profit'] += row.profit
+            metrics['total_transactions'] += row.transactions
+            metrics['products_sold'] += row.items
 
-            if hasattr(sale, 'is_refund') and sale.is_refund:
-                refund_count += 1
-
-            for item in sale.cart_items:
-                metrics['products_sold'] += item.quantity
-                if item.product and item.product.cost_price:
-                    item_cost = Decimal(str(item.product.cost_price)) * item.quantity
-                    total_cost += item_cost
+        # Sales carry no refund flag yet, so refund_rate stays at zero
+        total_cost = sum((row.cost for row in self.product_rows), Decimal('0.0'))
 
         metrics['total_cost'] = total_cost
         metrics['avg_sale'] = metrics['total_sales'] / metrics['total_transactions'] if metrics['total_transactions'] > 0 else Decimal('0.0')
-        metrics['refund_rate'] = (Decimal(refund_count) / metrics['total_transactions'] * 100) if metrics['total_transactions'] > 0 else Decimal('0.0')
 
         if metrics['total_sales'] > 0:
             gross_profit = metrics['total_sales'] - total_cost
@@ -347,11 +384,11 @@ class MonthlySalesAnalyzer:
         # Month-over-month
         prev_last = (self.prev_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
         prev_data = db.session.query(
-            func.sum(Sale.total), func.sum(Sale.profit)
+            func.sum(ShopDailySales.total), func.sum(ShopDailySales.profit)
         ).filter(
-            Sale.shop_id == self.shop_id,  # ✅ Scoped
-            Sale.date >= self.prev_month,
-            Sale.date <= prev_last
+            ShopDailySales.shop_id == self.shop_id,  # ✅ Scoped
+            ShopDailySales.sale_date >= self.prev_month,
+            ShopDailySales.sale_date <= prev_last
         ).first()
 
         prev_total, prev_profit = prev_data or (0, 0)
@@ -368,11 +405,11 @@ class MonthlySalesAnalyzer:
         last_year = self.first_day - timedelta(days=365)
         last_year_end = (last_year + timedelta(days=32)).replace(day=1) - timedelta(days=1)
         ly_data = db.session.query(
-            func.sum(Sale.total), func.sum(Sale.profit)
+            func.sum(ShopDailySales.total), func.sum(ShopDailySales.profit)
         ).filter(
-            Sale.shop_id == self.shop_id,  # ✅ Scoped
-            Sale.date >= last_year.replace(day=1),
-            Sale.date <= last_year_end
+            ShopDailySales.shop_id == self.shop_id,  # ✅ Scoped
+            ShopDailySales.sale_date >= last_year.replace(day=1),
+            ShopDailySales.sale_date <= last_year_end
         ).first()
 
         ly_sales = Decimal(str(ly_data[0] or 0))
@@ -432,30 +469,26 @@ class MonthlySalesAnalyzer:
             }
 
         # Populate daily data
-        for sale in self.sales:
-            day_key = sale.date.replace(hour=0, minute=0, second=0, microsecond=0)
-            if day_key in daily_data:
-                daily = daily_data[day_key]
-                sale_total = Decimal(str(sale.total))
-                sale_profit = Decimal(str(sale.profit)) if sale.profit else Decimal('0.0')
-                
-                daily['sales'] += sale_total
-                daily['transactions'] += 1
-                daily['profit'] += sale_profit
-                
-                # Calculate product quantities and costs
-                for item in sale.cart_items:
-                    daily['products'] += item.quantity
-                    if item.product and item.product.cost_price:
-                        daily['cost'] += Decimal(str(item.product.cost_price)) * item.quantity
-                
-                # Calculate margin if we have sales
-                if daily['sales'] > 0:
-                    daily['margin'] = ((daily['sales'] - daily['cost']) / daily['sales'] * 100)
-                
-                # Calculate average sale
-                if daily['transactions'] > 0:
-                    daily['avg_sale'] = daily['sales'] / daily['transactions']
+        for row in self.daily_rows:
+            if row.sale_date in daily_data:
+                daily = daily_data[row.sale_date]
+                daily['sales'] += row.total
+                daily['transactions'] += row.transactions
+                daily['profit'] += row.profit
+                daily['products'] += row.items
+
+        for row in self.product_rows:
+            if row.sale_date in daily_data:
+                daily_data[row.sale_date]['cost'] += row.cost
+
+        for daily in daily_data.values():
+            # Calculate margin if we have sales
+            if daily['sales'] > 0:
+                daily['margin'] = ((daily['sales'] - daily['cost']) / daily['sales'] * 100)
+
+            # Calculate average sale
+            if daily['transactions'] > 0:
+                daily['avg_sale'] = daily['sales'] / daily['transactions']
 
         # Weekly breakdown
         weekly_data = {
@@ -502,28 +535,20 @@ class MonthlySalesAnalyzer:
             'cost': Decimal('0.0'),
             'profit': Decimal('0.0'),
             'margin': Decimal('0.0'),
-            'transactions': set(),
+            'transactions': 0,
             'categories': set()
         })
 
-        for sale in self.sales:
-            for item in sale.cart_items:
-                product = item.product
-                if not product:
-                    continue
-                    
-                item_revenue = Decimal(str(item.total_price))
-                item_cost = Decimal(str(product.cost_price)) * item.quantity if product.cost_price else Decimal('0.0')
-                item_profit = item_revenue - item_cost
-                
-                pm = product_metrics[product.name]
-                pm['quantity'] += item.quantity
-                pm['revenue'] += item_revenue
-                pm['cost'] += item_cost
-                pm['profit'] += item_profit
-                pm['transactions'].add(sale.id)
-                if product.category:
-                    pm['categories'].add(product.category.name)
+        for row in self.product_rows:
+            # A sale falls on exactly one day, so daily sale counts add up per product
+            pm = product_metrics[row.name]
+            pm['quantity'] += row.quantity
+            pm['revenue'] += row.revenue
+            pm['cost'] += row.cost
+            pm['profit'] += row.revenue - row.cost
+            pm['transactions'] += row.transactions
+            if row.category_name:
+                pm['categories'].add(row.category_name)
 
         # Calculate metrics for each product
         top_products = []
@@ -536,10 +561,10 @@ class MonthlySalesAnalyzer:
                 'cost': data['cost'],
                 'profit': data['profit'],
                 'margin': margin,
-                'transactions': len(data['transactions']),
+                'transactions': data['transactions'],
                 'categories': list(data['categories']),
-                'avg_order_value': data['revenue'] / len(data['transactions']) if data['transactions'] else Decimal('0.0'),
-                'avg_quantity': data['quantity'] / len(data['transactions']) if data['transactions'] else Decimal('0.0')
+                'avg_order_value': data['revenue'] / data['transactions'] if data['transactions'] else Decimal('0.0'),
+                'avg_quantity': data['quantity'] / data['transactions'] if data['transactions'] else Decimal('0.0')
             })
 
         # Sort by revenue and convert Decimals to floats
@@ -558,7 +583,7 @@ class MonthlySalesAnalyzer:
             'profit': Decimal('0.0'),
             'products': 0,
             'quantity': 0,
-            'transactions': set()
+            'transactions': 0
         })
 
         for product_data in product_metrics.values():
@@ -569,7 +594,8 @@ class MonthlySalesAnalyzer:
                 cm['profit'] += product_data['profit']
                 cm['products'] += 1
                 cm['quantity'] += product_data['quantity']
-                cm['transactions'].update(product_data['transactions'])
+                # Counts a sale once per product bought in the category
+                cm['transactions'] += product_data['transactions']
 
         # Calculate category metrics
         category_breakdown = []
@@ -583,8 +609,8 @@ class MonthlySalesAnalyzer:
                 'margin': margin,
                 'products': data['products'],
                 'quantity': data['quantity'],
-                'transactions': len(data['transactions']),
-                'avg_sale_value': data['revenue'] / len(data['transactions']) if data['transactions'] else Decimal('0.0')
+                'transactions': data['transactions'],
+                'avg_sale_value': data['revenue'] / data['transactions'] if data['transactions'] else Decimal('0.0')
             })
 
         # Sort by revenue and convert Decimals to floats
@@ -600,10 +626,10 @@ class MonthlySalesAnalyzer:
             'count': 0
         })
 
-        for sale in self.sales:
-            method = sale.payment_method or 'Unknown'
-            payment_summary[method]['total'] += Decimal(str(sale.total))
-            payment_summary[method]['count'] += 1
+        for row in self.daily_rows:
+            method = row.payment_method or 'Unknown'
+            payment_summary[method]['total'] += row.total
+            payment_summary[method]['count'] += row.transactions
 
         # Convert to float for JSON
         return {
@@ -621,26 +647,20 @@ class MonthlySalesAnalyzer:
             'sales_value': Decimal('0.0'),
             'profit': Decimal('0.0'),
             'products_sold': 0,
-            'transactions': set(),
             'avg_sale': Decimal('0.0'),
             'profit_margin': Decimal('0.0'),
             'products_per_sale': Decimal('0.0')
         })
 
-        for sale in self.sales:
-            if not sale.user:
+        for row in self.daily_rows:
+            if not row.username:
                 continue
-                
-            sale_value = Decimal(str(sale.total))
-            sale_profit = Decimal(str(sale.profit)) if sale.profit else Decimal('0.0')
-            products_sold = sum(item.quantity for item in sale.cart_items)
-            
-            staff = staff_performance[sale.user.username]
-            staff['sales_count'] += 1
-            staff['sales_value'] += sale_value
-            staff['profit'] += sale_profit
-            staff['products_sold'] += products_sold
-            staff['transactions'].add(sale.id)
+
+            staff = staff_performance[row.username]
+            staff['sales_count'] += row.transactions
+            staff['sales_value'] += row.total
+            staff['profit'] += row.profit
+            staff['products_sold'] += row.items
 
         # Calculate derived metrics
         for staff in staff_performance.values():
@@ -749,7 +769,8 @@ class MonthlySalesAnalyzer:
         
         if full_report:
             self.staff_analytics = self.generate_staff_analytics()
-            self.customer_analytics = self.generate_customer_analysis()
+            # Rollups carry no customer dimension
+            self.customer_analytics = {}
 
         self.chart_data = self.prepare_chart_data()
 
@@ -794,12 +815,9 @@ class MonthlySalesAnalyzer:
             'avg_sale': Decimal('0.0')
         } for hour in range(24)}
 
-        for sale in self.sales:
-            hour = sale.date.hour
-            sale_amount = Decimal(str(sale.total))
-            
-            hourly_data[hour]['sales'] += sale_amount
-            hourly_data[hour]['transactions'] += 1
+        for row in self.daily_rows:
+            hourly_data[row.hour]['sales'] += row.total
+            hourly_data[row.hour]['transactions'] += row.transactions
 
         # Calculate averages
         for hour in hourly_data.values():
@@ -0,0 +1,172 @@
+import gzip
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, Optional, Union
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:  # Optional; responses fall back to gzip without it
+    brotli = None
+
+COMPRESSIBLE = ('application/json', 'text/html', 'text/csv', 'text/plain', 'application/javascript')
+STREAM_CHUNK = 64 * 1024
+
+
+def negotiate_encoding() -> Optional[str]:
+    """The best encoding the client accepts: 'br', 'gzip', or None for identity"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    accepted = request.accept_encodings
+    encoding = accepted.best_match(offered)
+    return encoding if encoding and accepted[encoding] else None
+
+
+def compress(body: Union[str, bytes], encoding: Optional[str]) -> bytes:
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if encoding == 'br':
+        return brotli.compress(body, quality=current_app.config.get('BROTLI_QUALITY', 5))
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=current_app.config.get('GZIP_LEVEL', 6))
+    return body
+
+
+def encoded_response(body: bytes, encoding: Optional[str], mimetype: str = 'application/json') -> Response:
+    """A response for a body already compressed with `encoding` (None when sent as-is)"""
+    response = Response(body, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compressed_response(body: Union[str, bytes], mimetype: str = 'application/json') -> Response:
+    """Compress `body` for this request's Accept-Encoding"""
+    encoding = negotiate_encoding()
+    return encoded_response(compress(body, encoding), encoding, mimetype)
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str, config):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=config.get('BROTLI_QUALITY', 5))
+            self._compress, self._finish = self._compressor.process, self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(config.get('GZIP_LEVEL', 6), zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress, self._finish = self._compressor.compress, self._compressor.flush
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compress(chunk)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+class ResponseCompression:
+    """
+    Compresses responses from the blueprints in COMPRESS_BLUEPRINTS for the
+    client's Accept-Encoding (brotli when installed, else gzip).
+
+    - Bodies under COMPRESS_MIN_SIZE go out as they are.
+    - Bodies from COMPRESS_STREAM_SIZE up, and responses that are already
+      streamed, are compressed chunk by chunk as they are sent, so large
+      report JSON starts arriving before all of it is compressed.
+    - Responses that set their own Content-Encoding (e.g. the precompressed
+      POS catalogue) are left alone.
+
+    Per endpoint, stats() reports bytes before and after compression, the time
+    spent compressing, and the transfer time saved at COMPRESS_REFERENCE_KBPS
+    (a 3G till link) net of that compression time.
+    """
+
+    _stats: Dict[str, Dict[str, float]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def init_app(cls, app) -> None:
+        app.after_request(cls._compress)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, float]]:
+        with cls._lock:
+            stats = {endpoint: dict(figures) for endpoint, figures in cls._stats.items()}
+        kbps = current_app.config.get('COMPRESS_REFERENCE_KBPS', 750)
+        for figures in stats.values():
+            saved = figures['bytes_in'] - figures['bytes_out']
+            figures['ratio'] = figures['bytes_out'] / figures['bytes_in'] if figures['bytes_in'] else 1.0
+            figures['transfer_saved'] = saved * 8 / (kbps * 1000)
+            figures['latency_saved'] = figures['transfer_saved'] - figures['compress_time']
+        return stats
+
+    @classmethod
+    def _record(cls, endpoint: str, bytes_in: int, bytes_out: int, elapsed: float) -> None:
+        with cls._lock:
+            figures = cls._stats.setdefault(endpoint, {
+                'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'compress_time': 0.0
+            })
+            figures['responses'] += 1
+            figures['bytes_in'] += bytes_in
+            figures['bytes_out'] += bytes_out
+            figures['compress_time'] += elapsed
+
+    @classmethod
+    def _compress(cls, response: Response) -> Response:
+        config = current_app.config
+        if request.blueprint not in config.get('COMPRESS_BLUEPRINTS', ()):
+            return response
+        if (
+            response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.direct_passthrough  # Files, sent as they are stored
+            or response.mimetype not in COMPRESSIBLE
+        ):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding()
+        if encoding is None:
+            return response
+
+        endpoint = request.endpoint or request.path
+        if response.is_streamed:
+            chunks = response.response
+        else:
+            body = response.get_data()
+            if len(body) < config.get('COMPRESS_MIN_SIZE', 1024):
+                return response
+            if len(body) < config.get('COMPRESS_STREAM_SIZE', 262144):
+                started = time.perf_counter()
+                compressed = compress(body, encoding)
+                cls._record(endpoint, len(body), len(compressed), time.perf_counter() - started)
+                response.set_data(compressed)
+                response.headers['Content-Encoding'] = encoding
+                return response
+            chunks = (body[i:i + STREAM_CHUNK] for i in range(0, len(body), STREAM_CHUNK))
+
+        response.response = cls._stream(chunks, _StreamCompressor(encoding, config), endpoint)
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Length', None)
+        return response
+
+    @classmethod
+    def _stream(cls, chunks: Iterable, compressor: _StreamCompressor, endpoint: str) -> Iterator[bytes]:
+        bytes_in = bytes_out = 0
+        elapsed = 0.0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            started = time.perf_counter()
+            out = compressor.compress(chunk)
+            elapsed += time.perf_counter() - started
+            bytes_in += len(chunk)
+            bytes_out += len(out)
+            if out:
+                yield out
+        started = time.perf_counter()
+        out = compressor.finish()
+        elapsed += time.perf_counter() - started
+        bytes_out += len(out)
+        cls._record(endpoint, bytes_in, bytes_out, elapsed)
+        if out:
+            yield out
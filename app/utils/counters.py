@@ -0,0 +1,210 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Optional, Set, Tuple
+from flask import current_app
+from redis.exceptions import WatchError
+from sqlalchemy import or_
+from app import db, cache
+from app.models import Sale
+from app.utils.time import kenya_today, kenya_day_bounds, to_kenya_time
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_KEY = 'shop:{shop_id}:live:{day}'
+COUNTED_KEY = 'shop:{shop_id}:live:{day}:sales'
+SEEDED = 'seeded'
+
+
+def _redis():
+    """The cache's Redis client, or None when the cache backend is not Redis"""
+    return getattr(cache.cache, '_write_client', None)
+
+
+def _key(shop_id: int, day: date) -> str:
+    return getattr(cache.cache, 'key_prefix', '') + COUNTERS_KEY.format(shop_id=shop_id, day=day.isoformat())
+
+
+def _counted_key(shop_id: int, day: date) -> str:
+    return getattr(cache.cache, 'key_prefix', '') + COUNTED_KEY.format(shop_id=shop_id, day=day.isoformat())
+
+
+class LiveSalesCounters:
+    """
+    Today's sales figures per shop and Nairobi local day, kept as one Redis
+    hash: total, transactions, profit, and total/count per payment method and
+    per local hour.
+
+    - Checkout increments the hash in one MULTI right after its commit and
+      pushes the new figures to the shop's socket room ('sales_counters').
+    - A hash is seeded from Sale the first time it is read (or incremented)
+      and can be rebuilt at any time with `flask counters reconcile`, which
+      repairs drift from edited or voided sales.
+    - Alongside the hash, a set holds the IDs of the sales it counts. A sale
+      that commits before a rebuild reads Sale but increments after the
+      rebuild is already in the set, so its increment is skipped.
+    - Without a Redis cache backend, reads fall back to querying Sale.
+    """
+
+    @staticmethod
+    def record_sale(shop_id: int, sale_id: int, sold_at: datetime, total: float, profit: float,
+                    payment_method: str) -> Optional[Dict]:
+        """Count a committed sale once; returns the day's figures, or None if Redis is unavailable"""
+        client = _redis()
+        if client is None:
+            return None
+
+        local = to_kenya_time(sold_at)
+        day = local.date()
+        key, counted = _key(shop_id, day), _counted_key(shop_id, day)
+        ttl = current_app.config.get('LIVE_COUNTERS_TTL', 172800)
+        fields = None
+        try:
+            with client.pipeline(transaction=True) as pipe:
+                for _ in range(3):
+                    try:
+                        # A reconcile or another checkout writing either key restarts the increment
+                        pipe.watch(key, counted)
+                        if not pipe.hexists(key, SEEDED):
+                            break
+                        if pipe.sismember(counted, sale_id):
+                            # Read from Sale by a reconcile that ran after the commit
+                            fields = pipe.hgetall(key)
+                            break
+                        pipe.multi()
+                        pipe.sadd(counted, sale_id)
+                        pipe.hincrbyfloat(key, 'total', total)
+                        pipe.hincrbyfloat(key, 'profit', profit)
+                        pipe.hincrby(key, 'transactions', 1)
+                        pipe.hincrbyfloat(key, f'method:{payment_method}:total', total)
+                        pipe.hincrby(key, f'method:{payment_method}:count', 1)
+                        pipe.hincrbyfloat(key, f'hour:{local.hour}:total', total)
+                        pipe.hincrby(key, f'hour:{local.hour}:count', 1)
+                        pipe.expire(key, ttl)
+                        pipe.expire(counted, ttl)
+                        pipe.hgetall(key)
+                        fields = pipe.execute()[-1]
+                        break
+                    except WatchError:
+                        continue
+        except Exception as e:
+            logger.warning(f"[Shop {shop_id}] Live counter update failed: {str(e)}")
+            return None
+
+        # First sale since the hash expired or was dropped, or the increment kept
+        # losing the race: seed it from Sale, which has this sale committed
+        if fields is None:
+            return LiveSalesCounters.reconcile(shop_id, day)
+        return LiveSalesCounters._decode(shop_id, day, fields)
+
+    @staticmethod
+    def get(shop_id: int, day: Optional[date] = None) -> Dict:
+        """The day's figures (today by default), seeding the counters on a miss"""
+        day = day or kenya_today()
+        client = _redis()
+        if client is not None:
+            try:
+                fields = client.hgetall(_key(shop_id, day))
+                if SEEDED.encode() in fields:
+                    return LiveSalesCounters._decode(shop_id, day, fields)
+            except Exception as e:
+                logger.warning(f"[Shop {shop_id}] Live counter read failed: {str(e)}")
+                return LiveSalesCounters._decode(shop_id, day, LiveSalesCounters._from_sales(shop_id, day)[0])
+        return LiveSalesCounters.reconcile(shop_id, day)
+
+    @staticmethod
+    def reconcile(shop_id: int, day: Optional[date] = None) -> Dict:
+        """Rebuild the day's counters, and the set of sales they count, from Sale and return them"""
+        day = day or kenya_today()
+        client = _redis()
+        if client is None:
+            return LiveSalesCounters._decode(shop_id, day, LiveSalesCounters._from_sales(shop_id, day)[0])
+
+        key, counted = _key(shop_id, day), _counted_key(shop_id, day)
+        ttl = current_app.config.get('LIVE_COUNTERS_TTL', 172800)
+        fields = None
+        try:
+            with client.pipeline(transaction=True) as pipe:
+                for _ in range(3):
+                    try:
+                        # A checkout incrementing mid-rebuild restarts it. One that commits before
+                        # the read but increments after finds its sale ID in the set and skips.
+                        pipe.watch(key, counted)
+                        fields, sale_ids = LiveSalesCounters._from_sales(shop_id, day)
+                        pipe.multi()
+                        pipe.delete(key, counted)
+                        pipe.hset(key, mapping=fields)
+                        if sale_ids:
+                            pipe.sadd(counted, *sale_ids)
+                        pipe.expire(key, ttl)
+                        pipe.expire(counted, ttl)
+                        pipe.execute()
+                        break
+                    except WatchError:
+                        continue
+        except Exception as e:
+            logger.warning(f"[Shop {shop_id}] Live counter reconcile failed: {str(e)}")
+
+        if fields is None:
+            fields = LiveSalesCounters._from_sales(shop_id, day)[0]
+        return LiveSalesCounters._decode(shop_id, day, fields)
+
+    @staticmethod
+    def _from_sales(shop_id: int, day: date) -> Tuple[Dict[str, object], Set[int]]:
+        """The day's counter fields and the IDs of the sales they count"""
+        start, end = kenya_day_bounds(day)
+        rows = db.session.query(Sale.id, Sale.date, Sale.total, Sale.profit, Sale.payment_method)\
+            .filter(
+                Sale.shop_id == shop_id,
+                Sale.date >= start,
+                Sale.date < end,
+                or_(Sale.is_deleted == False, Sale.is_deleted == None)
+            )\
+            .all()
+
+        fields = defaultdict(float)
+        fields[SEEDED] = 1
+        fields['transactions'] = 0
+        sale_ids = set()
+        for sale_id, sold_at, total, profit, payment_method in rows:
+            sale_ids.add(sale_id)
+            hour = to_kenya_time(sold_at).hour
+            total = float(total or 0)
+            fields['total'] += total
+            fields['profit'] += float(profit or 0)
+            fields['transactions'] += 1
+            fields[f'method:{payment_method}:total'] += total
+            fields[f'method:{payment_method}:count'] += 1
+            fields[f'hour:{hour}:total'] += total
+            fields[f'hour:{hour}:count'] += 1
+        return dict(fields), sale_ids
+
+    @staticmethod
+    def _decode(shop_id: int, day: date, fields: Dict) -> Dict:
+        counters = {
+            'shop_id': shop_id,
+            'date': day.isoformat(),
+            'total_sales': 0.0,
+            'total_transactions': 0,
+            'total_profit': 0.0,
+            'payment_methods': defaultdict(lambda: {'total': 0.0, 'count': 0}),
+            'hours': defaultdict(lambda: {'total': 0.0, 'count': 0})
+        }
+        for name, value in fields.items():
+            name = name.decode() if isinstance(name, bytes) else name
+            value = float(value)
+            if name == 'total':
+                counters['total_sales'] = round(value, 2)
+            elif name == 'profit':
+                counters['total_profit'] = round(value, 2)
+            elif name == 'transactions':
+                counters['total_transactions'] = int(value)
+            elif name.startswith(('method:', 'hour:')):
+                group, bucket = name.split(':', 1)
+                bucket, stat = bucket.rsplit(':', 1)
+                group = 'payment_methods' if group == 'method' else 'hours'
+                counters[group][bucket][stat] = round(value, 2) if stat == 'total' else int(value)
+
+        counters['payment_methods'] = dict(counters['payment_methods'])
+        counters['hours'] = {int(hour): figures for hour, figures in sorted(counters['hours'].items(), key=lambda h: int(h[0]))}
+        return counters
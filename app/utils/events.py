@@ -0,0 +1,64 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Hashable, Optional, Tuple
+from flask import current_app
+from app import socketio
+
+logger = logging.getLogger(__name__)
+
+
+class SocketBatcher:
+    """
+    Socket events buffered per (event, room) and sent as one
+    {'events': [...]} frame per room every SOCKET_EMIT_INTERVAL seconds.
+
+    Payloads emitted with a `key` are coalesced: within a window only the
+    latest payload per key is sent, so a burst of stock changes to one
+    product goes out once. Frames go through socketio.emit, so with a
+    message queue configured they reach the room on every server worker.
+    """
+
+    _buffer: Dict[Tuple[str, str], Dict[Hashable, Dict]] = {}
+    _lock = threading.Lock()
+    _pid = None
+    _sequence = 0
+
+    @classmethod
+    def emit(cls, event: str, room: str, payload: Dict, key: Optional[Hashable] = None) -> None:
+        cls._ensure_started()
+        with cls._lock:
+            if key is None:
+                cls._sequence += 1
+                key = ('seq', cls._sequence)
+            pending = cls._buffer.setdefault((event, room), {})
+            # A replaced payload moves to the end, keeping the frame in event order
+            pending.pop(key, None)
+            pending[key] = payload
+
+    @classmethod
+    def _ensure_started(cls) -> None:
+        # Started lazily, and again in each forked server worker
+        if cls._pid == os.getpid():
+            return
+        with cls._lock:
+            if cls._pid == os.getpid():
+                return
+            app = current_app._get_current_object()
+            cls._buffer = {}
+            threading.Thread(target=cls._flush, args=(app,), name='socket-batcher', daemon=True).start()
+            cls._pid = os.getpid()
+
+    @classmethod
+    def _flush(cls, app) -> None:
+        interval = app.config.get('SOCKET_EMIT_INTERVAL', 0.25)
+        while True:
+            time.sleep(interval)
+            with cls._lock:
+                pending, cls._buffer = cls._buffer, {}
+            for (event, room), payloads in pending.items():
+                try:
+                    socketio.emit(event, {'events': list(payloads.values())}, room=room)
+                except Exception as e:
+                    logger.warning(f"Emit of {len(payloads)} '{event}' events to {room} failed: {str(e)}")
@@ -0,0 +1,52 @@
+from typing import Dict, List, Tuple
+from sqlalchemy import inspect
+from sqlalchemy.orm import Load
+
+# Relationship strategies that load in the same query or an extra one without
+# the relationship ever being read
+EAGER = {'joined', 'selectin', 'subquery', 'immediate'}
+
+# Nested paths are trimmed this deep (Sale -> cart_items -> product -> shop)
+MAX_DEPTH = 3
+
+# Per profile: the relationships, by model name ('*' for every model), whose
+# default eager loading is kept. Every other eager relationship is lazy-loaded
+# instead, so it costs nothing unless it is actually read.
+PROFILES: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    # Column reads and bulk loads: no relationship is joined
+    'lean': {},
+    # POS cards show the category and supplier names
+    'pos': {'Product': ('category', 'supplier')},
+    # Transaction lists and receipts show the cashier and the product sold
+    'report': {'Sale': ('user', 'cart_items'), 'CartItem': ('product', 'sale')},
+    # Admin screens label rows with their shop and business (the mixin defaults)
+    'admin': {'*': ('shop', 'business')},
+}
+
+
+def loading_profile(name: str, *entities) -> List[Load]:
+    """
+    Loader options trimming the eager relationships of `entities` to profile
+    `name`. Profiles only remove eager loads; a query that reads a relationship
+    still asks for it explicitly (joinedload, contains_eager, ...).
+
+        db.session.query(Product).options(*loading_profile('pos', Product))
+    """
+    keep = PROFILES[name]
+    options = []
+    for entity in entities:
+        options.extend(_trim(Load(entity), inspect(entity), keep, 1, {inspect(entity)}))
+    return options
+
+
+def _trim(path: Load, mapper, keep, depth: int, seen: set) -> List[Load]:
+    kept = set(keep.get(mapper.class_.__name__, ())) | set(keep.get('*', ()))
+    options = []
+    for rel in mapper.relationships:
+        attr = rel.class_attribute
+        if rel.key in kept:
+            if depth < MAX_DEPTH and rel.mapper not in seen:
+                options.extend(_trim(path.defaultload(attr), rel.mapper, keep, depth + 1, seen | {rel.mapper}))
+        elif rel.lazy in EAGER:
+            options.append(path.lazyload(attr))
+    return options
@@ -0,0 +1,311 @@
+import glob
+import hmac
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+from flask import Response, abort, current_app, g, request
+from flask_caching import Cache
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+HELP = {
+    'http_request_duration_seconds': 'Request latency per endpoint, method and status',
+    'db_request_duration_seconds': 'Database time per request',
+    'db_queries_per_request': 'SQL statements per request',
+    'cache_requests_total': 'Cache reads per key family and result',
+    'post_checkout_queue_depth': 'Post-checkout tasks waiting, per live worker',
+    'post_checkout_tasks': 'Post-checkout task outcomes since each live worker started',
+    'response_compression_bytes': 'Response bytes before and after compression since each live worker started',
+}
+
+_FAMILY_SEGMENT = re.compile(r'[a-z_]+')
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def cache_family(key: str) -> str:
+    """'shop:4:pos_data:17:rows:gzip' -> 'shop:pos_data', so IDs never become label values"""
+    segments = [segment for segment in str(key).split(':') if _FAMILY_SEGMENT.fullmatch(segment)]
+    return ':'.join(segments[:2]) or 'other'
+
+
+class Metrics:
+    """
+    In-process counters and histograms, shared across server workers through
+    METRICS_DIR: each worker writes its figures to <pid>.json every
+    METRICS_FLUSH_INTERVAL seconds, and /metrics sums the files of live
+    workers in Prometheus text format. Files of exited workers are deleted
+    when /metrics is read, so their counts drop out of the totals (Prometheus
+    takes the drop as a counter reset).
+
+    Nothing is recorded, and no flush thread is started, unless init_app ran
+    with METRICS_ENABLED.
+
+    Recorded per request (endpoint, method, status): latency, database time
+    and statement count (from QueryProfiler). Also cache hits and misses per
+    key family (see InstrumentedCache) and post-checkout queue figures.
+    """
+
+    _lock = threading.Lock()
+    _enabled = False
+    _pid = None
+    _counters: Dict[Tuple[str, Labels], float] = {}
+    _histograms: Dict[Tuple[str, Labels], Dict] = {}
+    _buckets: Dict[str, Tuple] = {}
+
+    @classmethod
+    def init_app(cls, app) -> None:
+        cls._enabled = app.config.get('METRICS_ENABLED', True)
+        if not cls._enabled:
+            return
+        app.before_request(cls._start)
+        app.after_request(cls._finish)
+        app.add_url_rule('/metrics', 'metrics', cls._view)
+
+    @classmethod
+    def inc(cls, name: str, labels: Dict[str, object], value: float = 1) -> None:
+        if not cls._enabled:
+            return
+        cls._ensure_started()
+        key = (name, _labels(labels))
+        with cls._lock:
+            cls._counters[key] = cls._counters.get(key, 0) + value
+
+    @classmethod
+    def observe(cls, name: str, labels: Dict[str, object], value: float, buckets: Tuple = LATENCY_BUCKETS) -> None:
+        if not cls._enabled:
+            return
+        cls._ensure_started()
+        key = (name, _labels(labels))
+        with cls._lock:
+            cls._buckets[name] = buckets
+            histogram = cls._histograms.get(key)
+            if histogram is None:
+                histogram = cls._histograms[key] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+            histogram['buckets'][bisect_left(buckets, value)] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    # ---------------
+    # Requests
+    # ---------------
+    @classmethod
+    def _start(cls) -> None:
+        g.metrics_started = time.perf_counter()
+
+    @classmethod
+    def _finish(cls, response):
+        started = g.get('metrics_started')
+        if started is None or request.endpoint in ('metrics', 'static'):
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        cls.observe('http_request_duration_seconds', {
+            'endpoint': endpoint, 'method': request.method, 'status': response.status_code
+        }, time.perf_counter() - started)
+
+        stats = g.get('query_stats')
+        if stats is not None:
+            cls.observe('db_request_duration_seconds', {'endpoint': endpoint}, stats.duration)
+            cls.observe('db_queries_per_request', {'endpoint': endpoint}, stats.count, QUERY_BUCKETS)
+        return response
+
+    # ---------------
+    # Shared store
+    # ---------------
+    @classmethod
+    def _ensure_started(cls) -> None:
+        # Started lazily, and again in each forked server worker
+        if cls._pid == os.getpid():
+            return
+        with cls._lock:
+            if cls._pid == os.getpid():
+                return
+            app = current_app._get_current_object()
+            cls._counters, cls._histograms = {}, {}
+            threading.Thread(target=cls._flush_loop, args=(app,), name='metrics-flush', daemon=True).start()
+            cls._pid = os.getpid()
+
+    @classmethod
+    def _flush_loop(cls, app) -> None:
+        interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                cls.flush()
+
+    @classmethod
+    def flush(cls) -> None:
+        """Write this worker's figures to METRICS_DIR"""
+        directory = cls._directory()
+        with cls._lock:
+            snapshot = {
+                'counters': [[name, labels, value] for (name, labels), value in cls._counters.items()],
+                'histograms': [
+                    [name, labels, cls._buckets[name], histogram]
+                    for (name, labels), histogram in cls._histograms.items()
+                ],
+            }
+        snapshot['gauges'] = [[name, labels, value] for name, labels, value in cls._gauges()]
+
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            logger.warning(f"Metrics flush to {path} failed: {str(e)}")
+
+    @staticmethod
+    def _gauges() -> List[Tuple[str, Labels, float]]:
+        """Point-in-time figures of this worker, read when it flushes"""
+        from app.sale.tasks import PostCheckoutDispatcher
+        from app.utils.compression import ResponseCompression
+
+        gauges = []
+        tasks = PostCheckoutDispatcher.stats()
+        gauges.append(('post_checkout_queue_depth', (), tasks['queue_depth']))
+        for state in ('submitted', 'completed', 'retried', 'failed', 'dropped'):
+            gauges.append(('post_checkout_tasks', _labels({'state': state}), tasks[state]))
+        for endpoint, figures in ResponseCompression.stats().items():
+            for stage in ('bytes_in', 'bytes_out'):
+                gauges.append(('response_compression_bytes', _labels({'endpoint': endpoint, 'stage': stage[6:]}), figures[stage]))
+        return gauges
+
+    @staticmethod
+    def _directory() -> str:
+        return current_app.config.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'nawiri-metrics')
+
+    @classmethod
+    def reset(cls) -> int:
+        """Delete every worker file; returns how many were removed"""
+        paths = glob.glob(os.path.join(cls._directory(), '*.json'))
+        for path in paths:
+            os.remove(path)
+        return len(paths)
+
+    @classmethod
+    def collect(cls) -> Tuple[Dict, Dict, Dict]:
+        """(counters, histograms, gauges) summed over the files of live workers; dead workers' files are deleted"""
+        cls.flush()
+        counters, histograms, gauges = {}, {}, {}
+        for path in glob.glob(os.path.join(cls._directory(), '*.json')):
+            if not _is_alive(int(os.path.basename(path).split('.')[0])):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            for name, labels, value in snapshot['counters']:
+                key = (name, _labels(dict(labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, buckets, histogram in snapshot['histograms']:
+                key = (name, _labels(dict(labels)))
+                merged = histograms.setdefault(key, {
+                    'le': buckets, 'buckets': [0] * len(histogram['buckets']), 'sum': 0.0, 'count': 0
+                })
+                merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+                merged['sum'] += histogram['sum']
+                merged['count'] += histogram['count']
+            for name, labels, value in snapshot['gauges']:
+                key = (name, _labels(dict(labels)))
+                gauges[key] = gauges.get(key, 0) + value
+        return counters, histograms, gauges
+
+    @classmethod
+    def render(cls) -> str:
+        """Prometheus text exposition format"""
+        counters, histograms, gauges = cls.collect()
+        lines, typed = [], set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# HELP {name} {HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f'{name}{_format(labels)} {value:g}')
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, 'gauge')
+            lines.append(f'{name}{_format(labels)} {value:g}')
+        for (name, labels), histogram in sorted(histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for le, count in zip(list(histogram['le']) + ['+Inf'], histogram['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format(labels + (("le", str(le)),))} {cumulative}')
+            lines.append(f'{name}_sum{_format(labels)} {histogram["sum"]:g}')
+            lines.append(f'{name}_count{_format(labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def _view(cls):
+        token = current_app.config.get('METRICS_TOKEN')
+        authorization = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(authorization, f'Bearer {token}'):
+            pass
+        elif not current_user.is_authenticated:
+            abort(401)
+        elif not current_user.is_superadmin():
+            abort(403)
+        return Response(cls.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _format(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _is_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class InstrumentedCache(Cache):
+    """Flask-Caching Cache that counts hits and misses per key family"""
+
+    def get(self, key, *args, **kwargs):
+        value = super().get(key, *args, **kwargs)
+        Metrics.inc('cache_requests_total', {'family': cache_family(key), 'result': 'miss' if value is None else 'hit'})
+        return value
+
+    def get_many(self, *keys):
+        values = super().get_many(*keys)
+        for key, value in zip(keys, values):
+            Metrics.inc('cache_requests_total', {'family': cache_family(key), 'result': 'miss' if value is None else 'hit'})
+        return values
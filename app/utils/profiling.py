@@ -0,0 +1,182 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from typing import List, Optional, Tuple
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement: str) -> str:
+    """The statement with literals and IN lists collapsed, so repeats of one query compare equal"""
+    statement = _LITERAL.sub('?', statement)
+    statement = _IN_LIST.sub('(?)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block or view runs more SQL statements than it declared"""
+
+
+class QueryStats:
+    """SQL statements and database time recorded while it is active on this thread"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.duration += elapsed
+        self.statements[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Fingerprints run at least `threshold` times: the usual shape of an N+1 lazy load"""
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+    def __enter__(self) -> 'QueryStats':
+        _active().append(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _active().remove(self)
+
+
+class QueryBudget(QueryStats):
+    """
+    Fails when the block runs more than `limit` statements; for tests:
+
+        with QueryBudget(6):
+            client.get('/api/shops/1/pos-data')
+    """
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+
+    def __exit__(self, exc_type, *exc) -> None:
+        super().__exit__(exc_type, *exc)
+        if exc_type is None and self.count > self.limit:
+            raise QueryBudgetExceeded(_describe(self, self.limit))
+
+
+def query_budget(limit: int):
+    """
+    Declare the most statements a view may run. Over budget, the request logs a
+    warning; with QUERY_BUDGET_STRICT (set it in test configs) the view raises
+    QueryBudgetExceeded, so the test that made the request fails.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            with QueryStats() as stats:
+                response = view(*args, **kwargs)
+            if stats.count > limit:
+                if current_app.config.get('QUERY_BUDGET_STRICT'):
+                    raise QueryBudgetExceeded(_describe(stats, limit))
+                logger.warning(f"[{request.endpoint}] Query budget exceeded: {_describe(stats, limit)}")
+            return response
+        return wrapped
+    return decorator
+
+
+def _describe(stats: QueryStats, limit: int) -> str:
+    top = stats.statements.most_common(3)
+    detail = '; '.join(f'{n}x {statement[:120]}' for statement, n in top)
+    return f"{stats.count} statements, budget {limit} (most run: {detail})"
+
+
+def _active() -> List[QueryStats]:
+    if not hasattr(_local, 'active'):
+        _local.active = []
+    return _local.active
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, 'active', None):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    _stop_timer(conn, statement)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _record_failed_statement(context):
+    # A statement that raises (an IntegrityError the caller expects, say) never
+    # reaches after_cursor_execute; its start time is popped here instead
+    if context.connection is not None and context.statement is not None:
+        _stop_timer(context.connection, context.statement)
+
+
+def _stop_timer(conn, statement: str) -> None:
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    for stats in getattr(_local, 'active', ()):
+        stats.record(statement, elapsed)
+
+
+class QueryProfiler:
+    """
+    Counts SQL statements and database time per request, on SQLAlchemy engine
+    events. Each request gets a Server-Timing entry (db;dur=...;desc="N queries")
+    and a debug log line; statements repeated QUERY_REPEAT_THRESHOLD times or
+    more (the same query per row: a lazy load in a loop) are logged as a
+    warning with their fingerprint.
+    """
+
+    @staticmethod
+    def init_app(app) -> None:
+        if not app.config.get('SQL_PROFILING', True):
+            return
+        app.before_request(QueryProfiler._start)
+        app.after_request(QueryProfiler._finish)
+        app.teardown_request(QueryProfiler._discard)
+
+    @staticmethod
+    def current() -> Optional[QueryStats]:
+        """This request's figures so far, or None outside a profiled request"""
+        return g.get('query_stats')
+
+    @staticmethod
+    def _start() -> None:
+        g.query_stats = QueryStats().__enter__()
+        g.request_started = time.perf_counter()
+
+    @staticmethod
+    def _finish(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+        QueryProfiler._discard()
+
+        total = (time.perf_counter() - g.request_started) * 1000
+        db_ms = stats.duration * 1000
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{stats.count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={total:.1f}')
+        logger.debug(f"{request.method} {request.path} [{request.endpoint}]: {stats.count} queries, {db_ms:.1f}ms db, {total:.1f}ms total")
+
+        for statement, n in stats.repeated(current_app.config.get('QUERY_REPEAT_THRESHOLD', 5)):
+            logger.warning(f"[{request.endpoint}] Possible N+1: {n}x {statement[:200]}")
+        return response
+
+    @staticmethod
+    def _discard(exc=None) -> None:
+        stats = g.get('query_stats')
+        if stats is not None and stats in _active():
+            stats.__exit__(None, None, None)
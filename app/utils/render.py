@@ -1,5 +1,6 @@
 
 from flask import render_template, request
+from markupsafe import Markup
 
 def render_htmx(template_fragment, **context):
     if request.headers.get("HX-Request") == "true":
@@ -13,4 +14,13 @@ def render_htmx(template_fragment, **context):
             **context
         )
 
-        
+
+def render_htmx_fragment(fragment_html, **context):
+    """render_htmx for a fragment that was already rendered (e.g. a stored report)"""
+    if request.headers.get("HX-Request") == "true":
+        return fragment_html
+    return render_template(
+        "auth/admin_dashboard.html",
+        fragment_html=Markup(fragment_html),
+        **context
+    )
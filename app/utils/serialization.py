@@ -0,0 +1,55 @@
+import dataclasses
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from flask.json import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Optional; the stdlib C encoder is used without it
+    orjson = None
+
+
+def _default(o):
+    """Types neither encoder handles itself"""
+    if isinstance(o, Decimal):
+        # Numbers on the wire, not the strings Flask's default encoder sends
+        return float(o)
+    if isinstance(o, Enum):
+        return o.value
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class FastJSONEncoder(JSONEncoder):
+    """
+    App JSON encoder (jsonify, flask.json.dumps, |tojson). Decimal, Enum and
+    date/datetime values are encoded directly, so serializers can hand over
+    column values without converting them first.
+
+    With orjson installed, compact output (no indent) is encoded by orjson;
+    anything orjson refuses (e.g. integers beyond 64 bits) falls back to the
+    stdlib encoder.
+    """
+
+    def default(self, o):
+        return _default(o)
+
+    def encode(self, o):
+        if orjson is not None and self.indent is None:
+            option = orjson.OPT_NON_STR_KEYS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            try:
+                return orjson.dumps(o, default=_default, option=option).decode('utf-8')
+            except TypeError:
+                pass
+        return super().encode(o)
@@ -0,0 +1,176 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+from flask import current_app, g
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db, cache
+from app.models import Role, User, Shop, Business
+
+logger = logging.getLogger(__name__)
+
+USER_KEY = 'user:{user_id}:identity'
+SHOP_KEY = 'shop:{shop_id}:identity'
+BUSINESS_SHOPS_KEY = 'business:{business_id}:shops'
+_PENDING = 'tenant_keys_pending'
+
+# The User columns kept in the cache: who the user is and whether they may sign in, never credentials
+IDENTITY_FIELDS = ('id', 'username', 'role', 'shop_id', 'business_id', 'permissions', 'is_deleted', 'locked_until')
+
+
+def _cached(key: str):
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.warning(f"Tenant cache read failed for {key}: {str(e)}")
+        return None
+
+
+def _store(key: str, value) -> None:
+    try:
+        cache.set(key, value, timeout=current_app.config.get('TENANT_CONTEXT_CACHE_TIMEOUT', 300))
+    except Exception as e:
+        logger.warning(f"Tenant cache write failed for {key}: {str(e)}")
+
+
+def _attach(instance):
+    """Put a cached (detached) instance back in the session without querying"""
+    return db.session.merge(instance, load=False)
+
+
+def _identity(user: User) -> Dict:
+    return {name: user.role.value if name == 'role' else getattr(user, name) for name in IDENTITY_FIELDS}
+
+
+def _user_from_identity(identity: Dict) -> User:
+    """A session User holding only the identity columns; the rest load from the database on first access"""
+    user = User.__mapper__.class_manager.new_instance()
+    for name, value in identity.items():
+        set_committed_value(user, name, Role(value) if name == 'role' else value)
+    make_transient_to_detached(user)
+    return _attach(user)
+
+
+def _may_sign_in(identity: Dict) -> bool:
+    locked_until = identity['locked_until']
+    return not identity['is_deleted'] and not (locked_until and locked_until > datetime.utcnow())
+
+
+class TenantContext:
+    """
+    Who the request is for (user, role, business, shops), resolved once per
+    request and otherwise read from a short-TTL cache.
+
+    Users are cached as a narrow identity record (IDENTITY_FIELDS), never
+    with credentials or tokens, and deleted or locked users are refused from
+    it. Shops are cached as loaded instances with their joined business, which
+    is where a user's shop and business resolve from. Both are merged back
+    into the session with load=False, so a warm request for a shop's user runs
+    no identity queries. Entries are dropped when a user, shop or business
+    commits a change through the session (see the listeners below); other
+    writes show once TENANT_CONTEXT_CACHE_TIMEOUT passes.
+    """
+
+    def __init__(self):
+        self.shops: Dict[int, Optional[Shop]] = {}
+        self._business_shops: Optional[List[Shop]] = None
+
+    @staticmethod
+    def current() -> 'TenantContext':
+        if 'tenant' not in g:
+            g.tenant = TenantContext()
+        return g.tenant
+
+    @staticmethod
+    def load_user(user_id: int) -> Optional[User]:
+        """Flask-Login user loader; None for deleted or locked users"""
+        key = USER_KEY.format(user_id=user_id)
+        identity = _cached(key)
+        if identity is None:
+            user = db.session.get(User, user_id)
+            if user is None:
+                return None
+            identity = _identity(user)
+            _store(key, identity)
+        else:
+            user = None
+
+        if not _may_sign_in(identity):
+            return None
+        if user is None:
+            user = _user_from_identity(identity)
+        if user.shop_id:
+            # From the shop cache, so user.shop and user.business need no query
+            TenantContext.current().shop(user.shop_id)
+        return user
+
+    def shop(self, shop_id: int) -> Optional[Shop]:
+        """The shop, or None if it does not exist"""
+        if shop_id not in self.shops:
+            key = SHOP_KEY.format(shop_id=shop_id)
+            cached = _cached(key)
+            if cached is not None:
+                shop = _attach(cached)
+            else:
+                shop = db.session.get(Shop, shop_id)
+                if shop is not None:
+                    _store(key, shop)
+            self.shops[shop_id] = shop
+        return self.shops[shop_id]
+
+    def business_shops(self, business_id: int) -> List[Shop]:
+        """The business's shops that are not deleted"""
+        if self._business_shops is None:
+            key = BUSINESS_SHOPS_KEY.format(business_id=business_id)
+            cached = _cached(key)
+            if cached is not None:
+                shops = [_attach(shop) for shop in cached]
+            else:
+                shops = Shop.query.filter_by(business_id=business_id, is_deleted=False).all()
+                _store(key, shops)
+            self.shops.update((shop.id, shop) for shop in shops)
+            self._business_shops = shops
+        return self._business_shops
+
+
+@event.listens_for(db.session, 'before_flush')
+def _track_tenant_writes(session, flush_context, instances):
+    keys = session.info.setdefault(_PENDING, set())
+    business_ids = set()
+
+    with session.no_autoflush:
+        # Collection-only changes (a sale appended to shop.sales) do not count
+        changed = list(session.new) + list(session.deleted) + [
+            obj for obj in session.dirty if session.is_modified(obj, include_collections=False)
+        ]
+        for obj in changed:
+            if isinstance(obj, User) and obj.id is not None:
+                keys.add(USER_KEY.format(user_id=obj.id))
+            elif isinstance(obj, Shop):
+                keys.add(BUSINESS_SHOPS_KEY.format(business_id=obj.business_id))
+                if obj.id is not None:
+                    keys.add(SHOP_KEY.format(shop_id=obj.id))
+            elif isinstance(obj, Business) and obj.id is not None:
+                business_ids.add(obj.id)
+
+        # Cached shops carry their business
+        if business_ids:
+            shops = session.query(Shop.id).filter(Shop.business_id.in_(business_ids))
+            keys.update(SHOP_KEY.format(shop_id=shop_id) for shop_id, in shops)
+            keys.update(BUSINESS_SHOPS_KEY.format(business_id=business_id) for business_id in business_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _drop_committed_tenants(session):
+    keys = session.info.pop(_PENDING, None)
+    if keys:
+        try:
+            cache.delete_many(*keys)
+        except Exception as e:
+            logger.warning(f"Tenant cache invalidation failed: {str(e)}")
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_pending_tenants(session, previous_transaction):
+    session.info.pop(_PENDING, None)
@@ -1,9 +1,43 @@
-from datetime import datetime, timedelta, time
+from datetime import date, datetime, timedelta, time
+from typing import Tuple
 import pytz
 
+KENYA_TZ = pytz.timezone("Africa/Nairobi")
+
+
 def get_kenya_today_range():
     tz = pytz.timezone("Africa/Nairobi")
     now = datetime.now(tz)
     start = tz.localize(datetime.combine(now.date(), time.min))
     end = tz.localize(datetime.combine(now.date(), time.max))
     return start, end
+
+
+def kenya_today() -> date:
+    return datetime.now(KENYA_TZ).date()
+
+
+def to_kenya_time(value: datetime) -> datetime:
+    """Convert a naive UTC timestamp (as stored on Sale.date) to Nairobi local time"""
+    return pytz.utc.localize(value).astimezone(KENYA_TZ)
+
+
+def kenya_day_bounds(start: date, end: date = None) -> Tuple[datetime, datetime]:
+    """
+    Naive UTC [start, end) bounds covering the Nairobi local days start..end
+    inclusive, for filtering timestamp columns stored in UTC.
+    """
+    end = end or start
+    lower = KENYA_TZ.localize(datetime.combine(start, time.min))
+    upper = KENYA_TZ.localize(datetime.combine(end + timedelta(days=1), time.min))
+    return (
+        lower.astimezone(pytz.utc).replace(tzinfo=None),
+        upper.astimezone(pytz.utc).replace(tzinfo=None)
+    )
+
+
+def as_kenya_date(value) -> date:
+    """Nairobi local date of a naive UTC datetime; plain dates pass through"""
+    if isinstance(value, datetime):
+        return to_kenya_time(value).date()
+    return value
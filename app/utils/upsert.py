@@ -0,0 +1,52 @@
+# utils/upsert.py
+from typing import Dict, Iterable, List
+from sqlalchemy import func
+from app import db
+
+
+def _dialect_insert(table):
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+    return insert(table)
+
+
+def _pairwise(name: str):
+    # SQLite spells GREATEST/LEAST as the multi-argument MAX/MIN
+    if db.engine.dialect.name == 'sqlite':
+        return getattr(func, {'greatest': 'max', 'least': 'min'}[name])
+    return getattr(func, name)
+
+
+def upsert(table, rows: List[Dict], keys: Iterable[str], increment: Iterable[str] = (), replace: Iterable[str] = (),
+           greatest: Iterable[str] = (), least: Iterable[str] = ()):
+    """
+    INSERT rows, resolving key conflicts in the database instead of reading first.
+    Args:
+        table: Target Table (e.g. Model.__table__)
+        rows: Row dicts; all must share the same columns
+        keys: Columns of the unique constraint / primary key to conflict on
+        increment: Columns added to the stored value on conflict (col = col + new)
+        replace: Columns overwritten with the new value on conflict
+        greatest: Columns keeping the larger of the stored and new value
+        least: Columns keeping the smaller of the stored and new value
+    """
+    if not rows:
+        return
+
+    stmt = _dialect_insert(table)
+    changes = {col: table.c[col] + stmt.excluded[col] for col in increment}
+    changes.update({col: stmt.excluded[col] for col in replace})
+    changes.update({col: _pairwise('greatest')(table.c[col], stmt.excluded[col]) for col in greatest})
+    changes.update({col: _pairwise('least')(table.c[col], stmt.excluded[col]) for col in least})
+
+    if changes:
+        stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=changes)
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(keys))
+
+    db.session.execute(stmt, rows)
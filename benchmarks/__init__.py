@@ -0,0 +1,49 @@
+"""
+Synthetic tenant data and the benchmark harness.
+
+    python -m benchmarks.generate --scale medium
+    python -m benchmarks.run
+    python -m benchmarks.compare results/base.json results/head.json
+
+Every command takes --database-url (or BENCH_DATABASE_URL); the default is a
+SQLite file under benchmarks/data/. For Postgres, create an empty database
+first, e.g. postgresql://localhost/nawiri_bench.
+"""
+import os
+import sys
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, 'benchmarks', 'data')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(DATA_DIR, 'bench.db')}"
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# SQLite stores Numeric columns as floats and SQLAlchemy says so on every read
+warnings.filterwarnings('ignore', message='Dialect sqlite\\+pysqlite does \\*not\\* support Decimal')
+
+
+def database_url(url=None) -> str:
+    return url or os.getenv('BENCH_DATABASE_URL') or DEFAULT_DATABASE_URL
+
+
+def create_benchmark_app(url=None):
+    """The app against the benchmark database, with an in-process cache and socket emits so runs do not share Redis state"""
+    from config import Config
+    from app import create_app
+
+    url = database_url(url)
+    if url.startswith('sqlite:///'):
+        os.makedirs(os.path.dirname(url[len('sqlite:///'):]) or '.', exist_ok=True)
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = url
+        CACHE_TYPE = 'SimpleCache'
+        SOCKETIO_MESSAGE_QUEUE = None
+        WTF_CSRF_ENABLED = False
+        SESSION_COOKIE_SECURE = False
+        METRICS_ENABLED = False
+
+    return create_app(BenchmarkConfig)
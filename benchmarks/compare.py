@@ -0,0 +1,70 @@
+"""
+Compares two benchmark result files case by case:
+
+    python -m benchmarks.compare benchmarks/results/<base>.json benchmarks/results/<head>.json
+
+A case is reported slower or faster when its median moved by more than
+--threshold percent and by more than --noise-ms; with --fail-on-regression the
+exit status is 1 when any case got slower or started making more queries.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Optional
+
+
+def load(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def verdict(base: Dict, head: Dict, threshold: float, noise_ms: float) -> Optional[str]:
+    if 'error' in base or 'error' in head:
+        return 'error'
+    change = head['median_ms'] - base['median_ms']
+    if abs(change) <= noise_ms or not base['median_ms'] or abs(change) / base['median_ms'] * 100 <= threshold:
+        return 'more queries' if head['queries'] > base['queries'] else None
+    return 'slower' if change > 0 else 'faster'
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.compare', description=__doc__.split('\n\n')[0])
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Percent change in median to report (default 10)')
+    parser.add_argument('--noise-ms', type=float, default=0.5, help='Ignore changes smaller than this (default 0.5ms)')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    base, head = load(args.base), load(args.head)
+    for key in ('database', 'dataset', 'shop_id'):
+        if base['meta'].get(key) != head['meta'].get(key):
+            print(f"Warning: {key} differs ({base['meta'].get(key)} vs {head['meta'].get(key)})", file=sys.stderr)
+
+    print(f"base  {(base['meta']['commit'] or '?')[:12]}  {base['meta'].get('subject') or ''}")
+    print(f"head  {(head['meta']['commit'] or '?')[:12]}  {head['meta'].get('subject') or ''}")
+    print()
+    print(f"{'case':<40} {'base ms':>10} {'head ms':>10} {'change':>8} {'queries':>10}")
+
+    regressions = 0
+    for name in sorted(set(base['results']) | set(head['results'])):
+        before, after = base['results'].get(name), head['results'].get(name)
+        if before is None or after is None:
+            print(f"{name:<40} {'only in ' + ('head' if before is None else 'base'):>41}")
+            continue
+        note = verdict(before, after, args.threshold, args.noise_ms)
+        if note in ('slower', 'more queries', 'error'):
+            regressions += 1
+        if note == 'error':
+            print(f"{name:<40} {'error':>41}")
+            continue
+        change = (after['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0.0
+        queries = f"{before['queries']:g}->{after['queries']:g}"
+        print(f"{name:<40} {before['median_ms']:>10.2f} {after['median_ms']:>10.2f} {change:>+7.1f}% {queries:>10}"
+              f"{'  ' + note if note else ''}")
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
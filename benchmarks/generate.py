@@ -0,0 +1,521 @@
+"""
+Deterministic synthetic tenants: businesses, shops, users, categories,
+suppliers, products with price history, and sales, cart items and stock logs
+spread over Africa/Nairobi trading hours. The same --seed, --scale and
+--end-date always give the same rows.
+
+    python -m benchmarks.generate --scale large --database-url postgresql://localhost/nawiri_bench
+
+Rows are written with COPY on Postgres and executemany elsewhere, then the
+report rollups and the sales rank are rebuilt from them. The target database
+must be empty; --drop clears it first.
+"""
+import argparse
+import csv
+import io
+import logging
+import math
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP, ROUND_UP
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, func, text
+from werkzeug.security import generate_password_hash
+
+from . import create_benchmark_app, database_url
+from app.models import (
+    AdjustmentType, Business, BusinessStatus, CartItem, Category, PriceChange, Product, Role, Sale,
+    SaleStatus, Shop, StockLog, Supplier, UnitType, User
+)
+
+logger = logging.getLogger('benchmarks.generate')
+
+SCALES = {
+    # businesses, shops per business, products and suppliers per shop, days of history, sales per shop-day
+    'small': dict(businesses=1, shops_per_business=1, products_per_shop=2000, suppliers_per_shop=20, days=30, sales_per_day=150),
+    'medium': dict(businesses=2, shops_per_business=2, products_per_shop=5000, suppliers_per_shop=30, days=90, sales_per_day=400),
+    'large': dict(businesses=4, shops_per_business=3, products_per_shop=5000, suppliers_per_shop=40, days=365, sales_per_day=500),
+}
+
+# Relative sales per local hour: the morning rush before work, lunch, and the
+# evening peak as people head home; shutters are down from 23:00 to 06:00
+HOUR_WEIGHTS = {
+    6: 2, 7: 5, 8: 7, 9: 6, 10: 5, 11: 5, 12: 7, 13: 7, 14: 5,
+    15: 5, 16: 6, 17: 9, 18: 11, 19: 10, 20: 7, 21: 4, 22: 2,
+}
+WEEKDAY_WEIGHTS = (0.9, 0.9, 0.95, 1.0, 1.15, 1.3, 1.0)  # Monday first; Saturday is market day
+PAYDAY_BOOST = 1.3  # Month end and the first days of the next month
+NAIROBI_OFFSET = timedelta(hours=3)  # UTC+3 all year, no DST
+
+CATEGORIES = (
+    'Flour & Unga', 'Sugar', 'Cooking Oil & Fats', 'Rice & Cereals', 'Milk & Dairy', 'Bread & Bakery',
+    'Tea & Coffee', 'Soda & Soft Drinks', 'Juice', 'Water', 'Snacks', 'Sweets & Biscuits',
+    'Spices & Sauces', 'Canned Foods', 'Fruits', 'Vegetables', 'Eggs', 'Meat & Poultry',
+    'Detergents', 'Bar Soap', 'Toiletries', 'Baby Care', 'Household', 'Stationery',
+    'Gas & Charcoal', 'Frozen Foods', 'Pasta & Noodles', 'Pulses & Beans', 'Pet Food', 'Health',
+)
+BRANDS = (
+    'Jogoo', 'Pembe', 'Soko', 'Exe', 'Kabras', 'Mumias', 'Elianto', 'Fresh Fri', 'Brookside', 'KCC',
+    'Daima', 'Ketepa', 'Kericho Gold', 'Delmonte', 'Pishori', 'Royco', 'Tropical Heat', 'Menengai',
+    'Geisha', 'Kimbo', 'Golden Fry', 'Dola', 'Ajab', 'Highlands', 'Afia', 'Tuzo', 'Festive', 'Kenylon',
+)
+ITEMS = (
+    'Maize Flour', 'Wheat Flour', 'White Sugar', 'Brown Sugar', 'Vegetable Oil', 'Cooking Fat', 'Rice',
+    'Fresh Milk', 'Yoghurt', 'White Bread', 'Tea Leaves', 'Instant Coffee', 'Crisps', 'Biscuits',
+    'Cornflakes', 'Tomato Paste', 'Beans', 'Table Salt', 'Washing Powder', 'Bar Soap', 'Toothpaste',
+    'Tissue', 'Diapers', 'Mango Juice', 'Drinking Water', 'Cola', 'Matches', 'Candles', 'Margarine',
+    'Spaghetti', 'Noodles', 'Green Grams', 'Porridge Flour', 'Chicken Sausages', 'Peanut Butter',
+)
+SIZES = ('90g', '200g', '250g', '400g', '500g', '1kg', '2kg', '5kg', '300ml', '500ml', '1l', '2l', 'x6', 'x12')
+UNITS = ((UnitType.PIECE, 70), (UnitType.KILOGRAM, 8), (UnitType.PACKET, 10), (UnitType.BOTTLE, 8), (UnitType.LITER, 4))
+
+ROUNDING = Decimal('5')
+
+
+def ceil_to_five(amount: Decimal) -> Decimal:
+    return (amount / ROUNDING).to_integral_value(rounding=ROUND_UP) * ROUNDING
+
+
+class BulkWriter:
+    """Buffered inserts into one table: COPY on Postgres, executemany elsewhere"""
+
+    def __init__(self, session, table, chunk_size: int = 20000):
+        self.session = session
+        self.table = table
+        self.chunk_size = chunk_size
+        self.rows: List[Dict] = []
+        self.written = 0
+        self.dialect = session.connection().dialect
+
+    def add(self, row: Dict) -> None:
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        if self.dialect.name == 'postgresql':
+            self._copy(self.rows)
+        else:
+            self.session.execute(self.table.insert(), self.rows)
+        self.written += len(self.rows)
+        self.rows = []
+
+    def _copy(self, rows: List[Dict]) -> None:
+        # Column types still convert values (enum members to names, JSON to text), as they would for an INSERT
+        names = list(rows[0])
+        processors = [self.table.c[name].type._cached_bind_processor(self.dialect) for name in names]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([
+                process(row[name]) if process and row[name] is not None else row[name]
+                for name, process in zip(names, processors)
+            ])
+        buffer.seek(0)
+
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {self.table.name} ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        finally:
+            cursor.close()
+
+
+class TenantGenerator:
+    """Builds one dataset; run() writes it and returns row counts per table"""
+
+    def __init__(self, session, scale: Dict, seed: int, end_date: date):
+        self.session = session
+        self.scale = scale
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.end_date = end_date
+        self.start_date = end_date - timedelta(days=scale['days'] - 1)
+        self.counts: Dict[str, int] = {}
+        self._ids: Dict[str, int] = {}
+        self._admins: Dict[int, int] = {}
+
+    def run(self) -> Dict[str, int]:
+        # One hash for every user (password: bench); hashing per user would dominate small runs
+        self.password_hash = generate_password_hash('bench')
+        businesses = self._writer(Business)
+        shops = self._writer(Shop)
+        users = self._writer(User)
+
+        shop_specs = []
+        for b in range(1, self.scale['businesses'] + 1):
+            business_id = self._next_id(Business)
+            businesses.add(self._stamp({
+                'id': business_id,
+                'name': f'Bench Business {b}',
+                'email': f'owner{b}@bench.example',
+                'phone': f'+2547{b:08d}',
+                'city': 'Nairobi',
+                'country': 'Kenya',
+                'status': BusinessStatus.ACTIVE,
+                'is_approved': True,
+                'currency': 'KES',
+            }))
+            for s in range(1, self.scale['shops_per_business'] + 1):
+                shop_id = self._next_id(Shop)
+                shops.add(self._stamp({
+                    'id': shop_id,
+                    'name': f'Bench Shop {b}-{s}',
+                    'business_id': business_id,
+                    'location': 'Nairobi',
+                    'phone': f'+2541{shop_id:08d}',
+                    'slug': f'bench-shop-{b}-{s}',
+                    'currency': 'KES',
+                    'is_active': True,
+                }))
+                shop_specs.append((business_id, shop_id))
+
+            users.add(self._user(f'bench-owner-{b}', Role.TENANT, business_id, None))
+
+        cashiers = {}
+        for business_id, shop_id in shop_specs:
+            users.add(self._user(f'bench-admin-{shop_id}', Role.ADMIN, business_id, shop_id))
+            cashiers[shop_id] = []
+            for k in range(1, 4):
+                user = self._user(f'bench-cashier-{shop_id}-{k}', Role.CASHIER, business_id, shop_id)
+                cashiers[shop_id].append(user['id'])
+                users.add(user)
+
+        for writer in (businesses, shops, users):
+            self._finish(writer)
+        self.session.commit()
+
+        for _, shop_id in shop_specs:
+            started = time.perf_counter()
+            products = self._catalogue(shop_id)
+            self._history(shop_id, products, cashiers[shop_id])
+            self.session.commit()
+            logger.info(f"Shop {shop_id}: written in {time.perf_counter() - started:.1f}s")
+
+        self._rebuild([shop_id for _, shop_id in shop_specs])
+        self._reset_sequences()
+        self.session.commit()
+        return self.counts
+
+    # ---------------
+    # Catalogue
+    # ---------------
+    def _catalogue(self, shop_id: int) -> List[Dict]:
+        rng = self.rng
+        categories = self._writer(Category)
+        category_ids = []
+        for position, name in enumerate(CATEGORIES):
+            category_ids.append(self._next_id(Category))
+            categories.add(self._stamp({
+                'id': category_ids[-1], 'name': name, 'shop_id': shop_id, 'is_active': True, 'position': position,
+            }))
+        self._finish(categories)
+
+        suppliers = self._writer(Supplier)
+        supplier_ids = []
+        for n in range(1, self.scale['suppliers_per_shop'] + 1):
+            supplier_ids.append(self._next_id(Supplier))
+            suppliers.add(self._stamp({
+                'id': supplier_ids[-1], 'name': f'{rng.choice(BRANDS)} Distributors {n}',
+                'phone': f'+2547{shop_id:04d}{n:04d}', 'shop_id': shop_id,
+            }))
+        self._finish(suppliers)
+
+        products = self._writer(Product)
+        price_changes = self._writer(PriceChange)
+        units, unit_weights = zip(*UNITS)
+        specs = []
+        for n in range(1, self.scale['products_per_shop'] + 1):
+            product_id = self._next_id(Product)
+            cost = Decimal(max(10, min(3000, int(math.exp(rng.gauss(4.6, 0.9))))))
+            price = ceil_to_five(cost * Decimal(str(round(rng.uniform(1.08, 1.35), 2))))
+            unit = rng.choices(units, weights=unit_weights)[0]
+            combo_size = rng.choice((3, 4, 6, 12)) if rng.random() < 0.05 else None
+            combo_price = ceil_to_five(price * combo_size * Decimal('0.92')) if combo_size else None
+            stock = rng.randint(40, 400)
+            spec = {
+                'id': product_id,
+                'price': price,
+                'cost': cost,
+                'combo_size': combo_size,
+                'combo_price': combo_price,
+                'fractional': unit is UnitType.KILOGRAM,
+                'stock': stock,
+                'threshold': rng.choice((5, 10, 10, 20)),
+                'change_day': None,
+            }
+
+            # One product in ten changed price during the window; earlier sales use the old figures
+            if rng.random() < 0.1:
+                day = rng.randrange(1, self.scale['days'])
+                changed_at = self._utc(self.start_date + timedelta(days=day), 7, rng.randrange(60))
+                kind = rng.choice(('selling_price_update', 'cost_price_update'))
+                if kind == 'selling_price_update':
+                    spec['old_price'], spec['old_cost'] = ceil_to_five(price * Decimal('0.9')), cost
+                    old, new = spec['old_price'], price
+                else:
+                    spec['old_price'], spec['old_cost'] = price, (cost * Decimal('0.93')).quantize(Decimal('1'))
+                    old, new = spec['old_cost'], cost
+                spec['change_day'] = day
+                price_changes.add(self._stamp({
+                    'id': self._next_id(PriceChange), 'product_id': product_id, 'shop_id': shop_id,
+                    'user_id': self._admins[shop_id], 'change_type': kind,
+                    'old_price': old, 'new_price': new, 'changed_at': changed_at,
+                }, changed_at))
+
+            products.add(self._stamp({
+                'id': product_id,
+                'name': f'{rng.choice(BRANDS)} {rng.choice(ITEMS)} {rng.choice(SIZES)}',
+                'barcode': f'{shop_id:03d}{n:07d}{self.seed % 1000:03d}',
+                'sku': f'BENCH-{shop_id}-{n}',
+                'cost_price': cost,
+                'selling_price': price,
+                'stock': stock,
+                'low_stock_threshold': spec['threshold'],
+                'unit': unit,
+                'minimum_unit': Decimal('0.5') if spec['fractional'] else Decimal('1'),
+                'category_id': rng.choice(category_ids),
+                'supplier_id': rng.choice(supplier_ids),
+                'shop_id': shop_id,
+                'combination_size': combo_size,
+                'combination_price': combo_price,
+                'is_active': True,
+                'is_featured': False,
+                'is_discountable': True,
+                'catalogue_version': 0,
+            }))
+            specs.append(spec)
+
+        self._finish(products)
+        self._finish(price_changes)
+        return specs
+
+    # ---------------
+    # Sales and stock
+    # ---------------
+    def _history(self, shop_id: int, products: List[Dict], cashier_ids: List[int]) -> None:
+        rng = self.rng
+        sales = self._writer(Sale)
+        items = self._writer(CartItem, chunk_size=50000)
+        stock_logs = self._writer(StockLog)
+        admin_id = self._admins[shop_id]
+
+        # Zipf-like popularity over a shuffled catalogue: a few staples carry most sales
+        ranked = list(range(len(products)))
+        rng.shuffle(ranked)
+        weights = [0.0] * len(products)
+        for rank, index in enumerate(ranked):
+            weights[index] = 1 / (rank + 1) ** 1.07
+        cumulative = list(_accumulate(weights))
+        hours, hour_weights = zip(*HOUR_WEIGHTS.items())
+        hour_cumulative = list(_accumulate(hour_weights))
+
+        for offset in range(self.scale['days']):
+            day = self.start_date + timedelta(days=offset)
+            boost = PAYDAY_BOOST if day.day >= 28 or day.day <= 3 else 1.0
+            count = round(self.scale['sales_per_day'] * WEEKDAY_WEIGHTS[day.weekday()] * boost * rng.uniform(0.85, 1.15))
+            times = sorted(
+                self._utc(day, rng.choices(hours, cum_weights=hour_cumulative)[0], rng.randrange(60), rng.randrange(60))
+                for _ in range(count)
+            )
+
+            for sold_at in times:
+                sale_id = self._next_id(Sale)
+                lines = min(1 + int(rng.expovariate(1 / 1.8)), 12)
+                picked: Dict[int, Decimal] = {}
+                for index in rng.choices(range(len(products)), cum_weights=cumulative, k=lines):
+                    spec = products[index]
+                    if spec['fractional']:
+                        quantity = Decimal(rng.choice(('0.5', '1', '1', '1.5', '2')))
+                    else:
+                        quantity = Decimal(1 + (rng.randint(1, 3) if rng.random() < 0.2 else 0))
+                    picked[index] = picked.get(index, Decimal('0')) + quantity
+
+                subtotal = cost = Decimal('0')
+                for index, quantity in picked.items():
+                    spec = products[index]
+                    old = spec['change_day'] is not None and offset < spec['change_day']
+                    price = spec['old_price'] if old else spec['price']
+                    unit_cost = spec['old_cost'] if old else spec['cost']
+                    line_total = self._line_total(spec, price, quantity)
+                    line_cost = (quantity * unit_cost).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                    subtotal += line_total
+                    cost += line_cost
+                    spec['stock'] -= quantity
+                    items.add(self._stamp({
+                        'id': self._next_id(CartItem), 'sale_id': sale_id, 'product_id': spec['id'],
+                        'shop_id': shop_id, 'quantity': quantity, 'unit_price': price,
+                        'discount': Decimal('0'), 'total_price': line_total,
+                        'unit_cost': unit_cost, 'line_cost': line_cost,
+                    }, sold_at))
+
+                sales.add(self._stamp({
+                    'id': sale_id,
+                    'shop_id': shop_id,
+                    'user_id': rng.choice(cashier_ids),
+                    'date': sold_at,
+                    'subtotal': float(subtotal),
+                    'tax': 0.0,  # Shelf prices are VAT-inclusive
+                    'total': float(subtotal),
+                    'profit': float(subtotal - cost),
+                    'payment_method': 'mobile' if rng.random() < 0.7 else 'pay_on_delivery',
+                    'status': SaleStatus.COMPLETED,
+                    'is_paid': True,
+                }, sold_at))
+
+            # Restock overnight whatever fell below its threshold; the odd breakage is written off
+            restocked_at = self._utc(day + timedelta(days=1), 6, 30)
+            for spec in products:
+                if rng.random() < 0.001:
+                    self._stock_log(stock_logs, shop_id, admin_id, spec, -rng.randint(1, 3), AdjustmentType.damage, 'Damaged in store', restocked_at)
+                if spec['stock'] < spec['threshold']:
+                    reorder = max(24, int(spec['threshold'] * rng.uniform(3, 6)))
+                    self._stock_log(stock_logs, shop_id, admin_id, spec, reorder, AdjustmentType.addition, 'Supplier delivery', restocked_at)
+
+        for writer in (sales, items, stock_logs):
+            self._finish(writer)
+
+        # Products were written with their opening stock; bring them to where the history left them
+        update = Product.__table__.update().where(Product.__table__.c.id == bindparam('product_id'))
+        self.session.execute(
+            # updated_at is set here too, or its onupdate default would stamp the time of the run
+            update.values(stock=bindparam('stock'), updated_at=restocked_at),
+            [{'product_id': spec['id'], 'stock': max(int(spec['stock']), 0)} for spec in products]
+        )
+
+    @staticmethod
+    def _line_total(spec: Dict, price: Decimal, quantity: Decimal) -> Decimal:
+        # Same combo pricing and rounding as SalesService._price_cart
+        if spec['combo_size']:
+            size = Decimal(spec['combo_size'])
+            return ceil_to_five((quantity // size) * spec['combo_price'] + min((quantity % size) * price, spec['combo_price']))
+        return ceil_to_five(quantity * price)
+
+    def _stock_log(self, writer: BulkWriter, shop_id: int, user_id: int, spec: Dict,
+                   change: int, adjustment: AdjustmentType, reason: str, logged_at: datetime) -> None:
+        previous = int(spec['stock'])
+        spec['stock'] += change
+        writer.add(self._stamp({
+            'id': self._next_id(StockLog), 'product_id': spec['id'], 'user_id': user_id, 'shop_id': shop_id,
+            'date': logged_at, 'previous_stock': previous, 'new_stock': int(spec['stock']),
+            'adjustment_type': adjustment, 'change_reason': reason,
+        }, logged_at))
+
+    # ---------------
+    # Derived tables
+    # ---------------
+    def _rebuild(self, shop_ids: List[int]) -> None:
+        from flask import current_app
+        from app.sale.repositories import SalesRankRepository, SalesRollupRepository
+
+        for shop_id in shop_ids:
+            started = time.perf_counter()
+            daily, products = SalesRollupRepository.rebuild(shop_id=shop_id)
+            SalesRankRepository.rebuild(shop_id=shop_id, window_days=current_app.config.get('SALES_RANK_WINDOW_DAYS'))
+            self.session.commit()
+            logger.info(f"Shop {shop_id}: {daily} daily and {products} product rollup rows in {time.perf_counter() - started:.1f}s")
+
+    def _reset_sequences(self) -> None:
+        # Ids were written explicitly, so Postgres sequences still start at 1
+        if self.session.connection().dialect.name != 'postgresql':
+            return
+        for table in self.counts:
+            self.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+            ))
+
+    # ---------------
+    # Helpers
+    # ---------------
+    def _writer(self, model, chunk_size: int = 20000) -> BulkWriter:
+        return BulkWriter(self.session, model.__table__, chunk_size)
+
+    def _finish(self, writer: BulkWriter) -> None:
+        writer.flush()
+        self.counts[writer.table.name] = self.counts.get(writer.table.name, 0) + writer.written
+        writer.written = 0
+
+    def _next_id(self, model) -> int:
+        # Ids are assigned here so child rows can reference them without a round trip per parent
+        name = model.__tablename__
+        if name not in self._ids:
+            self._ids[name] = self.session.query(func.max(model.id)).scalar() or 0
+        self._ids[name] += 1
+        return self._ids[name]
+
+    def _user(self, username: str, role: Role, business_id: int, shop_id: Optional[int]) -> Dict:
+        user_id = self._next_id(User)
+        if role is Role.ADMIN:
+            self._admins[shop_id] = user_id
+        return self._stamp({
+            'id': user_id, 'username': username, 'password_hash': self.password_hash,
+            'role': role, 'business_id': business_id, 'shop_id': shop_id,
+            'email_verified': True, 'login_attempts': 0,
+        })
+
+    def _stamp(self, row: Dict, at: Optional[datetime] = None) -> Dict:
+        at = at or self._utc(self.start_date, 8, 0)
+        row.update(created_at=at, updated_at=at, is_deleted=False)
+        return row
+
+    @staticmethod
+    def _utc(day: date, hour: int, minute: int, second: int = 0) -> datetime:
+        """A Nairobi wall-clock time as the naive UTC datetime the models store"""
+        return datetime(day.year, day.month, day.day, hour, minute, second) - NAIROBI_OFFSET
+
+
+def _accumulate(values):
+    total = 0.0
+    for value in values:
+        total += value
+        yield total
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.generate', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', help='Target database (default: BENCH_DATABASE_URL or benchmarks/data/bench.db)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                        help='Last local trading day, YYYY-MM-DD (default: yesterday in Nairobi)')
+    parser.add_argument('--drop', action='store_true', help='Drop and recreate every table first')
+    for option in ('businesses', 'shops_per_business', 'products_per_shop', 'suppliers_per_shop', 'days', 'sales_per_day'):
+        parser.add_argument(f"--{option.replace('_', '-')}", type=int, default=None, help='Override the scale preset')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    scale = dict(SCALES[args.scale])
+    scale.update({option: getattr(args, option) for option in scale if getattr(args, option) is not None})
+
+    app = create_benchmark_app(args.database_url)
+    with app.app_context():
+        from app import db
+        from app.utils.time import kenya_today
+
+        if args.drop:
+            db.drop_all()
+        db.create_all()
+        if db.session.query(Business.id).first() is not None:
+            print(f"{database_url(args.database_url)} already has data; pass --drop to replace it", file=sys.stderr)
+            return 1
+
+        end_date = args.end_date or kenya_today() - timedelta(days=1)
+        started = time.perf_counter()
+        counts = TenantGenerator(db.session, scale, args.seed, end_date).run()
+        elapsed = time.perf_counter() - started
+
+    total = sum(counts.values())
+    for table, count in sorted(counts.items()):
+        print(f"{table:>20}  {count:>10,}")
+    print(f"{total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s), {scale['days']} days to {end_date}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
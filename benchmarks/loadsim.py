@@ -0,0 +1,469 @@
+"""
+Concurrent tills against a running app: N virtual cashiers per shop, each
+signed in over HTTP and holding a Socket.IO connection, going through the POS
+flow in a loop (pos-data, search-as-you-type, checkout, receipt).
+
+    python -m benchmarks.serve --port 5055
+    python -m benchmarks.loadsim --base-url http://127.0.0.1:5055 --cashiers 10 --duration 60
+
+benchmarks.serve runs the app on the benchmark database; any other instance
+works if it uses the same database as --database-url. The simulator adds its own
+cashiers there (bench-till-<shop>-<n>, password: bench), and afterwards checks:
+
+- stock: every product sold during the run must be at its starting stock less
+  what the committed sales took, and not below zero
+- sales: committed sales the till got an error for, and acknowledged sales
+  that never committed
+- sockets: sales_completed events each till missed, and products whose last
+  stock_updated value differs from the database
+
+Besides throughput and latency percentiles per step, the report counts the
+socket frames and events received. The clients need requests and
+websocket-client (pip install requests websocket-client).
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+try:
+    import requests
+    import socketio
+except ImportError:  # Client libraries; the app does not need them
+    requests = socketio = None
+
+from . import create_benchmark_app
+from .run import SEARCH_TERMS, environment, percentile
+
+PASSWORD = 'bench'
+EVENTS = ('sales_completed', 'stock_updated', 'sales_counters')
+CSRF_FIELD = re.compile(r'name="csrf_token"\s+value="([^"]+)"')
+
+
+class Recorder:
+    """Latencies and outcomes from every till"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Counter] = defaultdict(Counter)
+        self.acknowledged: Set[int] = set()
+
+    def record(self, step: str, elapsed: float, outcome: str = 'ok') -> None:
+        with self._lock:
+            self.latencies[step].append(elapsed)
+            self.outcomes[step][outcome] += 1
+
+    def acknowledge(self, sale_id: int) -> None:
+        with self._lock:
+            self.acknowledged.add(sale_id)
+
+
+class VirtualCashier(threading.Thread):
+    """One till: signs in, connects its socket, then sells until `stop` is set"""
+
+    def __init__(self, base_url: str, shop_id: int, username: str, hot_products: List[int],
+                 recorder: Recorder, ready: 'queue.Queue', go: threading.Event, stop: threading.Event,
+                 seed: int, think_time: float, hot_share: float, settle: float):
+        super().__init__(name=username, daemon=True)
+        self.base_url = base_url.rstrip('/')
+        self.shop_id = shop_id
+        self.username = username
+        self.hot_products = hot_products
+        self.recorder = recorder
+        self.ready, self.go, self.stop = ready, go, stop
+        self.rng = random.Random(seed)
+        self.think_time = think_time
+        self.hot_share = hot_share
+        self.settle = settle
+
+        self.http = requests.Session()
+        self.sio = None
+        self.catalogue: List[int] = []
+        self.etag: Optional[str] = None
+        self.frames: Counter = Counter()
+        self.events: Counter = Counter()
+        self.sales_seen: Set[int] = set()
+        self.last_stock: Dict[int, float] = {}
+
+    def run(self) -> None:
+        try:
+            self._sign_in()
+            self._connect()
+        except Exception as e:
+            self.recorder.record('setup', 0.0, f'{type(e).__name__}: {e}'[:120])
+            self.ready.put(False)
+            return
+        self.ready.put(True)
+        self.go.wait()
+
+        sales = 0
+        while not self.stop.is_set():
+            # The till reloads its catalogue now and then; mostly a 304 on the ETag
+            if sales % 20 == 0:
+                self._load_catalogue()
+            self._search()
+            sale_id = self._checkout()
+            if sale_id is not None:
+                self._request('receipt', 'GET', f'/api/shops/{self.shop_id}/receipts', params={'sale_id': sale_id})
+            sales += 1
+            self.stop.wait(self.rng.expovariate(1 / self.think_time) if self.think_time else 0)
+
+        # Let the last batched frames arrive before hanging up
+        time.sleep(self.settle)
+        self.sio.disconnect()
+
+    # ---------------
+    # Steps
+    # ---------------
+    def _request(self, step: str, method: str, path: str, expect=(), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, f'{self.base_url}{path}', timeout=30, allow_redirects=False, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.record(step, time.perf_counter() - started, type(e).__name__)
+            return None
+        elapsed = time.perf_counter() - started
+        if response.status_code < 300 or response.status_code == 304 or response.status_code in expect:
+            outcome = 'ok'
+        elif step == 'checkout' and response.status_code == 409:
+            outcome = 'out_of_stock'
+        else:
+            outcome = f'http_{response.status_code}'
+        self.recorder.record(step, elapsed, outcome)
+        return response
+
+    def _sign_in(self) -> None:
+        form = self.http.get(f'{self.base_url}/auth/login', timeout=30)
+        match = CSRF_FIELD.search(form.text)
+        token = match.group(1) if match else ''
+        response = self._request('login', 'POST', '/auth/login', expect=(302,), data={
+            'username': self.username, 'password': PASSWORD, 'csrf_token': token
+        })
+        if response is None or response.status_code != 302:
+            raise RuntimeError(f"sign-in failed ({response.status_code if response is not None else 'no response'})")
+        self.http.headers['X-CSRFToken'] = token
+        # The app always marks its cookies Secure; a local instance is usually plain HTTP
+        for cookie in self.http.cookies:
+            cookie.secure = False
+
+    def _connect(self) -> None:
+        self.sio = socketio.Client(reconnection=False)
+        for event in EVENTS:
+            self.sio.on(event, self._handler(event))
+
+        cookie = '; '.join(f'{name}={value}' for name, value in self.http.cookies.items())
+        started = time.perf_counter()
+        self.sio.connect(self.base_url, headers={'Cookie': cookie}, wait_timeout=10)
+        self.recorder.record('socket_connect', time.perf_counter() - started)
+
+    def _handler(self, event: str):
+        def handle(frame):
+            events = frame.get('events', []) if isinstance(frame, dict) else []
+            self.frames[event] += 1
+            self.events[event] += len(events)
+            for payload in events:
+                if event == 'sales_completed':
+                    self.sales_seen.add(payload['sale_id'])
+                elif event == 'stock_updated':
+                    self.last_stock[payload['product_id']] = payload['stock']
+        return handle
+
+    def _load_catalogue(self) -> None:
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        response = self._request('pos_data', 'GET', f'/api/shops/{self.shop_id}/pos-data', headers=headers)
+        if response is None or response.status_code != 200:
+            return
+        self.etag = response.headers.get('ETag')
+        self.catalogue = [p['id'] for p in response.json().get('products', []) if p.get('stock', 0) > 0]
+
+    def _search(self) -> None:
+        # One request per keystroke from the second character, as the till's search box sends them
+        term = self.rng.choice(SEARCH_TERMS)
+        for end in range(2, len(term) + 1):
+            self._request('search', 'POST', f'/api/shops/{self.shop_id}/products/search', json={'query': term[:end]})
+            if self.stop.wait(self.rng.uniform(0.05, 0.15)):
+                return
+
+    def _checkout(self) -> Optional[int]:
+        pool = self.catalogue or self.hot_products
+        if not pool:
+            return None
+        cart = {}
+        for _ in range(self.rng.randint(1, 6)):
+            source = self.hot_products if self.hot_products and self.rng.random() < self.hot_share else pool
+            cart[self.rng.choice(source)] = self.rng.randint(1, 3)
+
+        response = self._request('checkout', 'POST', f'/api/shops/{self.shop_id}/transactions', json={
+            'cart_items': [{'product_id': pid, 'quantity': quantity} for pid, quantity in cart.items()],
+            'payment_method': 'mobile'
+        })
+        if response is None or response.status_code != 200:
+            return None
+        sale_id = response.json()['sale_id']
+        self.recorder.acknowledge(sale_id)
+        return sale_id
+
+
+def provision_tills(shop_ids: List[int], count: int) -> Dict[int, List[str]]:
+    """Cashier accounts bench-till-<shop>-<n>, with the address cashiers must have before using the POS"""
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models import County, Role, Shop, SubCounty, User, UserAddress, Ward
+
+    county = County.query.filter_by(name='Nairobi').first() or County(name='Nairobi')
+    db.session.add(county)
+    db.session.flush()
+    subcounty = SubCounty.query.filter_by(name='Westlands').first() or SubCounty(name='Westlands', county_id=county.id)
+    db.session.add(subcounty)
+    db.session.flush()
+    ward = Ward.query.filter_by(name='Parklands', subcounty_id=subcounty.id).first() or Ward(name='Parklands', subcounty_id=subcounty.id)
+    db.session.add(ward)
+    db.session.flush()
+
+    password_hash = generate_password_hash(PASSWORD)
+    tills = {}
+    for shop_id in shop_ids:
+        shop = Shop.query.get(shop_id)
+        tills[shop_id] = []
+        for n in range(1, count + 1):
+            username = f'bench-till-{shop_id}-{n}'
+            if User.query.filter_by(username=username).first() is None:
+                user = User(username=username, password_hash=password_hash, role=Role.CASHIER,
+                            business_id=shop.business_id, shop_id=shop_id)
+                db.session.add(user)
+                db.session.flush()
+                db.session.add(UserAddress(
+                    user_id=user.id, county_id=county.id, subcounty_id=subcounty.id, ward_id=ward.id,
+                    shop_id=shop_id, estate='Bench', is_primary=True
+                ))
+            tills[shop_id].append(username)
+    db.session.commit()
+    return tills
+
+
+def hot_products(shop_id: int, count: int) -> List[int]:
+    """The shop's best sellers in stock: where tills collide in real trading"""
+    from app import db
+    from app.models import Product, ProductSalesRank
+
+    rows = db.session.query(Product.id).join(
+        ProductSalesRank, (ProductSalesRank.product_id == Product.id) & (ProductSalesRank.shop_id == Product.shop_id)
+    ).filter(Product.shop_id == shop_id, Product.stock > 0).order_by(ProductSalesRank.score.desc()).limit(count)
+    return [row.id for row in rows]
+
+
+def stock_snapshot(shop_ids: List[int]) -> Dict[int, int]:
+    from app import db
+    from app.models import Product
+
+    return dict(db.session.query(Product.id, Product.stock).filter(Product.shop_id.in_(shop_ids)))
+
+
+def verify(shop_ids: List[int], first_sale_id: int, before: Dict[int, int],
+           recorder: Recorder, cashiers: List[VirtualCashier]) -> Dict:
+    """Compare the database after the run with the starting stock, the acknowledged sales and what sockets delivered"""
+    from sqlalchemy import func
+    from app import db
+    from app.models import CartItem, Product, Sale
+
+    committed = defaultdict(set)
+    for sale_id, shop_id in db.session.query(Sale.id, Sale.shop_id).filter(
+        Sale.id > first_sale_id, Sale.shop_id.in_(shop_ids)
+    ):
+        committed[shop_id].add(sale_id)
+    all_committed = set().union(*committed.values()) if committed else set()
+
+    sold = dict(db.session.query(CartItem.product_id, func.sum(CartItem.quantity)).join(
+        Sale, Sale.id == CartItem.sale_id
+    ).filter(Sale.id > first_sale_id, Sale.shop_id.in_(shop_ids)).group_by(CartItem.product_id))
+    after = dict(db.session.query(Product.id, Product.stock).filter(Product.id.in_(list(sold) or [0])))
+
+    mismatches, negative = [], []
+    for product_id, quantity in sold.items():
+        expected = float(before[product_id]) - float(quantity)
+        if abs(after[product_id] - expected) > 1e-6:
+            mismatches.append({'product_id': product_id, 'before': before[product_id], 'sold': float(quantity),
+                               'expected': expected, 'actual': after[product_id]})
+        if after[product_id] < 0:
+            negative.append(product_id)
+
+    missed = stale = 0
+    for cashier in cashiers:
+        if cashier.sio is None:
+            continue
+        missed += len(committed[cashier.shop_id] - cashier.sales_seen)
+        stale += sum(
+            1 for product_id, stock in cashier.last_stock.items()
+            if product_id in after and abs(after[product_id] - stock) > 1e-6
+        )
+    db.session.remove()
+
+    return {
+        'stock': {
+            'products_sold': len(sold),
+            'mismatches': len(mismatches),
+            'negative': len(negative),
+            'examples': mismatches[:10],
+        },
+        'sales': {
+            'committed': len(all_committed),
+            'acknowledged': len(recorder.acknowledged),
+            'committed_not_acknowledged': len(all_committed - recorder.acknowledged),
+            'acknowledged_not_committed': len(recorder.acknowledged - all_committed),
+        },
+        'sockets': {
+            'sales_completed_missed': missed,
+            'stale_stock_values': stale,
+        },
+    }
+
+
+def summarize(recorder: Recorder, cashiers: List[VirtualCashier], elapsed: float) -> Dict:
+    steps = {}
+    for step, latencies in sorted(recorder.latencies.items()):
+        ms = [value * 1000 for value in latencies]
+        steps[step] = {
+            'count': len(ms),
+            'outcomes': dict(recorder.outcomes[step]),
+            'p50_ms': round(percentile(ms, 50), 2),
+            'p95_ms': round(percentile(ms, 95), 2),
+            'p99_ms': round(percentile(ms, 99), 2),
+            'max_ms': round(max(ms), 2),
+        }
+    requests_made = sum(len(latencies) for latencies in recorder.latencies.values())
+    checkouts = recorder.outcomes['checkout']['ok']
+
+    events = {}
+    for event in EVENTS:
+        events[event] = {
+            'frames': sum(cashier.frames[event] for cashier in cashiers),
+            'events': sum(cashier.events[event] for cashier in cashiers),
+        }
+    return {
+        'throughput': {
+            'duration_s': round(elapsed, 2),
+            'requests_per_s': round(requests_made / elapsed, 2) if elapsed else 0.0,
+            'checkouts_per_s': round(checkouts / elapsed, 2) if elapsed else 0.0,
+        },
+        'steps': steps,
+        'events_received': events,
+    }
+
+
+def simulate(args) -> int:
+    if requests is None or socketio is None:
+        print("The simulator needs requests and websocket-client: pip install requests websocket-client", file=sys.stderr)
+        return 2
+
+    app = create_benchmark_app(args.database_url)
+    with app.app_context():
+        from app import db
+        from app.models import Sale
+
+        shop_ids = args.shop_id or [
+            row.shop_id for row in db.session.query(Sale.shop_id).distinct().order_by(Sale.shop_id).limit(args.shops)
+        ]
+        if not shop_ids:
+            print("No sales found; run `python -m benchmarks.generate` first", file=sys.stderr)
+            return 2
+        tills = provision_tills(shop_ids, args.cashiers)
+        hot = {shop_id: hot_products(shop_id, args.hot_products) for shop_id in shop_ids}
+        meta = environment(app, shop_ids[0])
+        before = stock_snapshot(shop_ids)
+        first_sale_id = db.session.query(db.func.max(Sale.id)).scalar() or 0
+        db.session.remove()
+
+    recorder = Recorder()
+    ready, go, stop = queue.Queue(), threading.Event(), threading.Event()
+    cashiers = [
+        VirtualCashier(args.base_url, shop_id, username, hot[shop_id], recorder, ready, go, stop,
+                       seed=args.seed + i, think_time=args.think_time, hot_share=args.hot_share, settle=args.settle)
+        for i, (shop_id, username) in enumerate(
+            (shop_id, username) for shop_id in shop_ids for username in tills[shop_id]
+        )
+    ]
+    for cashier in cashiers:
+        cashier.start()
+    connected = sum(ready.get() for _ in cashiers)
+    print(f"{connected}/{len(cashiers)} tills signed in and connected across {len(shop_ids)} shop(s)")
+
+    # Every socket is in its room before the first sale, so none has an excuse to miss an event
+    started = time.monotonic()
+    go.set()
+    stop.wait(args.duration)
+    stop.set()
+    for cashier in cashiers:
+        cashier.join()
+    elapsed = time.monotonic() - started - args.settle
+
+    with app.app_context():
+        report = summarize(recorder, cashiers, elapsed)
+        report.update(verify(shop_ids, first_sale_id, before, recorder, cashiers))
+    meta.update(
+        base_url=args.base_url, shops=shop_ids, cashiers_per_shop=args.cashiers, tills_connected=connected,
+        duration=args.duration, think_time=args.think_time, hot_products=args.hot_products, hot_share=args.hot_share,
+        seed=args.seed, started_at=datetime.utcnow().isoformat(timespec='seconds') + 'Z'
+    )
+    report['meta'] = meta
+
+    print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Report written to {args.output}")
+    violations = report['stock']['mismatches'] + report['stock']['negative'] + report['sales']['acknowledged_not_committed']
+    return 1 if violations else 0
+
+
+def print_report(report: Dict) -> None:
+    throughput = report['throughput']
+    print(f"\n{throughput['requests_per_s']} requests/s, {throughput['checkouts_per_s']} checkouts/s "
+          f"over {throughput['duration_s']}s\n")
+    print(f"{'step':<16} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  outcomes")
+    for step, figures in report['steps'].items():
+        outcomes = ', '.join(f'{name} {n}' for name, n in sorted(figures['outcomes'].items()))
+        print(f"{step:<16} {figures['count']:>7} {figures['p50_ms']:>9} {figures['p95_ms']:>9} "
+              f"{figures['p99_ms']:>9} {figures['max_ms']:>9}  {outcomes}")
+
+    print()
+    for event, figures in report['events_received'].items():
+        print(f"{event:<16} {figures['frames']:>7} frames {figures['events']:>8} events received")
+    stock, sales, sockets = report['stock'], report['sales'], report['sockets']
+    print(f"\nStock: {stock['products_sold']} products sold, {stock['mismatches']} mismatches, {stock['negative']} negative")
+    print(f"Sales: {sales['committed']} committed, {sales['acknowledged']} acknowledged, "
+          f"{sales['committed_not_acknowledged']} committed without acknowledgement, "
+          f"{sales['acknowledged_not_committed']} acknowledged but missing")
+    print(f"Sockets: {sockets['sales_completed_missed']} sales_completed deliveries missed, "
+          f"{sockets['stale_stock_values']} stale stock values")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.loadsim', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5055')
+    parser.add_argument('--database-url', help='The database the app uses (default: BENCH_DATABASE_URL or benchmarks/data/bench.db)')
+    parser.add_argument('--shop-id', type=int, action='append', help='Shop to trade in (repeatable; default: the first --shops shops)')
+    parser.add_argument('--shops', type=int, default=1)
+    parser.add_argument('--cashiers', type=int, default=10, help='Tills per shop')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds of trading')
+    parser.add_argument('--think-time', type=float, default=1.0, help='Mean pause between sales, seconds')
+    parser.add_argument('--hot-products', type=int, default=20, help='Best sellers most carts draw from')
+    parser.add_argument('--hot-share', type=float, default=0.6, help='Share of cart lines taken from the best sellers')
+    parser.add_argument('--settle', type=float, default=2.0, help='Seconds to wait for the last socket frames')
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--output', help='Write the report as JSON')
+    args = parser.parse_args(argv)
+    return simulate(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+Times the hot service functions and HTTP endpoints against a generated
+dataset (see benchmarks.generate) and writes the figures as JSON, one file per
+commit and database:
+
+    python -m benchmarks.run --database-url postgresql://localhost/nawiri_bench
+    python -m benchmarks.compare benchmarks/results/<base>.json benchmarks/results/<head>.json
+
+Each case is called --warmup times untimed, then --repeat times. Per case the
+results hold wall time percentiles in milliseconds and the SQL statements and
+database time per call (QueryStats). Checkout cases write real sales, so the
+shop drifts a little with each run; regenerate the dataset (it is
+deterministic) before a long comparison series.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from . import RESULTS_DIR, ROOT, create_benchmark_app
+from .generate import ITEMS
+
+SEARCH_TERMS = sorted({word.lower() for item in ITEMS for word in item.split()})
+
+
+class BenchmarkError(RuntimeError):
+    """A case returned an error instead of a result"""
+
+
+@dataclass
+class Case:
+    name: str
+    call: Callable[[], object]
+    setup: Optional[Callable[[], None]] = None  # Untimed, before every call (e.g. to empty the cache)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def measure(case: Case, repeat: int, warmup: int) -> Dict:
+    from app.utils.profiling import QueryStats
+
+    timings, queries, db_times = [], [], []
+    for n in range(warmup + repeat):
+        if case.setup:
+            case.setup()
+        with QueryStats() as stats:
+            started = time.perf_counter()
+            result = case.call()
+            elapsed = time.perf_counter() - started
+        status = getattr(result, 'status_code', 200)
+        if status >= 300 and status != 304:
+            raise BenchmarkError(f"HTTP {status}: {result.get_data(as_text=True)[:200]}")
+        if n >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(stats.count)
+            db_times.append(stats.duration * 1000)
+
+    return {
+        'calls': repeat,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'max_ms': round(max(timings), 3),
+        'stdev_ms': round(statistics.stdev(timings), 3) if len(timings) > 1 else 0.0,
+        'queries': statistics.median(queries),
+        'db_ms': round(statistics.median(db_times), 3),
+    }
+
+
+class Harness:
+    """The cases for one shop of the dataset"""
+
+    def __init__(self, app, shop_id: Optional[int], seed: int):
+        from app import db
+        from app.models import Product, Role, Sale, Shop, User
+        from app.utils.time import to_kenya_time
+
+        self.app = app
+        self.rng = random.Random(seed)
+        self.shop_id = shop_id or db.session.query(Sale.shop_id).order_by(Sale.shop_id).limit(1).scalar()
+        if self.shop_id is None or Shop.query.get(self.shop_id) is None:
+            raise SystemExit("No sales found; run `python -m benchmarks.generate` first")
+
+        # The business owner: other roles are sent to fill in an address before any page
+        owner = User.query.filter_by(
+            business_id=Shop.query.get(self.shop_id).business_id, role=Role.TENANT
+        ).order_by(User.id).first()
+        if owner is None:
+            raise SystemExit(f"Shop {self.shop_id} has no owner to sign in as")
+        self.user_id = owner.id
+
+        # Carts are drawn from well-stocked products, so checkouts are not rejected mid-run
+        self.cart_products = [
+            row.id for row in db.session.query(Product.id).filter(
+                Product.shop_id == self.shop_id, Product.stock >= 100, Product.is_active.is_(True)
+            ).order_by(Product.id).limit(200)
+        ]
+        last_sale = db.session.query(Sale.id, Sale.date).filter_by(shop_id=self.shop_id).order_by(Sale.date.desc()).first()
+        self.sale_id, self.report_date = last_sale.id, to_kenya_time(last_sale.date).date()
+        db.session.remove()
+
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(self.user_id)
+            session['_fresh'] = True
+
+    def _cart(self) -> List[Dict]:
+        lines = self.rng.randint(1, 6)
+        return [
+            {'product_id': product_id, 'quantity': self.rng.randint(1, 2)}
+            for product_id in self.rng.sample(self.cart_products, lines)
+        ]
+
+    def _clear_cache(self) -> None:
+        from app import cache
+        cache.clear()
+
+    def _get(self, path: str, **headers):
+        return lambda: self.client.get(path, headers={'Accept-Encoding': 'gzip', **headers})
+
+    def _post(self, path: str, body: Callable[[], Dict]):
+        return lambda: self.client.post(path, json=body(), headers={'Accept-Encoding': 'gzip'})
+
+    def cases(self) -> List[Case]:
+        from app import db
+        from app.admin.routes import prepare_dashboard_data
+        from app.sale.services import ProductService, SalesService
+        from app.utils.calculations.report_calculations import generate_daily_report_data
+
+        shop_id = self.shop_id
+
+        def service(call):
+            # A fresh session per call, as each request gets
+            def run():
+                try:
+                    return call()
+                finally:
+                    db.session.remove()
+            return run
+
+        def checkout():
+            return SalesService.process_checkout(shop_id, self.user_id, self._cart(), 'mobile')
+
+        api = f'/api/shops/{shop_id}'
+        return [
+            Case('service.get_pos_data', service(lambda: SalesService.get_pos_data(shop_id))),
+            Case('service.get_pos_payload.cold', service(lambda: SalesService.get_pos_payload(shop_id, encoding='gzip')),
+                 setup=self._clear_cache),
+            Case('service.get_pos_payload.warm', service(lambda: SalesService.get_pos_payload(shop_id, encoding='gzip'))),
+            Case('service.product_search', service(lambda: ProductService.search(shop_id, self.rng.choice(SEARCH_TERMS)))),
+            Case('service.process_checkout', service(checkout)),
+            Case('service.generate_daily_report_data', service(lambda: generate_daily_report_data(shop_id, self.report_date))),
+            Case('service.prepare_dashboard_data.cold', service(lambda: prepare_dashboard_data(shop_id)),
+                 setup=self._clear_cache),
+            Case('service.prepare_dashboard_data.warm', service(lambda: prepare_dashboard_data(shop_id))),
+
+            Case('http.pos_data', self._get(f'{api}/pos-data')),
+            Case('http.pos_data.columnar', self._get(f'{api}/pos-data?format=columnar')),
+            Case('http.product_search', self._post(f'{api}/products/search', lambda: {'query': self.rng.choice(SEARCH_TERMS)})),
+            Case('http.checkout', self._post(f'{api}/transactions', lambda: {'cart_items': self._cart(), 'payment_method': 'mobile'})),
+            Case('http.receipt', self._get(f'{api}/receipts?sale_id={self.sale_id}')),
+            Case('http.receipt.thermal', self._get(f'{api}/receipts?sale_id={self.sale_id}&format=thermal')),
+            Case('http.transaction_details', self._get(f'{api}/transactions/{self.sale_id}')),
+            Case('http.daily_report', self._get(
+                f'/reports/shops/{shop_id}/reports/daily?date={self.report_date.isoformat()}', Accept='application/json'
+            )),
+            Case('http.admin_dashboard.cold', self._get(f'/admin/shops/{shop_id}/admin_dashboard'), setup=self._clear_cache),
+        ]
+
+
+def environment(app, shop_id: int) -> Dict:
+    from sqlalchemy import func
+    from app import db
+    from app.models import CartItem, Product, Sale, StockLog
+
+    def git(*args) -> Optional[str]:
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    engine = db.engine
+    if engine.dialect.name == 'postgresql':
+        server = db.session.execute('SHOW server_version').scalar()
+    else:
+        server = engine.dialect.dbapi.sqlite_version if engine.dialect.name == 'sqlite' else None
+    dataset = {
+        model.__tablename__: db.session.query(func.count(model.id)).scalar()
+        for model in (Product, Sale, CartItem, StockLog)
+    }
+    db.session.remove()
+
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'subject': git('log', '-1', '--format=%s'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'database': engine.dialect.name,
+        'database_version': server,
+        'database_url': engine.url.render_as_string(hide_password=True),
+        'shop_id': shop_id,
+        'dataset': dataset,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', help='Dataset to run against (default: BENCH_DATABASE_URL or benchmarks/data/bench.db)')
+    parser.add_argument('--shop-id', type=int, default=None, help='Shop to exercise (default: the first shop with sales)')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=2024, help='Seed for carts and search terms')
+    parser.add_argument('--only', action='append', default=[], help='Run cases whose name contains this (repeatable)')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<commit>-<database>.json)')
+    args = parser.parse_args(argv)
+
+    # Per-request info and debug lines would interleave with the figures; warnings (e.g. N+1) still show
+    logging.disable(logging.INFO)
+    app = create_benchmark_app(args.database_url)
+    with app.app_context():
+        harness = Harness(app, args.shop_id, args.seed)
+        meta = environment(app, harness.shop_id)
+        meta.update(repeat=args.repeat, warmup=args.warmup, seed=args.seed)
+
+        results, failed = {}, 0
+        for case in harness.cases():
+            if args.only and not any(part in case.name for part in args.only):
+                continue
+            try:
+                results[case.name] = figures = measure(case, args.repeat, args.warmup)
+            except Exception as e:
+                failed += 1
+                results[case.name] = {'error': str(e)}
+                print(f"{case.name:<40} FAILED: {e}", file=sys.stderr)
+                continue
+            print(f"{case.name:<40} median {figures['median_ms']:>9.2f}ms  p95 {figures['p95_ms']:>9.2f}ms  "
+                  f"{figures['queries']:>5g} queries")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{(meta['commit'] or 'unknown')[:12]}{'-dirty' if meta['dirty'] else ''}-{meta['database']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+    print(f"Results written to {output}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
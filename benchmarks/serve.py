@@ -0,0 +1,37 @@
+"""
+Runs the app with Socket.IO on the benchmark database, for benchmarks.loadsim:
+
+    python -m benchmarks.serve --port 5055
+
+With eventlet installed (as in production) the standard library is patched
+first, so request handlers, the post-checkout workers and the socket batcher
+run as green threads and emits from the batcher reach connected clients.
+"""
+try:
+    import eventlet
+    eventlet.monkey_patch()
+except ImportError:  # Flask-SocketIO falls back to threads
+    eventlet = None
+
+import argparse
+import sys
+
+from . import create_benchmark_app
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.serve', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', help='Database to serve (default: BENCH_DATABASE_URL or benchmarks/data/bench.db)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args(argv)
+
+    from app import socketio
+
+    app = create_benchmark_app(args.database_url)
+    socketio.run(app, host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
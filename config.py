@@ -15,6 +15,61 @@ class Config:
     CACHE_REDIS_URL = os.getenv('REDIS_URL')
     CACHE_DEFAULT_TIMEOUT = 300
 
+    # POS Catalogue
+    SALES_RANK_WINDOW_DAYS = int(os.getenv('SALES_RANK_WINDOW_DAYS', 30))  # 0 ranks by all-time sales
+    POS_DATA_CACHE_TIMEOUT = int(os.getenv('POS_DATA_CACHE_TIMEOUT', 3600))  # Keyed by catalogue version
+    SEARCH_INDEX_MAX_SHOPS = int(os.getenv('SEARCH_INDEX_MAX_SHOPS', 50))  # In-memory indexes kept per worker
+
+    # Socket.IO
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', os.getenv('REDIS_URL'))  # Fan-out across workers; unset emits in-process only
+    SOCKET_EMIT_INTERVAL = float(os.getenv('SOCKET_EMIT_INTERVAL', 0.25))  # Batching/coalescing window per room
+
+    # Post-checkout Tasks
+    POST_CHECKOUT_WORKERS = int(os.getenv('POST_CHECKOUT_WORKERS', 4))  # Threads per app worker
+    POST_CHECKOUT_QUEUE_SIZE = int(os.getenv('POST_CHECKOUT_QUEUE_SIZE', 1000))  # Tasks beyond this are dropped
+    POST_CHECKOUT_MAX_RETRIES = int(os.getenv('POST_CHECKOUT_MAX_RETRIES', 3))
+    POST_CHECKOUT_RETRY_DELAY = float(os.getenv('POST_CHECKOUT_RETRY_DELAY', 0.5))  # Seconds, grows per attempt
+    RECEIPT_MAX_AGE = int(os.getenv('RECEIPT_MAX_AGE', 31536000))  # Seconds clients keep a receipt; stored receipts never change
+    RECEIPT_LINE_WIDTH = int(os.getenv('RECEIPT_LINE_WIDTH', 32))  # Characters per line on the thermal printer (58mm roll)
+    CHECKOUT_REPLAY_TIMEOUT = int(os.getenv('CHECKOUT_REPLAY_TIMEOUT', 900))  # Idempotency-Key fast path; the sales index covers the rest
+    OFFLINE_SYNC_MAX_BATCH = int(os.getenv('OFFLINE_SYNC_MAX_BATCH', 500))  # Sales per sync request
+    OFFLINE_SYNC_MAX_AGE_DAYS = int(os.getenv('OFFLINE_SYNC_MAX_AGE_DAYS', 7))  # Older offline sales are rejected
+
+    # Response Compression
+    COMPRESS_BLUEPRINTS = tuple(os.getenv('COMPRESS_BLUEPRINTS', 'sales_api,reports,inventory').split(','))
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # Bytes; smaller bodies are sent as-is
+    COMPRESS_STREAM_SIZE = int(os.getenv('COMPRESS_STREAM_SIZE', 262144))  # Bytes; larger bodies are compressed as they stream
+    GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+    BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+    COMPRESS_REFERENCE_KBPS = int(os.getenv('COMPRESS_REFERENCE_KBPS', 750))  # Link speed the latency savings are estimated at (3G)
+
+    # SQL Profiling
+    SQL_PROFILING = os.getenv('SQL_PROFILING', 'true').lower() == 'true'  # Server-Timing and per-request query counts
+    QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', 5))  # Same statement this often in one request is logged as N+1
+    QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'false').lower() == 'true'  # Raise on @query_budget overruns (test configs)
+
+    # Metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_DIR = os.getenv('METRICS_DIR')  # Shared by the server's workers; defaults to <tmp>/nawiri-metrics
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))  # Seconds between worker writes
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # Bearer token for scrapers; otherwise a superadmin session is required
+
+    # Dashboards
+    DASHBOARD_CACHE_TIMEOUT = int(os.getenv('DASHBOARD_CACHE_TIMEOUT', 60))  # Also dropped on checkout
+    PRODUCT_ANALYTICS_CACHE_TIMEOUT = int(os.getenv('PRODUCT_ANALYTICS_CACHE_TIMEOUT', 300))  # Per product and period
+
+    # Live Sales Counters
+    LIVE_COUNTERS_TTL = int(os.getenv('LIVE_COUNTERS_TTL', 172800))  # Seconds a shop's day of counters is kept in Redis
+
+    # Report Exports
+    EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(basedir, 'instance', 'exports'))
+    EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))  # Render processes per app worker
+    EXPORT_JOB_TIMEOUT = int(os.getenv('EXPORT_JOB_TIMEOUT', 600))  # Pending/failed job state lifetime
+    EXPORT_RETENTION = int(os.getenv('EXPORT_RETENTION', 86400))  # Seconds a rendered artifact is served
+
+    # Tenant Context
+    TENANT_CONTEXT_CACHE_TIMEOUT = int(os.getenv('TENANT_CONTEXT_CACHE_TIMEOUT', 300))  # Also dropped on user/shop edits
+
     # Session Security Configuration
     SESSION_COOKIE_SECURE = True  
     SESSION_COOKIE_HTTPONLY = True  
@@ -0,0 +1,46 @@
+"""add product_sales_rank
+
+Revision ID: 3b7f2c9d41a6
+Revises: 1ec27b47e821
+Create Date: 2025-08-14 10:12:41.502931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7f2c9d41a6'
+down_revision = '1ec27b47e821'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_sales_rank',
+    sa.Column('shop_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('units_sold', sa.Numeric(precision=14, scale=3), server_default=sa.text('0'), nullable=False),
+    sa.Column('score', sa.Numeric(precision=14, scale=3), server_default=sa.text('0'), nullable=False),
+    sa.Column('last_sold_at', sa.DateTime(), nullable=True),
+    sa.Column('rebuilt_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['shop_id'], ['shops.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('shop_id', 'product_id')
+    )
+    op.create_index('ix_product_sales_rank_shop_score', 'product_sales_rank', ['shop_id', 'score'], unique=False)
+
+    # Seed from existing sales history (all-time; the periodic rebuild applies the window)
+    op.execute("""
+        INSERT INTO product_sales_rank (shop_id, product_id, units_sold, score, last_sold_at, rebuilt_at)
+        SELECT s.shop_id, ci.product_id, SUM(ci.quantity), SUM(ci.quantity), MAX(s.date), NOW()
+        FROM cart_items ci
+        JOIN sales s ON s.id = ci.sale_id
+        WHERE s.shop_id IS NOT NULL AND (s.is_deleted = false OR s.is_deleted IS NULL)
+        GROUP BY s.shop_id, ci.product_id
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_product_sales_rank_shop_score', table_name='product_sales_rank')
+    op.drop_table('product_sales_rank')
@@ -0,0 +1,87 @@
+"""add shop_daily_sales and shop_daily_product_sales rollups
+
+Revision ID: 5c9e1f3a7d24
+Revises: 8e41d5a0c7b2
+Create Date: 2025-08-18 10:12:40.552817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c9e1f3a7d24'
+down_revision = '8e41d5a0c7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('shop_daily_sales',
+    sa.Column('shop_id', sa.Integer(), nullable=False),
+    sa.Column('sale_date', sa.Date(), nullable=False),
+    sa.Column('hour', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('payment_method', sa.String(length=50), nullable=False),
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('transactions', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('total', sa.Numeric(precision=14, scale=2), server_default=sa.text('0'), nullable=False),
+    sa.Column('subtotal', sa.Numeric(precision=14, scale=2), server_default=sa.text('0'), nullable=False),
+    sa.Column('tax', sa.Numeric(precision=14, scale=2), server_default=sa.text('0'), nullable=False),
+    sa.Column('profit', sa.Numeric(precision=14, scale=2), server_default=sa.text('0'), nullable=False),
+    sa.Column('items', sa.Numeric(precision=14, scale=3), server_default=sa.text('0'), nullable=False),
+    sa.Column('largest_sale', sa.Numeric(precision=14, scale=2), nullable=True),
+    sa.Column('smallest_sale', sa.Numeric(precision=14, scale=2), nullable=True),
+    sa.ForeignKeyConstraint(['shop_id'], ['shops.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('shop_id', 'sale_date', 'hour', 'payment_method', 'user_id')
+    )
+    op.create_table('shop_daily_product_sales',
+    sa.Column('shop_id', sa.Integer(), nullable=False),
+    sa.Column('sale_date', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Numeric(precision=14, scale=3), server_default=sa.text('0'), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=14, scale=2), server_default=sa.text('0'), nullable=False),
+    sa.Column('cost', sa.Numeric(precision=14, scale=2), server_default=sa.text('0'), nullable=False),
+    sa.Column('transactions', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['shop_id'], ['shops.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('shop_id', 'sale_date', 'product_id')
+    )
+    op.create_index('ix_shop_daily_product_sales_product', 'shop_daily_product_sales', ['product_id', 'sale_date'], unique=False)
+
+    # Seed from existing sales; `flask rollups rebuild` recomputes the same figures
+    op.execute("""
+        WITH local_sales AS (
+            SELECT s.*, (s.date AT TIME ZONE 'UTC') AT TIME ZONE 'Africa/Nairobi' AS local_date
+            FROM sales s
+            WHERE s.shop_id IS NOT NULL AND (s.is_deleted = false OR s.is_deleted IS NULL)
+        ),
+        sale_items AS (
+            SELECT sale_id, SUM(quantity) AS items FROM cart_items GROUP BY sale_id
+        )
+        INSERT INTO shop_daily_sales (shop_id, sale_date, hour, payment_method, user_id, transactions,
+                                      total, subtotal, tax, profit, items, largest_sale, smallest_sale)
+        SELECT ls.shop_id, CAST(ls.local_date AS DATE), CAST(EXTRACT(HOUR FROM ls.local_date) AS INTEGER),
+               ls.payment_method, COALESCE(ls.user_id, 0), COUNT(*),
+               SUM(ls.total), SUM(COALESCE(ls.subtotal, 0)), SUM(COALESCE(ls.tax, 0)), SUM(COALESCE(ls.profit, 0)),
+               SUM(COALESCE(si.items, 0)), MAX(ls.total), MIN(ls.total)
+        FROM local_sales ls
+        LEFT JOIN sale_items si ON si.sale_id = ls.id
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+    op.execute("""
+        INSERT INTO shop_daily_product_sales (shop_id, sale_date, product_id, quantity, revenue, cost, transactions)
+        SELECT s.shop_id, CAST((s.date AT TIME ZONE 'UTC') AT TIME ZONE 'Africa/Nairobi' AS DATE), ci.product_id,
+               SUM(ci.quantity), SUM(ci.total_price), SUM(ci.quantity * COALESCE(p.cost_price, 0)),
+               COUNT(DISTINCT s.id)
+        FROM cart_items ci
+        JOIN sales s ON s.id = ci.sale_id
+        JOIN products p ON p.id = ci.product_id
+        WHERE s.shop_id IS NOT NULL AND (s.is_deleted = false OR s.is_deleted IS NULL)
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_shop_daily_product_sales_product', table_name='shop_daily_product_sales')
+    op.drop_table('shop_daily_product_sales')
+    op.drop_table('shop_daily_sales')
@@ -0,0 +1,36 @@
+"""add sale_receipts
+
+Revision ID: 7a3d9e5c2f18
+Revises: e4c1a7f93b20
+Create Date: 2025-08-26 11:18:05.274903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3d9e5c2f18'
+down_revision = 'e4c1a7f93b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing sales get their receipt written on first read (ReceiptStore.get)
+    op.create_table('sale_receipts',
+    sa.Column('sale_id', sa.Integer(), nullable=False),
+    sa.Column('shop_id', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('document', sa.Text(), nullable=False),
+    sa.Column('details', sa.Text(), nullable=False),
+    sa.Column('thermal', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['sale_id'], ['sales.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['shop_id'], ['shops.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('sale_id')
+    )
+
+
+def downgrade():
+    op.drop_table('sale_receipts')
@@ -0,0 +1,26 @@
+"""add products.catalogue_version
+
+Revision ID: 8e41d5a0c7b2
+Revises: 3b7f2c9d41a6
+Create Date: 2025-08-15 08:47:03.118264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e41d5a0c7b2'
+down_revision = '3b7f2c9d41a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('products', sa.Column('catalogue_version', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.create_index('ix_product_shop_catalogue_version', 'products', ['shop_id', 'catalogue_version'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_product_shop_catalogue_version', table_name='products')
+    op.drop_column('products', 'catalogue_version')
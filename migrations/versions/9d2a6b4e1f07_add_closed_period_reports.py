@@ -0,0 +1,34 @@
+"""add closed_period_reports
+
+Revision ID: 9d2a6b4e1f07
+Revises: 5c9e1f3a7d24
+Create Date: 2025-08-20 09:41:18.204931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2a6b4e1f07'
+down_revision = '5c9e1f3a7d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('closed_period_reports',
+    sa.Column('shop_id', sa.Integer(), nullable=False),
+    sa.Column('report', sa.String(length=30), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('context', sa.Text(), nullable=False),
+    sa.Column('fragment', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['shop_id'], ['shops.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('shop_id', 'report', 'period_start')
+    )
+
+
+def downgrade():
+    op.drop_table('closed_period_reports')
@@ -0,0 +1,26 @@
+"""add sales.idempotency_key
+
+Revision ID: b6e3f8a2c915
+Revises: 9d2a6b4e1f07
+Create Date: 2025-08-21 15:02:47.118320
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e3f8a2c915'
+down_revision = '9d2a6b4e1f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sales', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.create_index('uq_sale_shop_idempotency_key', 'sales', ['shop_id', 'idempotency_key'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_sale_shop_idempotency_key', table_name='sales')
+    op.drop_column('sales', 'idempotency_key')
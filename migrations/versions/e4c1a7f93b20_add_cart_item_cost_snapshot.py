@@ -0,0 +1,45 @@
+"""add cart_items.unit_cost and line_cost
+
+Revision ID: e4c1a7f93b20
+Revises: b6e3f8a2c915
+Create Date: 2025-08-24 09:41:12.630514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4c1a7f93b20'
+down_revision = 'b6e3f8a2c915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('cart_items', sa.Column('unit_cost', sa.Numeric(precision=12, scale=2), nullable=True))
+    op.add_column('cart_items', sa.Column('line_cost', sa.Numeric(precision=12, scale=2), nullable=True))
+
+    # Backfill from the cost price history: the last cost change at or before the
+    # sale, else the price the first later change replaced, else today's cost
+    op.execute("""
+        UPDATE cart_items SET unit_cost = COALESCE(
+            (SELECT pc.new_price FROM price_changes pc
+             WHERE pc.product_id = cart_items.product_id
+               AND pc.change_type = 'cost_price_update'
+               AND pc.changed_at <= (SELECT s.date FROM sales s WHERE s.id = cart_items.sale_id)
+             ORDER BY pc.changed_at DESC, pc.id DESC LIMIT 1),
+            (SELECT pc.old_price FROM price_changes pc
+             WHERE pc.product_id = cart_items.product_id
+               AND pc.change_type = 'cost_price_update'
+               AND pc.changed_at > (SELECT s.date FROM sales s WHERE s.id = cart_items.sale_id)
+             ORDER BY pc.changed_at ASC, pc.id ASC LIMIT 1),
+            (SELECT p.cost_price FROM products p WHERE p.id = cart_items.product_id)
+        )
+    """)
+    op.execute("UPDATE cart_items SET line_cost = ROUND(quantity * unit_cost, 2) WHERE unit_cost IS NOT NULL")
+
+
+def downgrade():
+    op.drop_column('cart_items', 'line_cost')
+    op.drop_column('cart_items', 'unit_cost')
@@ -0,0 +1,89 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def pytest_configure(config):
+    # SQLite stores Numeric columns as floats and SQLAlchemy says so on every read
+    config.addinivalue_line('filterwarnings', 'ignore:Dialect sqlite\\+pysqlite does \\*not\\* support Decimal')
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The app on an in-memory SQLite database, with strict query budgets"""
+    from config import Config
+    from app import create_app, db
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        CACHE_TYPE = 'SimpleCache'
+        SOCKETIO_MESSAGE_QUEUE = None
+        WTF_CSRF_ENABLED = False
+        METRICS_ENABLED = False
+        QUERY_BUDGET_STRICT = True
+
+    # The file log handler writes app.log to the working directory; keep it out of the checkout
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('logs'))
+    try:
+        app = create_app(TestConfig)
+    finally:
+        os.chdir(cwd)
+    app.config['SESSION_COOKIE_SECURE'] = False
+
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+@pytest.fixture(scope='session')
+def shop_data(app):
+    """A business with one shop, its owner, a category, three products and one sale"""
+    from app import db
+    from app.models import Business, CartItem, Category, Product, Role, Sale, Shop, User
+
+    business = Business(name='Test Business')
+    db.session.add(business)
+    db.session.flush()
+    shop = Shop(name='Test Shop', business_id=business.id)
+    db.session.add(shop)
+    db.session.flush()
+    owner = User(username='owner', role=Role.TENANT, business_id=business.id, shop_id=shop.id)
+    owner.set_password('secret')
+    category = Category(name='Groceries', shop_id=shop.id)
+    db.session.add_all([owner, category])
+    db.session.flush()
+
+    products = [
+        Product(name=f'Product {i}', barcode=f'BC{i}', sku=f'SKU{i}', cost_price=10, selling_price=20,
+                stock=50, category_id=category.id, shop_id=shop.id)
+        for i in range(3)
+    ]
+    db.session.add_all(products)
+    db.session.flush()
+    sale = Sale(shop_id=shop.id, user_id=owner.id, total=20, subtotal=20, tax=0, profit=10, payment_method='mobile')
+    db.session.add(sale)
+    db.session.flush()
+    db.session.add(CartItem(shop_id=shop.id, sale_id=sale.id, product_id=products[0].id,
+                            quantity=1, unit_price=20, discount=0))
+    db.session.commit()
+
+    data = {'shop_id': shop.id, 'user_id': owner.id, 'product_ids': [p.id for p in products], 'sale_id': sale.id}
+    db.session.remove()
+    return data
+
+
+@pytest.fixture
+def client(app, shop_data):
+    """A test client signed in as the shop's owner"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(shop_data['user_id'])
+        session['_fresh'] = True
+    return client
@@ -0,0 +1,56 @@
+import pytest
+
+from app import cache, db
+from app.models import Product, Sale
+from app.sale.services import CHECKOUT_REPLAY_KEY
+
+
+@pytest.fixture
+def product(app, shop_data):
+    """A product of its own, so stock figures do not depend on other tests"""
+    reference = db.session.get(Product, shop_data['product_ids'][0])
+    product = Product(name='Checkout Product', cost_price=10, selling_price=20, stock=10,
+                      category_id=reference.category_id, shop_id=shop_data['shop_id'])
+    db.session.add(product)
+    db.session.commit()
+    product_id = product.id
+    db.session.remove()
+    return product_id
+
+
+def checkout(client, shop_data, product_id, key):
+    return client.post(
+        f"/api/shops/{shop_data['shop_id']}/transactions",
+        json={'payment_method': 'mobile', 'cart_items': [{'product_id': product_id, 'quantity': 2}]},
+        headers={'Idempotency-Key': key}
+    )
+
+
+def stock(product_id):
+    db.session.expire_all()
+    return db.session.get(Product, product_id).stock
+
+
+def sales_with_key(shop_id, key):
+    return Sale.query.filter_by(shop_id=shop_id, idempotency_key=key).count()
+
+
+@pytest.mark.parametrize('cache_cleared', [False, True], ids=['cache-replay', 'stored-replay'])
+def test_retried_checkout_replays_the_original(client, shop_data, product, cache_cleared):
+    key = f'checkout-{product}'
+    first = checkout(client, shop_data, product, key)
+    assert first.status_code == 200
+    assert 'Idempotent-Replayed' not in first.headers
+    assert stock(product) == 8
+
+    if cache_cleared:
+        # The retry then reaches the insert, and the unique key sends it to the stored sale
+        cache.delete(CHECKOUT_REPLAY_KEY.format(shop_id=shop_data['shop_id'], idempotency_key=key))
+
+    retry = checkout(client, shop_data, product, key)
+    assert retry.status_code == 200
+    assert retry.json == first.json
+    assert retry.headers.get('Idempotent-Replayed') == 'true'
+
+    assert sales_with_key(shop_data['shop_id'], key) == 1
+    assert stock(product) == 8
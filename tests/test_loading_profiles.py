@@ -0,0 +1,52 @@
+import re
+
+import pytest
+
+from app import db
+from app.models import Product, Sale
+from app.utils.loading import PROFILES, loading_profile
+from app.utils.profiling import QueryStats
+
+JOINS = {'shops': re.compile(r'\bJOIN shops\b'), 'businesses': re.compile(r'\bJOIN businesses\b')}
+
+# Only the admin profile keeps the mixins' joined shop and business
+EXPECTED_JOINS = {
+    'lean': set(),
+    'pos': set(),
+    'report': set(),
+    'admin': {'shops', 'businesses'},
+}
+
+
+def emitted_sql(model, profile=None):
+    """Statements run to load every `model` row under `profile` (None for the mapper defaults)"""
+    db.session.expunge_all()
+    query = db.session.query(model)
+    if profile is not None:
+        query = query.options(*loading_profile(profile, model))
+    with QueryStats() as stats:
+        query.all()
+    return list(stats.statements)
+
+
+def joined_tables(statements):
+    return {table for table, pattern in JOINS.items() if any(pattern.search(s) for s in statements)}
+
+
+def test_every_profile_is_covered():
+    assert set(EXPECTED_JOINS) == set(PROFILES)
+
+
+@pytest.mark.parametrize('model', [Product, Sale])
+@pytest.mark.parametrize('profile', sorted(EXPECTED_JOINS))
+def test_profile_joins(shop_data, model, profile):
+    statements = emitted_sql(model, profile)
+    assert joined_tables(statements) == EXPECTED_JOINS[profile]
+    # Trimmed relationships are lazy, so no follow-up selects are issued either
+    assert len(statements) == 1
+
+
+@pytest.mark.parametrize('model', [Product, Sale])
+def test_mapper_defaults_join_shop_and_business(shop_data, model):
+    # The baseline the profiles trim: without options every row drags in its shop and business
+    assert joined_tables(emitted_sql(model)) == {'shops', 'businesses'}
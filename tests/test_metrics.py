@@ -0,0 +1,32 @@
+import json
+import subprocess
+import sys
+import threading
+
+from app import cache
+from app.utils.metrics import Metrics
+
+
+def test_disabled_metrics_record_nothing(app):
+    # The test config sets METRICS_ENABLED = False
+    cache.get('shop:1:pos_data')
+    Metrics.inc('cache_requests_total', {'family': 'shop:pos_data', 'result': 'hit'})
+    Metrics.observe('http_request_duration_seconds', {'endpoint': 'x'}, 0.1)
+
+    assert not Metrics._counters and not Metrics._histograms
+    assert not any(thread.name == 'metrics-flush' for thread in threading.enumerate())
+
+
+def test_collect_drops_files_of_exited_workers(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_DIR', str(tmp_path))
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    (tmp_path / f'{exited.pid}.json').write_text(json.dumps({
+        'counters': [['cache_requests_total', [['family', 'shop:pos_data'], ['result', 'hit']], 7]],
+        'histograms': [],
+        'gauges': []
+    }))
+
+    counters, _, _ = Metrics.collect()
+    assert not counters
+    assert not (tmp_path / f'{exited.pid}.json').exists()
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Product, Sale
+from app.sale.receipts import ReceiptStore
+
+
+@pytest.fixture
+def product(app, shop_data):
+    """A product of its own, so stock figures do not depend on other tests"""
+    reference = db.session.get(Product, shop_data['product_ids'][0])
+    product = Product(name='Sync Product', cost_price=10, selling_price=20, stock=5,
+                      category_id=reference.category_id, shop_id=shop_data['shop_id'])
+    db.session.add(product)
+    db.session.commit()
+    product_id = product.id
+    db.session.remove()
+    return product_id
+
+
+def offline_sale(key, product_id, quantity=1, sold_at=None):
+    return {
+        'idempotency_key': key,
+        'sold_at': (sold_at or datetime.utcnow() - timedelta(hours=1)).isoformat(),
+        'payment_method': 'mobile',
+        'cart_items': [{'product_id': product_id, 'quantity': quantity}]
+    }
+
+
+def sync(client, shop_data, sales):
+    return client.post(f"/api/shops/{shop_data['shop_id']}/transactions/sync", json={'sales': sales})
+
+
+def stock(product_id):
+    db.session.expire_all()
+    return db.session.get(Product, product_id).stock
+
+
+def sales_with_keys(shop_id, keys):
+    return Sale.query.filter(Sale.shop_id == shop_id, Sale.idempotency_key.in_(keys)).count()
+
+
+def test_one_batch_reports_each_outcome(client, shop_data, product):
+    first = sync(client, shop_data, [offline_sale('sync-a', product)])
+    assert first.status_code == 200
+    assert first.json['results'][0]['status'] == 'created'
+    assert stock(product) == 4
+
+    response = sync(client, shop_data, [
+        offline_sale('sync-a', product),                                      # synced before
+        offline_sale('sync-b', product, quantity=2),                          # new
+        offline_sale('sync-b', product),                                      # repeated in the batch
+        offline_sale('sync-c', product, quantity=3),                          # more than is left
+        offline_sale('sync-d', product, sold_at=datetime.utcnow() - timedelta(days=30)),  # too old
+        {'idempotency_key': 'sync-e', 'cart_items': []},                     # invalid entry
+    ])
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [r['status'] for r in results] == ['replayed', 'created', 'rejected', 'conflict', 'rejected', 'rejected']
+    assert [r['index'] for r in results] == list(range(6))
+
+    assert results[0]['sale_id'] == first.json['results'][0]['sale_id']
+    assert results[2]['error'] == 'Idempotency key repeated in batch'
+    assert results[3]['failed_items'][0]['available'] == 2
+    assert 'sync window' in results[4]['error']
+    assert response.json['created'] == 1
+
+    # Only sync-a and sync-b were written, and the stock moved once for each
+    assert stock(product) == 2
+    assert sales_with_keys(shop_data['shop_id'], ['sync-a', 'sync-b', 'sync-c', 'sync-d', 'sync-e']) == 2
+
+
+def test_data_error_is_not_retried_as_a_stock_race(client, shop_data, product, monkeypatch):
+    build, calls = ReceiptStore.build, []
+
+    def broken_build(sale, lines):
+        calls.append(sale)
+        return dict(build(sale, lines), content_hash=None)  # NOT NULL violation in sale_receipts
+
+    monkeypatch.setattr(ReceiptStore, 'build', staticmethod(broken_build))
+    response = sync(client, shop_data, [offline_sale('sync-broken', product)])
+
+    assert response.status_code == 400
+    assert 'Offline sync failed' in response.json['error']
+    assert 'Stock changed' not in response.json['error']
+    assert len(calls) == 1
+    assert sales_with_keys(shop_data['shop_id'], ['sync-broken']) == 0
+    assert stock(product) == 5
@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Business
+from app.utils.profiling import QueryBudget, QueryBudgetExceeded, QueryStats, query_budget
+
+
+def run_statements(n):
+    for _ in range(n):
+        db.session.execute(text('SELECT 1'))
+
+
+def test_pos_data_stays_within_its_budget(app, client, shop_data):
+    # get_pos_data declares @query_budget(8); QUERY_BUDGET_STRICT makes going over raise here
+    assert app.config['QUERY_BUDGET_STRICT']
+    response = client.get(f"/api/shops/{shop_data['shop_id']}/pos-data")
+    assert response.status_code == 200
+
+
+def test_strict_view_over_budget_raises(app):
+    view = query_budget(2)(lambda: run_statements(3))
+    with app.test_request_context():
+        with pytest.raises(QueryBudgetExceeded, match='3 statements, budget 2'):
+            view()
+
+
+def test_query_budget_block(app):
+    with QueryBudget(2):
+        run_statements(2)
+    with pytest.raises(QueryBudgetExceeded):
+        with QueryBudget(2):
+            run_statements(3)
+
+
+def test_failed_statement_is_counted_and_its_timer_popped(app, shop_data):
+    business_id = db.session.query(Business.id).scalar()
+    # The pooled connection's info, where the start times are kept
+    info = db.session.connection().info
+    with QueryStats() as stats:
+        with pytest.raises(IntegrityError):
+            db.session.execute(Business.__table__.insert(), {'id': business_id, 'name': 'Duplicate'})
+    db.session.rollback()
+
+    assert stats.count == 1
+    assert not info.get('query_started')
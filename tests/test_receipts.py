@@ -0,0 +1,53 @@
+from app import db
+from app.models import CartItem, Sale, SaleReceipt, SaleStatus
+
+
+def make_sale(shop_data, **fields):
+    sale = Sale(shop_id=shop_data['shop_id'], user_id=shop_data['user_id'], total=20, subtotal=20, tax=0,
+                profit=10, payment_method='mobile', **fields)
+    db.session.add(sale)
+    db.session.flush()
+    db.session.add(CartItem(shop_id=shop_data['shop_id'], sale_id=sale.id, product_id=shop_data['product_ids'][0],
+                            quantity=1, unit_price=20, discount=0))
+    db.session.commit()
+    sale_id = sale.id
+    db.session.remove()
+    return sale_id
+
+
+def details_url(shop_data, sale_id):
+    return f"/api/shops/{shop_data['shop_id']}/transactions/{sale_id}"
+
+
+def test_details_follow_the_sale_after_it_is_stored(client, shop_data):
+    sale_id = make_sale(shop_data, customer_name='Wanjiru')
+    first = client.get(details_url(shop_data, sale_id))
+    assert first.status_code == 200
+    assert first.json['status'] == 'pending' and first.json['customer_name'] == 'Wanjiru'
+    assert 'immutable' not in first.headers['Cache-Control']
+    assert db.session.get(SaleReceipt, sale_id) is not None
+
+    sale = db.session.get(Sale, sale_id)
+    sale.status = SaleStatus.CANCELLED
+    sale.customer_name = None
+    db.session.commit()
+
+    second = client.get(details_url(shop_data, sale_id), headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.json['status'] == 'cancelled' and second.json['customer_name'] == 'Walk-in'
+    assert second.json['items'] == first.json['items']
+
+    unchanged = client.get(details_url(shop_data, sale_id), headers={'If-None-Match': second.headers['ETag']})
+    assert unchanged.status_code == 304
+
+
+def test_deleted_sale_has_no_receipt(client, shop_data):
+    sale_id = make_sale(shop_data)
+    receipt_url = f"/api/shops/{shop_data['shop_id']}/receipts?sale_id={sale_id}"
+    assert client.get(receipt_url).status_code == 200
+
+    db.session.get(Sale, sale_id).is_deleted = True
+    db.session.commit()
+
+    assert client.get(receipt_url).status_code == 404
+    assert client.get(details_url(shop_data, sale_id)).status_code == 404
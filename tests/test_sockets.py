@@ -0,0 +1,80 @@
+import pytest
+
+from app import db, socketio
+from app.models import Business, Role, Shop, User
+
+
+def signed_in(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def rooms(socket):
+    sid = socketio.server.manager.sid_from_eio_sid(socket.eio_sid, '/')
+    return set(socketio.server.rooms(sid))
+
+
+@pytest.fixture(scope='module')
+def users(app, shop_data):
+    """A tenant owner without a shop of their own, and a cashier of another shop in another business"""
+    shop = db.session.get(Shop, shop_data['shop_id'])
+    other_business = Business(name='Other Business')
+    db.session.add(other_business)
+    db.session.flush()
+    other_shop = Shop(name='Other Shop', business_id=other_business.id)
+    db.session.add(other_shop)
+    db.session.flush()
+
+    owner = User(username='socket_owner', role=Role.TENANT, business_id=shop.business_id)
+    cashier = User(username='socket_cashier', role=Role.CASHIER, business_id=other_business.id, shop_id=other_shop.id)
+    for user in (owner, cashier):
+        user.set_password('secret')
+    db.session.add_all([owner, cashier])
+    db.session.commit()
+    ids = {'owner': owner.id, 'cashier': cashier.id, 'other_shop': other_shop.id}
+    db.session.remove()
+    return ids
+
+
+def connect(app, user_id):
+    return socketio.test_client(app, flask_test_client=signed_in(app, user_id))
+
+
+def test_tenant_without_shop_joins_on_pos_connected(app, shop_data, users):
+    socket = connect(app, users['owner'])
+    room = f"shop_{shop_data['shop_id']}"
+    assert room not in rooms(socket)
+
+    socket.emit('pos_connected', {'shop_id': shop_data['shop_id']})
+    assert room in rooms(socket)
+    socket.disconnect()
+
+
+def test_subscribe_inventory_joins_the_shop_room(app, shop_data, users):
+    socket = connect(app, users['owner'])
+    socket.emit('subscribe_inventory', {'shop_id': str(shop_data['shop_id'])})
+    assert f"shop_{shop_data['shop_id']}" in rooms(socket)
+    assert not any(room.startswith('inventory_') for room in rooms(socket))
+    socket.disconnect()
+
+
+def test_cashier_cannot_join_another_shop(app, shop_data, users):
+    socket = connect(app, users['cashier'])
+    assert f"shop_{users['other_shop']}" in rooms(socket)
+
+    socket.emit('pos_connected', {'shop_id': shop_data['shop_id']})
+    socket.emit('request_stock_update', {'shop_id': shop_data['shop_id'], 'product_id': shop_data['product_ids'][0]})
+    assert f"shop_{shop_data['shop_id']}" not in rooms(socket)
+    socket.disconnect()
+
+
+def test_unknown_shop_is_ignored(app, users):
+    socket = connect(app, users['owner'])
+    before = rooms(socket)
+    socket.emit('pos_connected', {'shop_id': 999999})
+    socket.emit('pos_connected', {})
+    assert rooms(socket) == before
+    socket.disconnect()
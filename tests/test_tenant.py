@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+from flask import g
+
+from app import cache, db
+from app.models import Role, User
+from app.utils.profiling import QueryStats
+from app.utils.tenant import IDENTITY_FIELDS, USER_KEY, TenantContext
+
+
+def make_user(shop_data, username, **fields):
+    user = User(username=username, role=Role.CASHIER, shop_id=shop_data['shop_id'], **fields)
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    db.session.remove()
+    return user_id
+
+
+def load(app, user_id):
+    with app.test_request_context():
+        # g lives on the app context, which the fixture keeps open across requests
+        g.tenant = TenantContext()
+        return TenantContext.load_user(user_id)
+
+
+def test_cache_holds_identity_only(app, shop_data):
+    user_id = make_user(shop_data, 'identity_only', reset_token='token', email_verification_token='verify')
+    load(app, user_id)
+
+    identity = cache.get(USER_KEY.format(user_id=user_id))
+    assert set(identity) == set(IDENTITY_FIELDS)
+    assert 'secret' not in repr(identity) and 'token' not in repr(identity)
+
+
+def test_warm_load_runs_no_queries(app, shop_data):
+    user_id = make_user(shop_data, 'warm_cashier')
+    load(app, user_id)
+    db.session.remove()
+
+    with app.test_request_context():
+        g.tenant = TenantContext()
+        with QueryStats() as stats:
+            user = TenantContext.load_user(user_id)
+            assert (user.username, user.role, user.shop.id) == ('warm_cashier', Role.CASHIER, shop_data['shop_id'])
+        assert stats.count == 0
+        # Columns left out of the cache still load, from the database
+        assert user.check_password('secret')
+    db.session.remove()
+
+
+def test_locked_and_deleted_users_are_refused(app, shop_data):
+    user_id = make_user(shop_data, 'soon_locked')
+    assert load(app, user_id) is not None
+
+    user = db.session.get(User, user_id)
+    user.locked_until = datetime.utcnow() + timedelta(minutes=15)
+    db.session.commit()
+    assert load(app, user_id) is None
+    # Refused from the cached record as well
+    assert load(app, user_id) is None
+
+    user = db.session.get(User, user_id)
+    user.locked_until = None
+    user.is_deleted = True
+    db.session.commit()
+    assert load(app, user_id) is None
+    db.session.remove()